@@ -0,0 +1,115 @@
+import abc
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+from cv2.dnn import blobFromImages
+
+class InferenceEngine(abc.ABC):
+    """
+    Common interface of the keypoint inference engines.
+    Subclasses must implement infer() for a single NCHW blob, infer_batch() stacks N hand crops
+    into one NCHW blob and runs a single forward pass (or one pass per crop when the backend
+    network has a fixed batch size).
+    """
+    supports_batching = False
+
+    @abc.abstractmethod
+    def infer(self, input):
+        pass
+
+    def prepare_batch(self, images, size):
+        return blobFromImages(images, 1.0/255, size, (0, 0, 0), swapRB=False, crop=False)
+
+    def infer_batch(self, images, size):
+        blob = self.prepare_batch(images, size)
+
+        if self.supports_batching:
+            return self.infer(blob)
+
+        return np.concatenate([self.infer(blob[i:i + 1]) for i in range(blob.shape[0])])
+
+
+class MicroBatchQueue:
+    """
+    Gathers single-crop inference requests from many callers and runs them as one batch
+    once max_batch_size requests are waiting or max_delay seconds passed since the oldest one.
+    All crops in a batch are resized to the same blob size.
+    """
+    def __init__(self, engine, size, max_batch_size=8, max_delay=0.01):
+        self.engine = engine
+        self.size = size
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self.requests = queue.Queue()
+        self.running = True
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self._batch_loop, daemon=True)
+        self.thread.start()
+
+    def submit(self, image):
+        """
+        Queue one hand crop and return a Future resolved with its (1, channels, rows, cols) network output.
+        Raises RuntimeError once the queue is closed, nothing would ever resolve the future.
+        """
+        future = Future()
+        with self.lock:
+            if not self.running:
+                raise RuntimeError("cannot submit inference requests after MicroBatchQueue.close()")
+            self.requests.put((image, future))
+        return future
+
+    def infer(self, image):
+        return self.submit(image).result()
+
+    def _collect_batch(self):
+        try:
+            batch = [self.requests.get(timeout=0.1)]
+        except queue.Empty:
+            return []
+
+        deadline = time.perf_counter() + self.max_delay
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.requests.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        return batch
+
+    def _batch_loop(self):
+        while self.running:
+            batch = self._collect_batch()
+            if not batch:
+                continue
+
+            images = [image for image, _ in batch]
+            futures = [future for _, future in batch]
+
+            try:
+                output = self.engine.infer_batch(images, self.size)
+            except Exception as error:
+                for future in futures:
+                    future.set_exception(error)
+                continue
+
+            for i, future in enumerate(futures):
+                future.set_result(output[i:i + 1])
+
+    def close(self):
+        with self.lock:
+            self.running = False
+        self.thread.join()
+
+        # requests which came after the last batch are not left waiting forever
+        while True:
+            try:
+                image, future = self.requests.get_nowait()
+            except queue.Empty:
+                break
+            future.set_exception(RuntimeError("MicroBatchQueue closed before the request was run"))
@@ -0,0 +1,188 @@
+# --- Stage-level benchmark of the recognition pipeline
+# --- Replays hand images (examples/*.jpg by default) through every stage separately,
+# --- reports p50/p95/p99 latency and throughput per stage as JSON
+# --- and compares them against a stored baseline, runs headless on CPU
+
+import os
+import sys
+import cv2
+import json
+import time
+import argparse
+import platform
+import numpy as np
+
+import train_model
+import prefix_queries
+import engine_registry
+from utils.perf import summarize_latencies
+
+hand_rows = train_model.training_rows * 10
+hand_cols = train_model.training_cols * 10
+
+def parseArguments():
+	parser = argparse.ArgumentParser(description="Stage-level benchmark of the sign alphabet recognition pipeline")
+	parser.add_argument("--images", nargs="+", default=["examples"], help="directories with hand images (skeleton images are skipped)")
+	parser.add_argument("--repeats", type=int, default=5, help="how many times every image is replayed through a stage")
+	parser.add_argument("--warmup", type=int, default=3, help="untimed calls before measuring a stage")
+	parser.add_argument("--engines", nargs="+", default=["opencv", "ngraph"], help="keypoint inference engines to measure")
+	parser.add_argument("--net-size", type=int, default=None, help="keypoint network input resolution (default: hand box size)")
+	parser.add_argument("--dictionary", default="dictionaries/default.txt", help="dictionary used for prefix queries")
+	parser.add_argument("--output", default="benchmark_results.json", help="path to JSON results")
+	parser.add_argument("--baseline", help="JSON results to compare against")
+	parser.add_argument("--save-baseline", help="also store the results as a new baseline at this path")
+	parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative p50 slowdown before a stage is flagged")
+	return parser.parse_args()
+
+def loadHands(directories):
+	hands = []
+	for directory in directories:
+		for name in sorted(os.listdir(directory)):
+			if name.lower().endswith((".jpg", ".png")) and "_skeleton" not in name:
+				image = cv2.imread(os.path.join(directory, name))
+				if image is not None:
+					hands.append(cv2.resize(image, (hand_cols, hand_rows)))
+	return hands
+
+def timeStage(function, inputs, repeats, warmup):
+	"""
+	# Call function on every input repeats times, return (latencies in seconds, outputs of the last pass)
+	"""
+	for i in range(warmup):
+		function(inputs[i % len(inputs)])
+
+	latencies = []
+	for r in range(repeats):
+		outputs = []
+		for item in inputs:
+			s = time.perf_counter()
+			outputs.append(function(item))
+			latencies.append(time.perf_counter() - s)
+
+	return latencies, outputs
+
+def runBenchmark(args):
+	import hand_processing
+	hand_processing.netInputSize = args.net_size
+
+	hands = loadHands(args.images)
+	if not hands:
+		raise SystemExit("No hand images found in " + " ".join(args.images))
+
+	results = {}
+	def record(stage, latencies):
+		results[stage] = summarize_latencies(latencies)
+		print("{:<32} p50 {:8.3f} ms  p95 {:8.3f} ms  p99 {:8.3f} ms  {:10.1f} /s".format(stage,
+			results[stage]["p50_ms"], results[stage]["p95_ms"], results[stage]["p99_ms"], results[stage]["throughput"]), file=sys.stderr)
+
+	def skip(stage, error):
+		results[stage] = {"skipped": str(error)}
+		print("{:<32} skipped: {}".format(stage, error), file=sys.stderr)
+
+	def measure(stage, function, inputs):
+		latencies, outputs = timeStage(function, inputs, args.repeats, args.warmup)
+		record(stage, latencies)
+		return outputs
+
+	blobSize = (args.net_size, args.net_size) if args.net_size else (hand_rows, hand_cols)
+	blobs = measure("blob_creation",
+		lambda hand: cv2.dnn.blobFromImage(hand, 1.0/255, blobSize, (0,0,0), swapRB=False, crop=False), hands)
+
+	# -- Keypoint inference per engine, engines which cannot be loaded or run here are reported as skipped
+	netOutputs = None
+	for name in args.engines:
+		try:
+			engine = engine_registry.create_engine({ "engine": name })
+			# -- first forward pass initializes the network, a broken model file only fails here
+			s = time.perf_counter()
+			engine.infer(blobs[0])
+			print("{:<32} warmed up in {:.2f} s".format("keypoint_inference_" + name, time.perf_counter() - s), file=sys.stderr)
+		except Exception as error:
+			skip("keypoint_inference_" + name, error)
+			continue
+
+		outputs = measure("keypoint_inference_" + name, engine.infer, blobs)
+		if netOutputs is None:
+			netOutputs = outputs
+
+	syntheticHeatmaps = netOutputs is None
+	if syntheticHeatmaps:
+		# -- no engine available, decode random heatmaps of the network's output shape (stride 8)
+		rng = np.random.default_rng(0)
+		netOutputs = [ rng.random((1, hand_processing.nPoints, blobSize[0] // 8, blobSize[1] // 8), dtype=np.float32) for hand in hands ]
+
+	def decode(netOutput):
+		points, confidences = hand_processing.decodeHeatmaps(netOutput[0, :hand_processing.nPoints], hand_rows, hand_cols)
+		points[confidences < hand_processing.requiredProbability] = np.nan
+		return points
+	points = measure("heatmap_decoding", decode, netOutputs)
+	results["heatmap_decoding"]["synthetic_input"] = syntheticHeatmaps
+
+	measure("keypoint_normalization", lambda p: hand_processing.getTransformedKeypoints(
+		hand_processing.getCenteredKeypoints(p, hand_rows, hand_cols), hand_rows, hand_cols), points)
+
+	gestures = measure("gesture_rendering", lambda item: hand_processing.renderHandGesture(*item)[1], list(zip(hands, points)))
+
+	try:
+		s = time.perf_counter()
+		hand_processing.predictGesture(gestures[0])
+		print("{:<32} warmed up in {:.2f} s".format("cnn_classification", time.perf_counter() - s), file=sys.stderr)
+	except Exception as error:
+		skip("cnn_classification", error)
+		skip("cached_classification", error)
+	else:
+		measure("cnn_classification", hand_processing.predictGesture, gestures)
+
+		# -- every pose repeats after the first pass, so this is the gesture cache hit path (the cache is off by default)
+		hand_processing.gestureCache = hand_processing.GestureCache()
+		try:
+			measure("cached_classification", lambda p: hand_processing.predictGesture(None, p), points)
+		finally:
+			hand_processing.gestureCache = None
+
+	if hand_processing.keypointModel.get() is not None:
+		measure("keypoint_classification", hand_processing.predictGestureFromKeypoints, points)
+
+	# -- Prefix queries over every prefix of every dictionary word
+	index = prefix_queries.loadIndex(args.dictionary)
+	with open(args.dictionary) as dictionary:
+		prefixes = [ word[:i] for word in dictionary.read().split() for i in range(1, len(word) + 1) ]
+	measure("prefix_query", lambda prefix: prefix_queries.queryIndex(index, prefix), prefixes)
+
+	return {
+		"machine": { "platform": platform.platform(), "processor": platform.processor(), "cpus": os.cpu_count() },
+		"images": len(hands),
+		"repeats": args.repeats,
+		"stages": results,
+	}
+
+def compareWithBaseline(report, baseline, tolerance):
+	"""
+	# Return list of (stage, baseline p50, current p50) for stages slower than baseline by more than tolerance
+	"""
+	regressions = []
+	for stage, current in report["stages"].items():
+		previous = baseline["stages"].get(stage, {})
+		if "p50_ms" in current and "p50_ms" in previous and current["p50_ms"] > previous["p50_ms"] * (1 + tolerance):
+			regressions.append((stage, previous["p50_ms"], current["p50_ms"]))
+	return regressions
+
+if __name__ == '__main__':
+	args = parseArguments()
+	report = runBenchmark(args)
+
+	with open(args.output, "w") as f:
+		json.dump(report, f, indent=2)
+	if args.save_baseline:
+		with open(args.save_baseline, "w") as f:
+			json.dump(report, f, indent=2)
+
+	if args.baseline:
+		with open(args.baseline) as f:
+			regressions = compareWithBaseline(report, json.load(f), args.tolerance)
+
+		for stage, previous, current in regressions:
+			print("REGRESSION {}: p50 {:.3f} ms -> {:.3f} ms".format(stage, previous, current), file=sys.stderr)
+		if regressions:
+			sys.exit(1)
+		print("No regressions against", args.baseline, file=sys.stderr)
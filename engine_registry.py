@@ -0,0 +1,172 @@
+import os
+import json
+import time
+import platform
+
+import cv2
+
+KEYPOINT_PROTOTXT = "keypoint_hand_model/pose_deploy.prototxt"
+KEYPOINT_CAFFEMODEL = "keypoint_hand_model/pose_iter_102000.caffemodel"
+KEYPOINT_ONNX = "keypoint_hand_model/keypoint.onnx"
+
+DNN_BACKENDS = {
+    "default": cv2.dnn.DNN_BACKEND_DEFAULT,
+    "opencv": cv2.dnn.DNN_BACKEND_OPENCV,
+    "openvino": cv2.dnn.DNN_BACKEND_INFERENCE_ENGINE,
+    "cuda": cv2.dnn.DNN_BACKEND_CUDA,
+    "vulkan": cv2.dnn.DNN_BACKEND_VKCOM,
+}
+
+DNN_TARGETS = {
+    "cpu": cv2.dnn.DNN_TARGET_CPU,
+    "opencl": cv2.dnn.DNN_TARGET_OPENCL,
+    "opencl_fp16": cv2.dnn.DNN_TARGET_OPENCL_FP16,
+    "myriad": cv2.dnn.DNN_TARGET_MYRIAD,
+    "cuda": cv2.dnn.DNN_TARGET_CUDA,
+    "cuda_fp16": cv2.dnn.DNN_TARGET_CUDA_FP16,
+    "vulkan": cv2.dnn.DNN_TARGET_VULKAN,
+}
+
+DEFAULT_CONFIG = {"engine": "opencv", "backend": "default", "target": "cpu", "threads": None}
+
+
+def _create_opencv(config):
+    from opencv_inf import OpencvInference
+    # OpenCV has one thread pool per process, shared by all nets (-1 restores its default size)
+    cv2.setNumThreads(config["threads"] or -1)
+    return OpencvInference(KEYPOINT_PROTOTXT, KEYPOINT_CAFFEMODEL,
+                           backend=DNN_BACKENDS[config["backend"] or "default"], target=DNN_TARGETS[config["target"] or "cpu"])
+
+
+def _opencv_configurations(threads):
+    configurations = []
+    for backend, backend_id in DNN_BACKENDS.items():
+        available = cv2.dnn.getAvailableTargets(backend_id)
+        for target, target_id in DNN_TARGETS.items():
+            if target_id in available:
+                configurations += [{"engine": "opencv", "backend": backend, "target": target, "threads": n} for n in threads]
+    return configurations
+
+
+def _create_ngraph(config):
+    from ngraph_inf import NgraphInference
+    return NgraphInference(KEYPOINT_ONNX)
+
+
+def _ngraph_configurations(threads):
+    # nGraph CPU backend has no backend, target or thread options
+    return [{"engine": "ngraph", "backend": None, "target": None, "threads": None}]
+
+
+# name -> (factory(config) returning InferenceEngine, configurations(thread counts) listing its possible configs)
+ENGINES = {
+    "opencv": (_create_opencv, _opencv_configurations),
+    "ngraph": (_create_ngraph, _ngraph_configurations),
+}
+
+
+def register_engine(name, factory, configurations):
+    ENGINES[name] = (factory, configurations)
+
+
+def create_engine(config=None):
+    """
+    Create keypoint inference engine described by config dict (engine, backend, target, threads).
+    """
+    config = dict(DEFAULT_CONFIG, **(config or {}))
+    if config["engine"] not in ENGINES:
+        raise ValueError("Unknown inference engine " + str(config["engine"]))
+    return ENGINES[config["engine"]][0](config)
+
+
+def thread_counts(cpus=None):
+    # powers of two up to the number of cores, plus all cores
+    cpus = cpus or os.cpu_count() or 1
+    counts = []
+    n = 1
+    while n < cpus:
+        counts.append(n)
+        n *= 2
+    return counts + [cpus]
+
+
+def candidate_configurations(engines=None, threads=None):
+    threads = threads or thread_counts()
+    configurations = []
+    for name in engines or ENGINES:
+        configurations += ENGINES[name][1](threads)
+    return configurations
+
+
+def config_name(config):
+    return "/".join(str(config[key]) for key in ("engine", "backend", "target", "threads") if config.get(key) is not None)
+
+
+def load_sample_blobs(directory="examples", size=(280, 280)):
+    """
+    Network input blobs of the hand images in directory (skeleton images are skipped), all resized to size.
+    """
+    blobs = []
+    for name in sorted(os.listdir(directory)):
+        if name.lower().endswith((".jpg", ".png")) and "_skeleton" not in name:
+            image = cv2.imread(os.path.join(directory, name))
+            if image is not None:
+                blobs.append(cv2.dnn.blobFromImage(image, 1.0/255, size, (0, 0, 0), swapRB=False, crop=False))
+    return blobs
+
+
+def autotune(samples, configurations=None, repeats=5, warmup=2):
+    """
+    Time every configuration on sample input blobs and return (fastest config, {config name: median seconds per blob}).
+    Configurations which cannot be created or run on this machine are left out of the timings.
+    """
+    timings = {}
+    best = None
+    for config in configurations or candidate_configurations():
+        try:
+            engine = create_engine(config)
+            engine.measure_latency = False
+            for i in range(warmup):
+                engine.infer(samples[i % len(samples)])
+
+            latencies = []
+            for r in range(repeats):
+                for sample in samples:
+                    start = time.perf_counter()
+                    engine.infer(sample)
+                    latencies.append(time.perf_counter() - start)
+        except Exception:
+            continue
+
+        latencies.sort()
+        timings[config_name(config)] = latencies[len(latencies) // 2]
+        if best is None or timings[config_name(config)] < timings[config_name(best)]:
+            best = config
+
+    return best, timings
+
+
+def machine_id():
+    return "{}/{}/{}".format(platform.node(), platform.processor() or platform.machine(), os.cpu_count())
+
+
+def load_tuned_config(path):
+    """
+    Return configuration stored by save_tuned_config() for this machine, or None.
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        entry = json.load(f).get(machine_id())
+    return entry["config"] if entry else None
+
+
+def save_tuned_config(path, config, timings):
+    tuned = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            tuned = json.load(f)
+
+    tuned[machine_id()] = {"config": config, "timings_ms": {name: seconds * 1000 for name, seconds in timings.items()}}
+    with open(path, "w") as f:
+        json.dump(tuned, f, indent=2)
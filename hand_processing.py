@@ -2,102 +2,195 @@ import os
 import cv2
 import sys
 import time
+import threading
 import numpy as np 
-from keras.models import load_model
-
-from opencv_inf import OpencvInference
-# from ngraph_inf import NgraphInference
-
-from train_model import alphabet, imageIntoData
-
-# --- Load deep learning network 
-# --- for hand recognition
-# --- This model detects 22 hand keypoints 
-# --- based on hand image 
-# --- Model is taken from:
-# --- https://www.learnopencv.com/hand-keypoint-detection-using-deep-learning-and-opencv/
-# select one of the available inference engines for hand detection
-# pass True as the second argument to create an engine that calculates an average latency of inferences for this engine
-hand_detection_engine = OpencvInference("keypoint_hand_model/pose_deploy.prototxt", "keypoint_hand_model/pose_iter_102000.caffemodel")
-# hand_detection_engine = NgraphInference('keypoint_hand_model/keypoint.onnx', True)
+from collections import OrderedDict
+
+from train_model import alphabet, imageIntoData, training_rows, training_cols
+from utils import perf
+from utils.lazy import LazyModel
+from keypoint_classifier import SKELETON_BONES, KeypointClassifier, keypoint_features
+
 nPoints = 22
 requiredProbability = 0.1  
 
-# --- Set Skeleton 'Bones' (edges) based on 22 hand keypoints
-# --- returned by DNN model
-SKELETON_BONES = [ 
-	[0,1], [1,2], [2,5], [5,9], [9,13], [13,17],[17,0], # Palm
-	[2,3], [3,4], # Thumb
-	[5,6], [6,7], [7,8], # Index Finger
-	[9, 10], [10, 11], [11, 12], # Middle Finger
-	[13, 14], [14,15], [15, 16], # Ring Finger
-	[17, 18], [18,19], [19, 20] # Little Finger 
-]
-
-# --- Load last compiled (using trainModel.py script)
-# --- gesture recognition model
-model = load_model('gesture_recognition_model.h5')
+# --- Keypoint network input resolution (e.g. 184/224/280)
+# --- None runs the network at the hand box size (280x280)
+netInputSize = None
+
+# --- Keypoint inference engine configuration (engine_registry), None is OpenCV DNN with default settings
+keypointEngineConfig = None
+
+# --- Gesture classifier runtime: "auto" runs exported ONNX model with OpenCV DNN when it exists
+# --- (no TensorFlow import at all) and falls back to Keras, "opencv" and "keras" force one of them
+gestureBackend = "auto"
+# --- Use int8-quantized ONNX variant (train_model.py --quantize, needs OpenCV >= 4.6)
+gestureQuantized = False
+gestureModelPath = 'gesture_recognition_model.h5'
+gestureOnnxPath = 'gesture_recognition_model.onnx'
+gestureInt8Path = 'gesture_recognition_model.int8.onnx'
+
+# --- All models are loaded lazily, on first use or by warmUp(),
+# --- so importing this module does not block (and does not import Keras)
+
+def loadKeypointEngine():
+	# --- Load deep learning network 
+	# --- for hand recognition
+	# --- This model detects 22 hand keypoints 
+	# --- based on hand image 
+	# --- Model is taken from:
+	# --- https://www.learnopencv.com/hand-keypoint-detection-using-deep-learning-and-opencv/
+	# inference engine (and its backend, target, threads) is selected by keypointEngineConfig, see engine_registry
+	# every engine records its inference latency in the 'keypoint_inference' timer of utils.perf.monitor
+	import engine_registry
+	return engine_registry.create_engine(keypointEngineConfig)
+
+def loadGestureModel():
+	# --- Load last compiled (using trainModel.py script)
+	# --- gesture recognition model
+	# --- Return function mapping (1, rows, cols, 1) input to (1, letters) probabilities
+	onnxPath = gestureInt8Path if gestureQuantized else gestureOnnxPath
+	if gestureQuantized and tuple(int(part) for part in cv2.__version__.split(".")[:2]) < (4, 6):
+		raise RuntimeError("int8 quantized gesture model needs OpenCV >= 4.6, installed is " + cv2.__version__)
+	if gestureBackend == "opencv" or (gestureBackend == "auto" and os.path.exists(onnxPath)):
+		from opencv_inf import OpencvInference
+		return OpencvInference(onnxPath, measure_latency=False).infer
+
+	from keras.models import load_model
+	return load_model(gestureModelPath).predict
+
+def loadKeypointModel():
+	# --- Keypoint-only gesture classifier (trained with train_model.py --classifier keypoints)
+	# --- it is optional, so load it only when it was already trained
+	keypointModelPath = 'keypoint_gesture_model.npz'
+	return KeypointClassifier.load(keypointModelPath) if os.path.exists(keypointModelPath) else None
+
+hand_detection_engine = LazyModel(loadKeypointEngine)
+model = LazyModel(loadGestureModel)
+keypointModel = LazyModel(loadKeypointModel)
+
+def warmUp(classifier="cnn"):
+	"""
+	# Load models used by classifier ("cnn" or "keypoints") and run one dummy inference through them,
+	# so memory allocation and backend initialization do not happen on the first real snapshot
+	# Return time spent in seconds
+	"""
+	s = time.perf_counter()
+
+	handRows, handCols = training_rows * 10, training_cols * 10
+	points, confidences = detectKeypoints(np.zeros((handRows, handCols, 3), dtype=np.uint8))
+
+	if classifier == "keypoints":
+		if keypointModel.get() is not None:
+			predictGestureFromKeypoints(points)
+	else:
+		predictGesture(np.full((handRows, handCols, 1), 255, dtype=np.uint8))
+
+	return time.perf_counter() - s
+
+def startWarmUp(classifier="cnn", onReady=None):
+	"""
+	# Run warmUp() on a background thread, onReady(seconds) is called when it is done
+	"""
+	def warmUpThread():
+		seconds = warmUp(classifier)
+		if onReady is not None:
+			onReady(seconds)
+
+	thread = threading.Thread(target=warmUpThread, daemon=True)
+	thread.start()
+	return thread
 
 def drawSkeleton(image, keypoints, drawGesture=False):
+	# -- Missing keypoints are stored as NaN rows, cv2 needs integer pixel coords
+	found = ~np.isnan(keypoints[:, 0])
+	pixels = np.rint(np.nan_to_num(keypoints)).astype(int)
+
 	# -- Draw Skeleton based on detected keypoints
 	for edge in SKELETON_BONES:
 		# -- edge = [ firstKeypointID, secondKeypointID ] tells us which keypoints we should connect
 		keyA, keyB = edge
 		
-		# -- Both not None type
-		if keypoints[keyA] and keypoints[keyB]:
+		# -- Both keypoints found
+		if found[keyA] and found[keyB]:
+			pointA = tuple(pixels[keyA])
+			pointB = tuple(pixels[keyB])
+
 			# -- Draw line between them on translated sheet, and not translated sheet
-			
 			if drawGesture == True:
-				cv2.line(image, keypoints[keyA], keypoints[keyB], 0, 10, lineType=cv2.LINE_AA)
+				cv2.line(image, pointA, pointB, 0, 10, lineType=cv2.LINE_AA)
 			else:
 				# -- Draw colored skeleton on hand image 
-				cv2.line(image, keypoints[keyA], keypoints[keyB], (255,0 ,0), 3, lineType=cv2.LINE_AA)
-				cv2.circle(image, keypoints[keyA], 5, (0, 0, 255), thickness=-1, lineType=cv2.FILLED)
-				cv2.circle(image, keypoints[keyB], 5, (0, 0, 255), thickness=-1, lineType=cv2.FILLED)
+				cv2.line(image, pointA, pointB, (255,0 ,0), 3, lineType=cv2.LINE_AA)
+				cv2.circle(image, pointA, 5, (0, 0, 255), thickness=-1, lineType=cv2.FILLED)
+				cv2.circle(image, pointB, 5, (0, 0, 255), thickness=-1, lineType=cv2.FILLED)
+
+def decodeHeatmaps(heatmaps, outRows, outCols, refine=True):
+	"""
+	# Take (nPoints, mapRows, mapCols) keypoint probability maps straight from the network
+	# Return (nPoints, 2) array of (x, y) coords scaled to (outRows, outCols) and (nPoints,) confidences
+	"""
+	nMaps, mapRows, mapCols = heatmaps.shape
+	flatMaps = heatmaps.reshape(nMaps, -1)
+
+	# -- One argmax over all channels instead of resize + minMaxLoc per keypoint
+	peaks = np.argmax(flatMaps, axis=1)
+	confidences = flatMaps[np.arange(nMaps), peaks]
+	rows, cols = np.divmod(peaks, mapCols)
+	coords = np.stack((cols, rows), axis=1).astype(np.float32)
+
+	if refine:
+		# -- Sub-pixel refinement: fit a parabola through the peak and its two neighbours on each axis
+		for axis, size in ((0, mapCols), (1, mapRows)):
+			center = coords[:, axis].astype(int)
+			before = np.clip(center - 1, 0, size - 1)
+			after = np.clip(center + 1, 0, size - 1)
+
+			if axis == 0:
+				lower = heatmaps[np.arange(nMaps), rows, before]
+				upper = heatmaps[np.arange(nMaps), rows, after]
+			else:
+				lower = heatmaps[np.arange(nMaps), before, cols]
+				upper = heatmaps[np.arange(nMaps), after, cols]
+
+			curvature = lower - 2 * confidences + upper
+			interior = (center > 0) & (center < size - 1) & (curvature < 0)
+			offset = np.zeros(nMaps, dtype=np.float32)
+			offset[interior] = 0.5 * (lower[interior] - upper[interior]) / curvature[interior]
+			coords[:, axis] += np.clip(offset, -0.5, 0.5)
+
+	# -- Map pixel centers from network output resolution to requested resolution
+	coords[:, 0] = (coords[:, 0] + 0.5) * (outCols / mapCols) - 0.5
+	coords[:, 1] = (coords[:, 1] + 0.5) * (outRows / mapRows) - 0.5
+
+	return coords, confidences
 
 def getCenteredKeypoints(points, imgRows, imgCols):
 	# -- From points we take only which we have found
-	foundPoints = [ p for p in points if p ]
-
-	if len(foundPoints) < 2:
-		return [ p for p in points ]
+	found = ~np.isnan(points[:, 0])
 
-	minRow = imgRows + 1 
-	maxRow = -1 
-	minCol = imgCols + 1 
-	maxCol = -1 
+	if np.count_nonzero(found) < 2:
+		return np.copy(points)
 
-	for x,y in foundPoints:
-		minRow = min(minRow, y)
-		maxRow = max(maxRow, y)
-		minCol = min(minCol, x)
-		maxCol = max(maxCol, x)
+	minCol, minRow = np.min(points[found], axis=0)
+	maxCol, maxRow = np.max(points[found], axis=0)
 
-	centerBoxRow = minRow + (maxRow - minRow)//2
-	centerBoxCol = minCol + (maxCol - minCol)//2
-	centerVector = (imgCols//2 - centerBoxCol, imgRows//2 - centerBoxRow)
+	centerBoxRow = minRow + (maxRow - minRow)/2
+	centerBoxCol = minCol + (maxCol - minCol)/2
+	centerVector = np.array((imgCols//2 - centerBoxCol, imgRows//2 - centerBoxRow), dtype=points.dtype)
 
-	centeredPoints  =  [ (p[0] + centerVector[0], p[1] + centerVector[1]) if p else None for p in points ]
+	# -- Missing (NaN) points stay missing after translation
+	centeredPoints = points + centerVector
 	return centeredPoints
 
 def getTransformedKeypoints(points, imgRows, imgCols):
-	# -- Not made yet
-	foundPoints = [ p for p in points if p ]
+	found = ~np.isnan(points[:, 0])
 
-	if len(foundPoints) < 2:
-		return [p for p in points]
+	if np.count_nonzero(found) < 2:
+		return np.copy(points)
 
-	minRow = imgRows + 1 
-	maxRow = -1 
-	minCol = imgCols + 1 
-	maxCol = -1 
-
-	for x,y in foundPoints:
-		minRow = min(minRow, y)
-		maxRow = max(maxRow, y)
-		minCol = min(minCol, x)
-		maxCol = max(maxCol, x)
+	minCol, minRow = np.min(points[found], axis=0)
+	maxCol, maxRow = np.max(points[found], axis=0)
 
 	boxRows = maxRow - minRow 
 	boxCols = maxCol - minCol
@@ -107,68 +200,294 @@ def getTransformedKeypoints(points, imgRows, imgCols):
 	
 	border = 5
 
-	if minRowDist < minColDist:
+	# -- Points in one spot have no size to scale, points on one line are scaled along the other side
+	if boxRows <= 0 and boxCols <= 0:
+		return np.copy(points)
+
+	if (minRowDist < minColDist and boxRows > 0) or boxCols <= 0:
 		scalar = (boxRows + 2*(minRowDist - border)) / boxRows 
 	else: 
 		scalar = (boxCols + 2*(minColDist - border)) / boxCols 
 
-	centerRow = imgRows // 2
-	centerCol = imgCols // 2
+	center = np.array((imgCols // 2, imgRows // 2), dtype=points.dtype)
 	
-	transformedPoints  =  [ (centerCol + int(scalar*(p[0] - centerCol)), centerRow + int(scalar*(p[1] - centerRow))) if p else None for p in points ]
+	transformedPoints = center + scalar * (points - center)
 	return transformedPoints
 
 
-def drawHandGesture(hand):
-	# -- Copy current hand sector
-	skeleton = np.copy(hand)
+class Workspace:
+	"""
+	# Preallocated buffers of one recognition session, reused in place for every frame instead of new arrays:
+	# hand crop, skeleton image, gesture canvas, keypoint network input tensor (one per input size) and CNN input
+	# Images returned by functions given a workspace stay valid until that workspace processes another frame
+	"""
+	def __init__(self, handRows=training_rows * 10, handCols=training_cols * 10):
+		self.hand = np.zeros((handRows, handCols, 3), dtype=np.uint8)
+		self.skeleton = np.zeros((handRows, handCols, 3), dtype=np.uint8)
+		self.gesture = np.zeros((handRows, handCols, 1), dtype=np.uint8)
+		self.gestureSmall = np.zeros((training_rows, training_cols), dtype=np.uint8)
+		self.gestureInput = np.zeros((1, training_rows, training_cols, 1), dtype=np.float32)
+		self.inputs = {}
+
+	def copyHand(self, image):
+		np.copyto(self.hand, image)
+		return self.hand
+
+	def blob(self, image, blobSize):
+		"""
+		# Same as cv2.dnn.blobFromImage(image, 1.0/255, blobSize), written into the fixed input tensor of blobSize = (cols, rows)
+		"""
+		if blobSize not in self.inputs:
+			cols, rows = blobSize
+			self.inputs[blobSize] = (np.zeros((rows, cols, 3), dtype=np.uint8), np.zeros((1, 3, rows, cols), dtype=np.float32))
+		resized, blob = self.inputs[blobSize]
+
+		if image.shape[1::-1] != blobSize:
+			image = cv2.resize(image, blobSize, dst=resized)
+
+		# -- HWC uint8 -> CHW float32 scaled to [0, 1], casting copy first: ufunc with casting would allocate its own buffers
+		np.copyto(blob[0], image.transpose(2, 0, 1))
+		blob *= np.float32(1.0/255)
+		return blob
+
+	def gestureData(self, handGesture):
+		# -- Same as imageIntoData(handGesture, resize=True)
+		cv2.resize(handGesture, (training_cols, training_rows), dst=self.gestureSmall)
+		np.copyto(self.gestureInput[0, :, :, 0], self.gestureSmall)
+		self.gestureInput *= np.float32(1.0/255)
+		return self.gestureInput
+
+def detectKeypoints(hand, inputSize=None, roi=None, workspace=None):
+	"""
+	# Detect keypoints in hand image, or only in its roi = (x, y, cols, rows) part
+	# Network input is (inputSize x inputSize), None means module's netInputSize (or the crop size when that is None too)
+	# With workspace the network input is written into its preallocated tensor
+	# Return (22, 2) keypoints in hand image coords (NaN rows for missing points) and their confidences
+	"""
+	x, y = 0, 0
+	if roi is not None:
+		x, y, roiCols, roiRows = roi
+		hand = hand[y:y + roiRows, x:x + roiCols]
 
 	handRows, handCols, = hand.shape[:2]
 
-	# -- Blank canvas for drawing gestures
-	whiteClean = np.zeros((handRows, handCols, 1))
-	whiteClean[:,:,:] = 255
+	if inputSize is None:
+		inputSize = netInputSize
+	blobSize = (inputSize, inputSize) if inputSize else (handRows, handCols)
 
 	# -- Get Blob from hand image
-	blob = cv2.dnn.blobFromImage(hand, 1.0/255 , (handRows, handCols), (0,0,0), swapRB=False, crop=False)
+	if workspace is not None:
+		blob = workspace.blob(hand, blobSize)
+	else:
+		blob = cv2.dnn.blobFromImage(hand, 1.0/255 , blobSize, (0,0,0), swapRB=False, crop=False)
 
 	# -- Detect keypoints in a hand
-	netOutput = hand_detection_engine.infer(blob)
-	points = []
-
-	# -- Scan DNN output for every keypoint
-	for keypointID in range(nPoints):
-		# -- Get probability map for current keypoint
-		probabilityMap = netOutput[0, keypointID, :, :]
-		probabilityMap = cv2.resize(probabilityMap, (handRows, handCols))
-
-		# -- Find most probable coords for current keypoint
-		mapMinProbability, mapMaxProbability, mapMinPoint, mapMaxPoint = cv2.minMaxLoc(probabilityMap)
-
-		# -- if probability that current coords are our keypoint exceeds 
-		# -- set value we add this point to list  
-		if mapMaxProbability >= requiredProbability:
-			points.append((int(mapMaxPoint[0]), int(mapMaxPoint[1])))
+	netOutput = hand_detection_engine.get().infer(blob)
+
+	return keypointsFromNetOutput(netOutput, handRows, handCols, (x, y))
+
+def keypointsFromNetOutput(netOutput, handRows, handCols, offset=(0, 0)):
+	"""
+	# Turn (1, channels, mapRows, mapCols) keypoint network output for a (handRows, handCols) image
+	# into (22, 2) keypoints moved by offset (NaN rows for missing points) and their confidences
+	"""
+	with perf.monitor.timer("decoding"):
+		# -- Decode all keypoint probability maps at network output resolution at once
+		points, confidences = decodeHeatmaps(netOutput[0, :nPoints], handRows, handCols)
+		points += offset
+
+		# -- if probability that current coords are our keypoint is below 
+		# -- set value we mark this point as missing
+		points[confidences < requiredProbability] = np.nan
+
+	return (points, confidences)
+
+class HandTracker:
+	"""
+	# Runs keypoint network at lower resolution on a tight crop around previous frame's keypoints
+	# Falls back to the full hand box (at full resolution) when median keypoint confidence drops below requiredProbability
+	"""
+	def __init__(self, trackingSize=184, margin=0.25, minCropSize=96):
+		self.trackingSize = trackingSize
+		self.margin = margin
+		self.minCropSize = minCropSize
+		self.roi = None
+		self.trackedFrames = 0
+		self.fullFrames = 0
+
+	def detect(self, hand, workspace=None):
+		if self.roi is not None:
+			points, confidences = detectKeypoints(hand, self.trackingSize, self.roi, workspace)
+			if np.median(confidences) >= requiredProbability:
+				self.trackedFrames += 1
+				self.roi = self.nextRoi(points, hand.shape)
+				return (points, confidences)
+
+		points, confidences = detectKeypoints(hand, workspace=workspace)
+		self.fullFrames += 1
+		if np.median(confidences) >= requiredProbability:
+			self.roi = self.nextRoi(points, hand.shape)
 		else:
-			points.append(None)
+			self.roi = None
+
+		return (points, confidences)
+
+	def nextRoi(self, points, handShape):
+		# -- Square box around found keypoints enlarged by margin, clipped to hand image
+		found = ~np.isnan(points[:, 0])
+		if np.count_nonzero(found) < 2:
+			return None
+
+		handRows, handCols = handShape[:2]
+		minCol, minRow = np.min(points[found], axis=0)
+		maxCol, maxRow = np.max(points[found], axis=0)
+
+		size = max(maxCol - minCol, maxRow - minRow) * (1 + 2 * self.margin)
+		size = int(min(max(size, self.minCropSize), handRows, handCols))
+
+		x = int(np.clip((minCol + maxCol - size) / 2, 0, handCols - size))
+		y = int(np.clip((minRow + maxRow - size) / 2, 0, handRows - size))
 
-	centeredPoints = getCenteredKeypoints(points, handRows, handCols)
-	transformedPoints = getTransformedKeypoints(centeredPoints, handRows, handCols)
+		return (x, y, size, size)
 
-	handGesture = np.copy(whiteClean)
+	def reset(self):
+		# -- Next frame is a different view (e.g. hand box moved), search the full hand box again
+		self.roi = None
+
+def normalizeKeypoints(points, imgRows, imgCols):
+	# -- Gesture is drawn centered and scaled to fill the canvas
+	centeredPoints = getCenteredKeypoints(points, imgRows, imgCols)
+	return getTransformedKeypoints(centeredPoints, imgRows, imgCols)
+
+def drawGestureCanvas(points, handRows, handCols, canvas=None):
+	# -- Blank canvas for drawing gestures (new one, or given (handRows, handCols, 1) uint8 canvas cleaned in place)
+	if canvas is None:
+		canvas = np.empty((handRows, handCols, 1), dtype=np.uint8)
+	canvas.fill(255)
+
+	drawSkeleton(canvas, normalizeKeypoints(points, handRows, handCols), drawGesture=True)
+	return canvas
+
+def renderHandGesture(hand, points, workspace=None):
+	# -- Copy current hand sector
+	if workspace is not None:
+		skeleton = workspace.skeleton
+		np.copyto(skeleton, hand)
+	else:
+		skeleton = np.copy(hand)
+
+	handRows, handCols, = hand.shape[:2]
 
 	drawSkeleton(skeleton, points)
-	drawSkeleton(handGesture, transformedPoints, drawGesture=True)  
+	handGesture = drawGestureCanvas(points, handRows, handCols, workspace.gesture if workspace is not None else None)
 
 	return (skeleton, handGesture)
 
+def drawHandGesture(hand):
+	points, confidences = detectKeypoints(hand)
+	return renderHandGesture(hand, points)
+
+
+class GestureCache:
+	"""
+	# LRU cache of CNN predictions keyed on normalized keypoints quantized to grid pixels (and which points are missing)
+	# Frames showing the same pose give the same key, so the gesture is not drawn and classified again
+	"""
+	def __init__(self, grid=4.0, maxSize=1024):
+		self.grid = grid
+		self.maxSize = maxSize
+		self.entries = OrderedDict()
+		self.lock = threading.Lock()
+		self.hits = 0
+		self.misses = 0
+
+	def key(self, points, handRows, handCols):
+		normalized = normalizeKeypoints(points, handRows, handCols)
+		found = ~np.isnan(normalized[:, 0])
+		cells = np.zeros(normalized.shape, dtype=np.int32)
+		cells[found] = np.floor(normalized[found] / self.grid)
+		return found.tobytes() + cells.tobytes()
+
+	def get(self, key):
+		with self.lock:
+			if key in self.entries:
+				self.entries.move_to_end(key)
+				self.hits += 1
+				return self.entries[key]
+			self.misses += 1
+			return None
+
+	def put(self, key, prediction):
+		with self.lock:
+			self.entries[key] = prediction
+			self.entries.move_to_end(key)
+			while len(self.entries) > self.maxSize:
+				self.entries.popitem(last=False)
+
+	def clear(self):
+		with self.lock:
+			self.entries.clear()
+
+	def stats(self):
+		with self.lock:
+			lookups = self.hits + self.misses
+			return { "hits": self.hits, "misses": self.misses, "size": len(self.entries),
+				"hit_rate": self.hits / lookups if lookups else 0.0 }
+
+# --- Memoization of CNN predictions is approximate (similar poses share an answer), so it is off (None)
+# --- unless the application sets a GestureCache here, e.g. the live recognition loop
+gestureCache = None
+
+def gestureProbabilities(handGesture, points=None, handShape=(training_rows * 10, training_cols * 10), workspace=None):
+	"""
+	# Probabilities of every alphabet letter for gesture drawn on handGesture canvas (whole CNN softmax output, read-only)
+	# When keypoints are given, a pose seen before is answered from gestureCache, handGesture can then be None
+	# and is drawn from points (with handShape canvas size) only when the CNN has to run
+	# With workspace the canvas and CNN input are its preallocated buffers
+	"""
+	key = None
+	if points is not None and gestureCache is not None:
+		handRows, handCols = handGesture.shape[:2] if handGesture is not None else handShape
+		key = gestureCache.key(points, handRows, handCols)
+		cached = gestureCache.get(key)
+		if cached is not None:
+			return cached
+
+	if handGesture is None:
+		handGesture = drawGestureCanvas(points, *handShape, workspace.gesture if workspace is not None else None)
 
-def predictGesture(handGesture):
 	# -- Extract training data from translated hand skeleton
-	inputData = imageIntoData(handGesture, resize=True)
-	# -- Predict current gesture skeleton, and print this prediction with given probability 
-	res = model.predict(inputData)[0]
+	with perf.monitor.timer("classification"):
+		if workspace is not None:
+			inputData = workspace.gestureData(handGesture)
+		else:
+			inputData = imageIntoData(handGesture, resize=True)
+		# -- Predict current gesture skeleton, and print this prediction with given probability 
+		res = model.get()(inputData)[0]
+
+	if key is not None:
+		gestureCache.put(key, res)
+
+	return res
+
+def predictGesture(handGesture, points=None, handShape=(training_rows * 10, training_cols * 10), workspace=None):
+	"""
+	# Classify gesture drawn on handGesture canvas (see gestureProbabilities), return (letter, its probability)
+	"""
+	res = gestureProbabilities(handGesture, points, handShape, workspace)
 	y = np.argmax(res)
 	predictedLetter = alphabet[y]
 
 	return (predictedLetter, res[y])  
+
+def keypointProbabilities(points):
+	# -- Classify gesture straight from detected keypoints, without drawing skeleton and running CNN
+	with perf.monitor.timer("classification"):
+		return keypointModel.get().predict(keypoint_features(points))
+
+def predictGestureFromKeypoints(points):
+	res = keypointProbabilities(points)
+	y = np.argmax(res)
+	predictedLetter = alphabet[y]
+
+	return (predictedLetter, res[y])
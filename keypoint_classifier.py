@@ -0,0 +1,83 @@
+import numpy as np
+
+# --- Set Skeleton 'Bones' (edges) based on 22 hand keypoints
+# --- returned by DNN model
+SKELETON_BONES = [
+    [0,1], [1,2], [2,5], [5,9], [9,13], [13,17],[17,0], # Palm
+    [2,3], [3,4], # Thumb
+    [5,6], [6,7], [7,8], # Index Finger
+    [9, 10], [10, 11], [11, 12], # Middle Finger
+    [13, 14], [14,15], [15, 16], # Ring Finger
+    [17, 18], [18,19], [19, 20] # Little Finger
+]
+
+N_POINTS = 22
+PAIRS = np.triu_indices(N_POINTS, k=1)
+BONES = np.array(SKELETON_BONES)
+N_FEATURES = len(PAIRS[0]) + 2 * len(BONES) + N_POINTS
+
+
+def keypoint_features(points):
+    """
+    Turn (22, 2) keypoints (NaN rows for missing points) into a translation and scale invariant feature vector:
+    pairwise distances divided by the largest one, (cos, sin) of every bone direction and the missing points mask.
+    Features involving a missing point are 0.
+    """
+    found = ~np.isnan(points[:, 0])
+    filled = np.where(found[:, None], points, 0.0)
+
+    distances = np.linalg.norm(filled[PAIRS[0]] - filled[PAIRS[1]], axis=1)
+    distances[~(found[PAIRS[0]] & found[PAIRS[1]])] = 0.0
+    scale = distances.max()
+    if scale > 0:
+        distances /= scale
+
+    bones = filled[BONES[:, 1]] - filled[BONES[:, 0]]
+    lengths = np.linalg.norm(bones, axis=1)
+    valid = found[BONES[:, 0]] & found[BONES[:, 1]] & (lengths > 0)
+    directions = np.zeros_like(bones)
+    directions[valid] = bones[valid] / lengths[valid, None]
+
+    return np.concatenate((distances, directions.ravel(), (~found).astype(distances.dtype))).astype(np.float32)
+
+
+class KeypointClassifier:
+    """
+    Small dense network over keypoint_features(), evaluated with plain NumPy.
+    Weights are trained with Keras in train_model.py and stored as .npz, so predicting needs neither Keras nor TensorFlow.
+    """
+    def __init__(self, weights, biases):
+        self.weights = weights
+        self.biases = biases
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        layers = len(data.files) // 2
+        return cls([data['W%d' % i] for i in range(layers)], [data['b%d' % i] for i in range(layers)])
+
+    @classmethod
+    def from_keras(cls, model):
+        # only Dense layers carry weights, Dropout layers are skipped
+        layers = [layer.get_weights() for layer in model.layers if layer.get_weights()]
+        return cls([W for W, b in layers], [b for W, b in layers])
+
+    def save(self, path):
+        arrays = {}
+        for i, (W, b) in enumerate(zip(self.weights, self.biases)):
+            arrays['W%d' % i] = W
+            arrays['b%d' % i] = b
+        np.savez(path, **arrays)
+
+    def predict(self, features):
+        """
+        Return class probabilities for one feature vector or a (samples, features) batch.
+        """
+        x = features
+        for W, b in zip(self.weights[:-1], self.biases[:-1]):
+            x = np.maximum(x @ W + b, 0)
+
+        logits = x @ self.weights[-1] + self.biases[-1]
+        logits = logits - logits.max(axis=-1, keepdims=True)
+        exp = np.exp(logits)
+        return exp / exp.sum(axis=-1, keepdims=True)
@@ -0,0 +1,72 @@
+# --- Synthetic load generator for recognition_server.py
+# --- Several simulated kiosks post hand images (examples/*.jpg by default) concurrently
+# --- and report request latency percentiles, throughput and server metrics
+
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from urllib.request import Request, urlopen
+
+from utils.perf import summarize_latencies
+
+def parseArguments():
+	parser = argparse.ArgumentParser(description="Synthetic load for the recognition server")
+	parser.add_argument("--url", default="http://127.0.0.1:8765", help="recognition server address")
+	parser.add_argument("--clients", type=int, default=4, help="number of concurrent simulated kiosks")
+	parser.add_argument("--requests", type=int, default=50, help="requests sent by every client")
+	parser.add_argument("--images", default="examples", help="directory with hand images")
+	return parser.parse_args()
+
+def loadImages(directory):
+	images = []
+	for name in sorted(os.listdir(directory)):
+		if name.lower().endswith(".jpg") and "_skeleton" not in name:
+			with open(os.path.join(directory, name), "rb") as f:
+				images.append(f.read())
+	return images
+
+def runClient(url, images, requests, latencies, errors):
+	for i in range(requests):
+		request = Request(url + "/recognize", data=images[i % len(images)], headers={"Content-Type": "image/jpeg"})
+		s = time.perf_counter()
+		try:
+			with urlopen(request) as response:
+				json.loads(response.read())
+		except Exception as error:
+			errors.append(str(error))
+			continue
+		latencies.append(time.perf_counter() - s)
+
+def runLoad(url, images, clients, requests):
+	"""
+	# Return (summary of request latencies with overall throughput, errors)
+	"""
+	latencies = []
+	errors = []
+	threads = [ threading.Thread(target=runClient, args=(url, images, requests, latencies, errors)) for c in range(clients) ]
+
+	s = time.perf_counter()
+	for thread in threads:
+		thread.start()
+	for thread in threads:
+		thread.join()
+	elapsed = time.perf_counter() - s
+
+	summary = summarize_latencies(latencies)
+	# -- clients run concurrently, so throughput is measured on wall clock time
+	summary["throughput"] = len(latencies) / elapsed
+	return summary, errors
+
+if __name__ == '__main__':
+	args = parseArguments()
+	summary, errors = runLoad(args.url, loadImages(args.images), args.clients, args.requests)
+
+	print(json.dumps(summary, indent=2))
+	if errors:
+		print(len(errors), "failed requests, first error:", errors[0], file=sys.stderr)
+
+	with urlopen(args.url + "/metrics") as response:
+		print(json.dumps(json.loads(response.read()), indent=2))
@@ -1,20 +1,19 @@
 import onnx
 import time
-from utils.perf import LatencyCalc
+from utils import perf
+from base_inf import InferenceEngine
 import ngraph as ng
 from ngraph_onnx.onnx_importer.importer import import_onnx_model
 
-class NgraphInference:
+class NgraphInference(InferenceEngine):
     """
     Creates an nGraph based inference engine for a ONNX model.
-    Optionally the engine can measure average latency time for all inferences of an instance of this engine.
+    The compiled computation has the fixed input shape of the model, so batches are run crop by crop.
+    Optionally the engine records latency of every inference in the 'keypoint_inference' timer of utils.perf.monitor.
     """
-    def __init__(self, model_path, measure_latency = False):
+    def __init__(self, model_path, measure_latency = True):
         self.ng_exe = self.prepare_ngraph_exe(model_path)
         self.measure_latency = measure_latency
-        
-        if measure_latency:
-            self.perf = LatencyCalc()
 
     def prepare_ngraph_exe(self, model_path):
         onnx_protobuf = onnx.load(model_path)
@@ -28,10 +27,6 @@ class NgraphInference:
         inference_end = time.perf_counter()
 
         if self.measure_latency:
-            self.calculate_avg_latency(inference_start, inference_end)
+            perf.monitor.record("keypoint_inference", inference_end - inference_start, inference_end)
         
         return output
-
-    def calculate_avg_latency(self, inference_start, inference_end):
-        avg_inference_latency = self.perf.calc_inference_latency(inference_start, inference_end)
-        print("AVG nGraph latency: %.2f ms" % avg_inference_latency)
@@ -0,0 +1,146 @@
+# --- Headless batch mode of the recognition pipeline
+# --- Runs keypoint detection and gesture prediction over a video file
+# --- or a directory of images on a pool of worker processes
+# --- and streams one JSON record per frame (JSONL)
+
+import os
+import sys
+import cv2
+import json
+import time
+import argparse
+import itertools
+import numpy as np
+from collections import deque
+from multiprocessing import Pool
+
+import train_model
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+hand_rows = train_model.training_rows * 10
+hand_cols = train_model.training_cols * 10
+
+def parseArguments():
+	parser = argparse.ArgumentParser(description="Headless sign alphabet recognition over recorded data")
+	parser.add_argument("input", help="path to video file or directory with images")
+	parser.add_argument("--output", help="path to output JSONL file (default: stdout)")
+	parser.add_argument("--workers", type=int, default=os.cpu_count(), help="number of worker processes")
+	parser.add_argument("--chunksize", type=int, default=4, help="frames sent to a worker at once")
+	parser.add_argument("--box", type=int, nargs=2, metavar=("ULX", "ULY"),
+		help="upper left corner of the hand box cut out of every frame (default: whole frame is the hand)")
+	parser.add_argument("--net-size", type=int, default=None,
+		help="keypoint network input resolution, e.g. 184, 224 or 280 (default: hand box size)")
+	return parser.parse_args()
+
+# --- Every worker process loads and warms up both models only once
+def initWorker(netInputSize):
+	global hand_processing, workspace
+	import hand_processing
+	hand_processing.netInputSize = netInputSize
+	# -- relabeled data must be exact CNN output, not answers cached for similar poses
+	hand_processing.gestureCache = None
+	hand_processing.warmUp()
+	# -- frames of one worker are processed one by one, always in the same buffers
+	workspace = hand_processing.Workspace(hand_rows, hand_cols)
+
+def cutOutHand(frame, box):
+	if box is None:
+		if frame.shape[:2] != (hand_rows, hand_cols):
+			frame = cv2.resize(frame, (hand_cols, hand_rows))
+		return frame
+
+	ulx, uly = box
+	return frame[uly:uly + hand_rows, ulx:ulx + hand_cols, :]
+
+def processFrame(task):
+	source, frameID, frame, box = task
+
+	# -- Images are decoded in the worker, video frames are already decoded
+	if isinstance(frame, str):
+		frame = cv2.imread(frame)
+		if frame is None:
+			return {"source": source, "frame": frameID, "error": "cannot decode image"}
+
+	hand = cutOutHand(frame, box)
+
+	s = time.perf_counter()
+	points, confidences = hand_processing.detectKeypoints(hand, workspace=workspace)
+	keypointsTime = time.perf_counter() - s
+
+	s = time.perf_counter()
+	predictedLetter, prob = hand_processing.predictGesture(None, points, hand.shape[:2], workspace)
+	classificationTime = time.perf_counter() - s
+
+	return {
+		"source": source,
+		"frame": frameID,
+		"letter": predictedLetter,
+		"probability": float(prob),
+		"keypoints": [ None if np.isnan(x) else [float(x), float(y)] for x, y in points ],
+		"confidences": [ float(c) for c in confidences ],
+		"timing": {
+			"keypoints_ms": keypointsTime * 1000,
+			"classification_ms": classificationTime * 1000,
+		},
+	}
+
+def generateTasks(inputPath, box):
+	if os.path.isdir(inputPath):
+		for frameID, name in enumerate(sorted(os.listdir(inputPath))):
+			if name.lower().endswith(IMAGE_EXTENSIONS):
+				yield (name, frameID, os.path.join(inputPath, name), box)
+		return
+
+	cap = cv2.VideoCapture(inputPath)
+	if not cap.isOpened():
+		raise SystemExit("Could not open video file " + inputPath)
+
+	frameID = 0
+	while True:
+		ret, frame = cap.read()
+		if not ret:
+			break
+		# -- send only the hand sector to workers
+		yield (inputPath, frameID, np.ascontiguousarray(cutOutHand(frame, box)), None)
+		frameID += 1
+
+	cap.release()
+
+def processChunk(process, tasks):
+	return [ process(task) for task in tasks ]
+
+def imapBounded(pool, process, tasks, chunksize, window):
+	"""
+	# Like pool.imap(process, tasks, chunksize), but at most window chunks are submitted and not returned yet,
+	# so tasks (decoded video frames) are read only as fast as workers process them, not all at once
+	"""
+	tasks = iter(tasks)
+	pending = deque()
+	for chunk in iter(lambda: list(itertools.islice(tasks, chunksize)), []):
+		pending.append(pool.apply_async(processChunk, (process, chunk)))
+		if len(pending) >= window:
+			yield from pending.popleft().get()
+
+	while pending:
+		yield from pending.popleft().get()
+
+if __name__ == '__main__':
+	args = parseArguments()
+	output = open(args.output, 'w') if args.output else sys.stdout
+
+	frames = 0
+	s = time.perf_counter()
+
+	with Pool(args.workers, initializer=initWorker, initargs=(args.net_size,)) as pool:
+		# -- two chunks per worker keep all of them busy while parent holds only a few frames
+		for record in imapBounded(pool, processFrame, generateTasks(args.input, args.box), args.chunksize, 2 * args.workers):
+			output.write(json.dumps(record) + "\n")
+			frames += 1
+
+	e = time.perf_counter()
+	if output is not sys.stdout:
+		output.close()
+
+	print("Processed {} frames in {:.2f} s ({:.2f} frames/s) with {} workers".format(
+		frames, e - s, frames / max(e - s, 1e-9), args.workers), file=sys.stderr)
@@ -1,9 +1,35 @@
-from cv2.dnn import readNetFromCaffe
+import time
+from cv2.dnn import readNetFromCaffe, readNetFromONNX
+from utils import perf
+from base_inf import InferenceEngine
 
-class OpencvInference:
-    def __init__(self, model_path, weights_path):
-        self.net = readNetFromCaffe(model_path, weights_path)
+class OpencvInference(InferenceEngine):
+    """
+    OpenCV DNN inference engine for a Caffe (prototxt + caffemodel) or, without weights_path, an ONNX model.
+    Optionally the engine records latency of every inference in the 'keypoint_inference' timer of utils.perf.monitor.
+    backend and target are cv2.dnn.DNN_BACKEND_* and cv2.dnn.DNN_TARGET_* constants, None keeps OpenCV's choice.
+    """
+    # OpenCV DNN reshapes the network to the batch size of the input blob
+    supports_batching = True
+
+    def __init__(self, model_path, weights_path=None, measure_latency = True, backend=None, target=None):
+        if weights_path is None:
+            self.net = readNetFromONNX(model_path)
+        else:
+            self.net = readNetFromCaffe(model_path, weights_path)
+        if backend is not None:
+            self.net.setPreferableBackend(backend)
+        if target is not None:
+            self.net.setPreferableTarget(target)
+        self.measure_latency = measure_latency
 
     def infer(self, input):
+        inference_start = time.perf_counter()
         self.net.setInput(input)
-        return self.net.forward()
+        output = self.net.forward()
+        inference_end = time.perf_counter()
+
+        if self.measure_latency:
+            perf.monitor.record("keypoint_inference", inference_end - inference_start, inference_end)
+
+        return output
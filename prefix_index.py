@@ -0,0 +1,246 @@
+import os
+import mmap
+import struct
+
+import numpy as np
+
+class PrefixIndex:
+    """
+    In-process replacement of words_prediction/trie_words_predictor.
+    Array-backed trie: node i is described by children[i] (letter -> node id) and completions[i],
+    the precomputed top-k word ids under that node ranked by word frequency (ties by first appearance).
+    A query is a walk down len(prefix) nodes, no subtree search and no rebuilding of words.
+    """
+    def __init__(self, k=5):
+        self.k = k
+        self.words = []
+        self.frequencies = []
+        self.word_ids = {}
+        self.children = [{}]
+        self.completions = [[]]
+
+    @classmethod
+    def from_file(cls, path, k=5):
+        # same tokenization as the C++ predictor: words separated by any whitespace,
+        # frequency of a word is the number of its occurrences in the file
+        with open(path, encoding='utf-8') as dictionary:
+            return cls.from_words(dictionary.read().split(), k)
+
+    @classmethod
+    def from_words(cls, words, k=5):
+        index = cls(k)
+        counts = {}
+        for word in words:
+            counts[word] = counts.get(word, 0) + 1
+
+        index.words = list(counts)
+        index.frequencies = list(counts.values())
+        index.word_ids = {word: i for i, word in enumerate(index.words)}
+
+        # inserting the best ranked words first, every node only has to take the first k words reaching it
+        ranking = sorted(range(len(index.words)), key=index._rank)
+        for word_id in ranking:
+            for node in index._path(index.words[word_id]):
+                if len(index.completions[node]) < k:
+                    index.completions[node].append(word_id)
+
+        return index
+
+    def _rank(self, word_id):
+        return (-self.frequencies[word_id], word_id)
+
+    def _path(self, word):
+        # yields ids of all nodes from root down to the word end, creating missing ones
+        node = 0
+        yield node
+        for letter in word:
+            child = self.children[node].get(letter)
+            if child is None:
+                child = len(self.children)
+                self.children.append({})
+                self.completions.append([])
+                self.children[node][letter] = child
+            node = child
+            yield node
+
+    def child(self, node, letter):
+        """
+        Return id of the node reached from node by letter, or None when no word continues that way.
+        Node 0 is the root (empty prefix), so a prefix can be walked one letter at a time.
+        """
+        return self.children[node].get(letter)
+
+    def _find(self, prefix):
+        node = 0
+        for letter in prefix:
+            node = self.child(node, letter)
+            if node is None:
+                return None
+        return node
+
+    def add_word(self, word, count=1):
+        """
+        Add a new word or increase frequency of a known one, updating top-k lists along its path.
+        """
+        word_id = self.word_ids.get(word)
+        if word_id is None:
+            word_id = len(self.words)
+            self.words.append(word)
+            self.frequencies.append(0)
+            self.word_ids[word] = word_id
+        self.frequencies[word_id] += count
+
+        for node in self._path(word):
+            completions = self.completions[node]
+            if word_id not in completions:
+                if len(completions) == self.k and self._rank(word_id) > self._rank(completions[-1]):
+                    continue
+                completions.append(word_id)
+            completions.sort(key=self._rank)
+            del completions[self.k:]
+
+    def query(self, prefix, n=None):
+        """
+        Return up to n (default k) most frequent words starting with prefix.
+        """
+        node = self._find(prefix)
+        if node is None:
+            return []
+        return [self.words[word_id] for word_id in self.completions[node][:n]]
+
+    def __contains__(self, word):
+        return word in self.word_ids
+
+    def __len__(self):
+        return len(self.words)
+
+
+# Compiled dictionary format (little endian, all sections are uint32 arrays):
+# header | child_start[nodes+1] | edge_letter[edges] | edge_child[edges]
+#        | completion_start[nodes+1] | completions[...] | word_offset[words+1] | utf-8 word bytes
+COMPILED_MAGIC = b'PIDX'
+COMPILED_VERSION = 1
+COMPILED_HEADER = struct.Struct('<4sIIIIII')
+
+
+def compile_index(index, path):
+    """
+    Write a PrefixIndex into the flat binary format read by CompiledPrefixIndex.
+    """
+    child_start = [0]
+    edge_letter = []
+    edge_child = []
+    for children in index.children:
+        for letter in sorted(children):
+            edge_letter.append(ord(letter))
+            edge_child.append(children[letter])
+        child_start.append(len(edge_letter))
+
+    completion_start = [0]
+    completions = []
+    for node_completions in index.completions:
+        completions.extend(node_completions)
+        completion_start.append(len(completions))
+
+    encoded = [word.encode('utf-8') for word in index.words]
+    word_offset = np.zeros(len(encoded) + 1, dtype='<u4')
+    word_offset[1:] = np.cumsum([len(word) for word in encoded])
+
+    header = COMPILED_HEADER.pack(COMPILED_MAGIC, COMPILED_VERSION, index.k, len(index.children),
+                                  len(edge_letter), len(completions), len(encoded))
+
+    # write next to the target and swap, readers never see a partially written file
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as compiled:
+        compiled.write(header)
+        for section in (child_start, edge_letter, edge_child, completion_start, completions):
+            compiled.write(np.asarray(section, dtype='<u4').tobytes())
+        compiled.write(word_offset.tobytes())
+        compiled.write(b''.join(encoded))
+    os.replace(tmp_path, path)
+
+
+class CompiledPrefixIndex:
+    """
+    Read-only PrefixIndex backed by a memory-mapped compiled dictionary.
+    Loading only maps the file and creates uint32 views over its sections, nothing is parsed.
+    """
+    def __init__(self, path):
+        with open(path, 'rb') as compiled:
+            self.buffer = mmap.mmap(compiled.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, self.k, nodes, edges, completions, words = COMPILED_HEADER.unpack_from(self.buffer)
+        if magic != COMPILED_MAGIC or version != COMPILED_VERSION:
+            self.buffer.close()
+            raise ValueError('Not a compiled dictionary: ' + path)
+
+        # memoryview indexing returns plain ints, much cheaper per lookup than NumPy scalars
+        # (the cast uses native byte order, the format is little endian like every platform we run on)
+        self.view = memoryview(self.buffer)
+        offset = COMPILED_HEADER.size
+        sections = []
+        for length in (nodes + 1, edges, edges, nodes + 1, completions, words + 1):
+            sections.append(self.view[offset:offset + 4 * length].cast('I'))
+            offset += 4 * length
+        self.child_start, self.edge_letter, self.edge_child, self.completion_start, self.completions, self.word_offset = sections
+        self.words_start = offset
+        self.n_words = words
+
+    def child(self, node, letter):
+        code = ord(letter)
+        # children are sorted by letter, there are at most a few dozens of them
+        for edge in range(self.child_start[node], self.child_start[node + 1]):
+            if self.edge_letter[edge] == code:
+                return self.edge_child[edge]
+        return None
+
+    def _find(self, prefix):
+        node = 0
+        for letter in prefix:
+            node = self.child(node, letter)
+            if node is None:
+                return None
+        return node
+
+    def _word(self, word_id):
+        start = self.words_start + self.word_offset[word_id]
+        end = self.words_start + self.word_offset[word_id + 1]
+        return str(self.view[start:end], 'utf-8')
+
+    def query(self, prefix, n=None):
+        node = self._find(prefix)
+        if node is None:
+            return []
+        word_ids = self.completions[self.completion_start[node]:self.completion_start[node + 1]]
+        return [self._word(word_id) for word_id in word_ids[:n]]
+
+    def __len__(self):
+        return self.n_words
+
+    def close(self):
+        # views keep the map exported, release them before closing
+        for section in (self.child_start, self.edge_letter, self.edge_child,
+                        self.completion_start, self.completions, self.word_offset):
+            section.release()
+        self.view.release()
+        self.buffer.close()
+
+
+def load_compiled(dictionary_path, k=5, compiled_path=None):
+    """
+    Return a CompiledPrefixIndex for a text dictionary, (re)compiling it
+    when the compiled file is missing, older than the text file or built for a different k.
+    """
+    if compiled_path is None:
+        compiled_path = os.path.splitext(dictionary_path)[0] + '.idx'
+
+    if not os.path.exists(compiled_path) or os.path.getmtime(compiled_path) < os.path.getmtime(dictionary_path):
+        compile_index(PrefixIndex.from_file(dictionary_path, k), compiled_path)
+
+    index = CompiledPrefixIndex(compiled_path)
+    if index.k != k:
+        index.close()
+        compile_index(PrefixIndex.from_file(dictionary_path, k), compiled_path)
+        index = CompiledPrefixIndex(compiled_path)
+
+    return index
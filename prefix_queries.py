@@ -1,31 +1,266 @@
+import math
+import heapq
+import threading
+import numpy as np
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
 from subprocess import Popen, PIPE
 from sys import platform
 
+from utils import perf
+from prefix_index import PrefixIndex, load_compiled
+
 def runProcess(dictionaryName):
 
 	if platform == 'win32':
-		binaryFullName = 'words_prediction\\trie_words_predictor.exe '
+		binaryFullName = 'words_prediction\\trie_words_predictor.exe'
 	elif platform == 'linux' or platform == 'linux2':
-		binaryFullName = 'words_prediction/trie_words_predictor '
+		binaryFullName = 'words_prediction/trie_words_predictor'
 	else:
 		raise SystemError('Operating System is not recognized, make sure you are running under Linux or Windows OS')
 		
 	print(binaryFullName)
-	processHandle = Popen(binaryFullName + dictionaryName, stdin=PIPE,  stdout=PIPE, shell=True) 
+	# -- started without shell, so terminate() stops the predictor itself
+	processHandle = Popen([binaryFullName, dictionaryName], stdin=PIPE,  stdout=PIPE) 
 	return processHandle
 
 def queryProcess(processHandle, prefix):
-	if processHandle.poll():
-		return "trie_words_predictor not running\n"
+	if processHandle.poll() is not None:
+		raise BrokenPipeError("trie_words_predictor not running")
 	
 	processHandle.stdin.write(bytes(prefix + "\n", 'UTF-8'))
 	processHandle.stdin.flush()
 
 
 	output = processHandle.stdout.readline().decode('UTF-8')
+	if not output:
+		raise BrokenPipeError("trie_words_predictor closed its output")
 	predictions = output.split()
 
 	return predictions
 	
 def closeProcess(processHandle):
 	processHandle.terminate()
+
+def loadIndex(dictionaryName, nOfWords=5, compiled=True):
+	# -- In-process alternative to the trie_words_predictor subprocess
+	# -- compiled index is memory-mapped from dictionary's .idx file (rebuilt when the text is newer),
+	# -- otherwise the text is parsed into an index which also supports adding words
+	if compiled:
+		return load_compiled(dictionaryName, nOfWords)
+	return PrefixIndex.from_file(dictionaryName, nOfWords)
+
+def queryIndex(index, prefix):
+	return index.query(prefix)
+
+
+class PredictorClient:
+	"""
+	# Non-blocking words prediction client for any backend given as (start, query, close) functions,
+	# e.g. (runProcess, queryProcess, closeProcess) with start taking no arguments
+	# Queries run on a worker thread with a timeout, a hung or crashed predictor is restarted transparently
+	# Results are kept in LRU cache, a prefix longer by one letter than a cached one is answered at once
+	# by filtering the cached list (and still queried when that list could have been cut at nOfWords)
+	"""
+	def __init__(self, start, query, close, nOfWords=5, timeout=0.5, cacheSize=256):
+		self.start = start
+		self.query = query
+		self.close = close
+		self.nOfWords = nOfWords
+		self.timeout = timeout
+		self.cacheSize = cacheSize
+		self.cache = OrderedDict()
+		self.restarts = 0
+
+		self.handle = start()
+		self.executor = ThreadPoolExecutor(1)
+		self.condition = threading.Condition()
+		self.pending = None
+		self.result = None
+		self.running = True
+		self.thread = threading.Thread(target=self.workerLoop, daemon=True)
+		self.thread.start()
+
+	def request(self, prefix):
+		"""
+		# Ask for suggestions of prefix without waiting, return them at once if they are already known, otherwise None
+		"""
+		with self.condition:
+			if prefix in self.cache:
+				self.cache.move_to_end(prefix)
+				self.result = (prefix, self.cache[prefix])
+				return self.cache[prefix]
+
+			suggestions = None
+			parent = self.cache.get(prefix[:-1]) if prefix else None
+			if parent is not None:
+				suggestions = [ word for word in parent if word.startswith(prefix) ]
+				if len(parent) < self.nOfWords:
+					# -- parent list was complete, so filtered one is complete too
+					self.store(prefix, suggestions)
+					self.result = (prefix, suggestions)
+					return suggestions
+
+			# -- only the newest prefix is worth querying
+			self.pending = prefix
+			self.condition.notify_all()
+			return suggestions
+
+	def poll(self):
+		"""
+		# Return (prefix, suggestions) of the newest finished query exactly once, or None
+		"""
+		with self.condition:
+			result, self.result = self.result, None
+			return result
+
+	def store(self, prefix, suggestions):
+		self.cache[prefix] = suggestions
+		self.cache.move_to_end(prefix)
+		while len(self.cache) > self.cacheSize:
+			self.cache.popitem(last=False)
+
+	def restart(self):
+		try:
+			self.close(self.handle)
+		except Exception:
+			pass
+		self.handle = self.start()
+		self.restarts += 1
+
+	def queryWithTimeout(self, prefix):
+		for attempt in range(2):
+			future = self.executor.submit(self.query, self.handle, prefix)
+			try:
+				return future.result(self.timeout)
+			except TimeoutError:
+				# -- closing a hung predictor also unblocks the executor thread waiting on it
+				print("Words predictor did not answer in time, restarting it")
+			except Exception as error:
+				print("Words predictor failed (" + str(error) + "), restarting it")
+			self.restart()
+		return None
+
+	def workerLoop(self):
+		while True:
+			with self.condition:
+				self.condition.wait_for(lambda: self.pending is not None or not self.running)
+				if not self.running:
+					return
+				prefix, self.pending = self.pending, None
+
+			with perf.monitor.timer("prefix_query"):
+				suggestions = self.queryWithTimeout(prefix)
+
+			with self.condition:
+				# -- failed queries are not cached, so they are retried next time
+				if suggestions is None:
+					suggestions = []
+				else:
+					self.store(prefix, suggestions)
+				self.result = (prefix, suggestions)
+
+	def shutdown(self):
+		with self.condition:
+			self.running = False
+			self.condition.notify_all()
+		self.thread.join(timeout=self.timeout * 4)
+		self.close(self.handle)
+		self.executor.shutdown(wait=False)
+
+
+class WordDecoder:
+	"""
+	# Streaming decoder of the word being signed, fed with letter probability vectors of every recognized frame
+	# A hypothesis is a word spelled so far: next frame either continues its last letter (frames of one held sign
+	# collapse into one letter) or starts a new letter for switchPenalty, letters leading out of the dictionary
+	# additionally cost outsidePenalty each (so unknown words are still possible, just less likely)
+	# gap() plays the role of CTC's blank: it ends the letters being held, so the same letter may follow ("ll" in "alla")
+	# Only beamWidth best hypotheses are kept, one frame costs O(beamWidth * len(alphabet))
+	# Frame probabilities are averaged over the last window frames kept in a ring buffer of history frames
+	"""
+	def __init__(self, index, alphabet, beamWidth=8, window=3, history=64, switchPenalty=math.log(0.2), outsidePenalty=math.log(1e-3)):
+		self.index = index
+		self.alphabet = alphabet
+		self.beamWidth = beamWidth
+		self.window = window
+		self.switchPenalty = switchPenalty
+		self.outsidePenalty = outsidePenalty
+		self.frames = deque(maxlen=history)
+		self.reset()
+
+	def reset(self, prefix=""):
+		"""
+		# Start a new word, e.g. after space or a chosen suggestion, or continue spelling prefix (its last letter ended)
+		"""
+		node = 0
+		for letter in prefix:
+			node = self.index.child(node, letter) if node is not None else None
+		# -- word -> (log score, dictionary node or None outside the dictionary)
+		self.beam = { prefix: (0.0, node) }
+		self.gap()
+
+	def gap(self):
+		"""
+		# Separator between signs (e.g. a frame without a hand): next frame starts a new letter even if it is the same one
+		"""
+		self.frames.clear()
+		self.ended = True
+
+	def smoothed(self):
+		window = [ self.frames[-i] for i in range(1, min(self.window, len(self.frames)) + 1) ]
+		return sum(window) / len(window)
+
+	def step(self, probabilities, newSign=False):
+		"""
+		# Add one frame, newSign tells a separately taken snapshot, whose letter never collapses with the previous one
+		"""
+		self.frames.append(np.asarray(probabilities, dtype=np.float64))
+		# -- snapshots are single signs, averaging them with the previous ones would blur letters
+		logProbabilities = np.log((self.frames[-1] if newSign else self.smoothed()) + 1e-9)
+		newLetter = newSign or self.ended
+		self.ended = False
+
+		candidates = {}
+		for word, (score, node) in self.beam.items():
+			last = word[-1] if word else None
+			for letter, logProbability in zip(self.alphabet, logProbabilities):
+				if letter == last and not newLetter:
+					candidate, child, candidateScore = word, node, score + logProbability
+				else:
+					child = self.index.child(node, letter) if node is not None else None
+					candidate = word + letter
+					candidateScore = score + logProbability + self.switchPenalty
+					if child is None:
+						candidateScore += self.outsidePenalty
+				# -- the same word reached in two ways keeps its better score
+				if candidate not in candidates or candidates[candidate][0] < candidateScore:
+					candidates[candidate] = (candidateScore, child)
+
+		best = heapq.nlargest(self.beamWidth, candidates.items(), key=lambda item: item[1][0])
+		# -- scores relative to the best hypothesis do not drift towards -inf over a long word
+		top = best[0][1][0]
+		self.beam = { word: (score - top, node) for word, (score, node) in best }
+
+	def hypotheses(self, n=None):
+		"""
+		# Return up to n best (word, log score relative to the best one) pairs, best first
+		"""
+		ranked = sorted(self.beam.items(), key=lambda item: -item[1][0])
+		return [ (word, float(score)) for word, (score, node) in ranked[:n] ]
+
+	def best(self):
+		return self.hypotheses(1)[0][0]
+
+	def suggestions(self, nOfWords=5, hypotheses=3):
+		"""
+		# Dictionary completions of the best hypotheses, completions of better hypotheses first
+		"""
+		words = []
+		for word, score in self.hypotheses(hypotheses):
+			if not word:
+				continue
+			for completion in self.index.query(word):
+				if completion not in words:
+					words.append(completion)
+		return words[:nOfWords]
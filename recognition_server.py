@@ -0,0 +1,179 @@
+# --- Recognition server for several kiosk cameras
+# --- Accepts hand crops over HTTP (JPEG/PNG or raw BGR bytes), runs keypoint detection
+# --- and gesture prediction on a shared worker pool with models loaded once,
+# --- batches keypoint inference across clients and answers with letter, probability,
+# --- keypoints and word suggestions as JSON
+# ---
+# --- POST /recognize[?prefix=<word prefix>]           body: encoded image (Content-Type image/*)
+# --- POST /recognize?width=W&height=H[&prefix=...]    body: raw BGR uint8 bytes (application/octet-stream)
+# --- GET  /metrics                                    queue depth and per-stage latency percentiles
+
+import cv2
+import json
+import time
+import argparse
+import threading
+import numpy as np
+from urllib.parse import urlparse, parse_qs
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import train_model
+import hand_processing
+import prefix_queries
+from base_inf import MicroBatchQueue
+from utils import perf
+
+hand_rows = train_model.training_rows * 10
+hand_cols = train_model.training_cols * 10
+
+def parseArguments():
+	parser = argparse.ArgumentParser(description="Multi-client sign alphabet recognition server")
+	parser.add_argument("--host", default="127.0.0.1", help="address to listen on")
+	parser.add_argument("--port", type=int, default=8765, help="TCP port to listen on")
+	parser.add_argument("--workers", type=int, default=4, help="recognition worker threads sharing the models")
+	parser.add_argument("--max-batch", type=int, default=8, help="largest keypoint inference batch across clients")
+	parser.add_argument("--max-delay", type=float, default=0.005, help="seconds a request may wait for others to fill a batch")
+	parser.add_argument("--classifier", choices=["cnn", "keypoints"], default="cnn", help="gesture classifier")
+	parser.add_argument("--dictionary", default="dictionaries/default.txt", help="dictionary for word suggestions")
+	parser.add_argument("--gesture-cache-grid", type=float, default=0,
+		help="reuse CNN prediction for keypoints equal after rounding to this many pixels of normalized gesture (default 0: off, exact results)")
+	return parser.parse_args()
+
+class RecognitionService:
+	"""
+	# Shared state of the server: models, keypoint batching queue, worker pool and metrics
+	"""
+	def __init__(self, workers=4, maxBatch=8, maxDelay=0.005, classifier="cnn", dictionary="dictionaries/default.txt", gestureCacheGrid=0):
+		hand_processing.gestureCache = hand_processing.GestureCache(gestureCacheGrid) if gestureCacheGrid > 0 else None
+		hand_processing.warmUp(classifier)
+		self.classifier = classifier
+		netSize = hand_processing.netInputSize or hand_rows
+		self.batcher = MicroBatchQueue(hand_processing.hand_detection_engine.get(), (netSize, netSize), maxBatch, maxDelay)
+		self.pool = ThreadPoolExecutor(workers)
+		self.words = prefix_queries.loadIndex(dictionary)
+
+		# -- OpenCV nets and Keras models are not safe to run from several threads at once
+		self.classificationLock = threading.Lock()
+		self.inFlight = 0
+		self.inFlightLock = threading.Lock()
+
+	def recognize(self, hand, prefix=None):
+		with self.inFlightLock:
+			self.inFlight += 1
+		try:
+			return self.pool.submit(self.recognizeHand, hand, prefix).result()
+		finally:
+			with self.inFlightLock:
+				self.inFlight -= 1
+
+	def recognizeHand(self, hand, prefix):
+		with perf.monitor.timer("request"):
+			if hand.shape[:2] != (hand_rows, hand_cols):
+				hand = cv2.resize(hand, (hand_cols, hand_rows))
+
+			# -- keypoint network runs in batches gathered from all clients
+			netOutput = self.batcher.infer(hand)
+			points, confidences = hand_processing.keypointsFromNetOutput(netOutput, hand_rows, hand_cols)
+
+			with self.classificationLock:
+				if self.classifier == "keypoints":
+					predictedLetter, prob = hand_processing.predictGestureFromKeypoints(points)
+				else:
+					# -- gesture canvas is drawn only when the pose is not in the gesture cache
+					predictedLetter, prob = hand_processing.predictGesture(None, points, hand.shape[:2])
+
+			word = (prefix or "") + predictedLetter
+			suggestions = prefix_queries.queryIndex(self.words, word)
+
+		return {
+			"letter": predictedLetter,
+			"probability": float(prob),
+			"keypoints": [ None if np.isnan(x) else [float(x), float(y)] for x, y in points ],
+			"confidences": [ float(c) for c in confidences ],
+			"suggestions": suggestions,
+		}
+
+	def metrics(self):
+		return {
+			"in_flight": self.inFlight,
+			"keypoint_queue_depth": self.batcher.requests.qsize(),
+			"stages": perf.monitor.summaries(),
+			"gesture_cache": hand_processing.gestureCache.stats() if hand_processing.gestureCache is not None else None,
+		}
+
+	def close(self):
+		self.pool.shutdown()
+		self.batcher.close()
+
+def decodeRequestImage(body, contentType, query):
+	if contentType.startswith("image/"):
+		return cv2.imdecode(np.frombuffer(body, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+	width, height = int(query["width"][0]), int(query["height"][0])
+	return np.frombuffer(body, dtype=np.uint8).reshape(height, width, 3)
+
+class RecognitionHandler(BaseHTTPRequestHandler):
+	service = None
+
+	def sendJson(self, code, payload):
+		body = json.dumps(payload).encode("utf-8")
+		self.send_response(code)
+		self.send_header("Content-Type", "application/json")
+		self.send_header("Content-Length", str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+
+	def do_GET(self):
+		if urlparse(self.path).path == "/metrics":
+			self.sendJson(200, self.service.metrics())
+		else:
+			self.sendJson(404, {"error": "unknown path"})
+
+	def do_POST(self):
+		url = urlparse(self.path)
+		if url.path != "/recognize":
+			self.sendJson(404, {"error": "unknown path"})
+			return
+
+		query = parse_qs(url.query)
+		body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+		try:
+			hand = decodeRequestImage(body, self.headers.get("Content-Type", ""), query)
+		except (KeyError, ValueError) as error:
+			self.sendJson(400, {"error": "cannot read hand image: " + str(error)})
+			return
+		if hand is None:
+			self.sendJson(400, {"error": "cannot decode hand image"})
+			return
+
+		prefix = query.get("prefix", [""])[0]
+		try:
+			result = self.service.recognize(hand, prefix)
+		except Exception as error:
+			# -- model or predictor failure is an answer of the JSON API too, not a dropped connection
+			self.sendJson(500, {"error": "recognition failed: " + str(error)})
+			return
+		self.sendJson(200, result)
+
+	def log_message(self, format, *args):
+		# -- per-request logging would dominate under load, use /metrics instead
+		pass
+
+def createServer(service, host="127.0.0.1", port=8765):
+	handler = type("Handler", (RecognitionHandler,), {"service": service})
+	return ThreadingHTTPServer((host, port), handler)
+
+if __name__ == '__main__':
+	args = parseArguments()
+	service = RecognitionService(args.workers, args.max_batch, args.max_delay, args.classifier, args.dictionary, args.gesture_cache_grid)
+	server = createServer(service, args.host, args.port)
+	print("Recognition server listening on http://{}:{}".format(args.host, args.port))
+
+	try:
+		server.serve_forever()
+	except KeyboardInterrupt:
+		pass
+	finally:
+		server.server_close()
+		service.close()
@@ -0,0 +1,265 @@
+# --- Keypoint detection and gesture classification in a separate worker process
+# --- Hand crops go to the worker and keypoints come back through shared memory ring buffers
+# --- (zero-copy NumPy views on both sides), the pipe carries only slot numbers and predicted letters,
+# --- so heavy compute does not compete for the GIL with drawing and GUI event handling
+
+import queue
+import threading
+import multiprocessing
+import numpy as np
+from multiprocessing import shared_memory
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+import train_model
+from utils import perf
+
+hand_rows = train_model.training_rows * 10
+hand_cols = train_model.training_cols * 10
+nPoints = 22
+nLetters = len(train_model.alphabet)
+
+class SharedRing:
+	"""
+	# slots NumPy arrays of the same shape and dtype in one shared memory block
+	# Created by the owner process (name=None) or attached to by name in another process
+	# Only the owner unlinks the block, spawned worker shares its resource tracker, so nothing is left behind
+	"""
+	def __init__(self, slots, shape, dtype, name=None):
+		self.owner = name is None
+		size = slots * int(np.prod(shape)) * np.dtype(dtype).itemsize
+		self.memory = shared_memory.SharedMemory(name=name, create=self.owner, size=size if self.owner else 0)
+
+		self.array = np.ndarray((slots,) + tuple(shape), dtype=dtype, buffer=self.memory.buf)
+
+	def close(self):
+		del self.array
+		self.memory.close()
+		if self.owner:
+			self.memory.unlink()
+
+def workerLoop(conn, cropsName, resultsName, probabilitiesName, slots, handShape, classifier, track, cacheGrid, settings):
+	"""
+	# Worker process: load and warm up models, then recognize hand crops from slots named by the parent
+	"""
+	import hand_processing
+	from utils.lazy import LazyModel
+
+	# -- settings may also replace model loaders, models are created after they are applied
+	for name, value in settings.items():
+		setattr(hand_processing, name, value)
+	hand_processing.hand_detection_engine = LazyModel(hand_processing.loadKeypointEngine)
+	hand_processing.model = LazyModel(hand_processing.loadGestureModel)
+	hand_processing.keypointModel = LazyModel(hand_processing.loadKeypointModel)
+	hand_processing.gestureCache = hand_processing.GestureCache(cacheGrid) if cacheGrid else None
+	tracker = hand_processing.HandTracker() if track else None
+	workspace = hand_processing.Workspace(handShape[0], handShape[1])
+
+	crops = SharedRing(slots, handShape, np.uint8, cropsName)
+	results = SharedRing(slots, (nPoints, 3), np.float32, resultsName)
+	probabilities = SharedRing(slots, (nLetters,), np.float32, probabilitiesName)
+
+	conn.send(("ready", hand_processing.warmUp(classifier)))
+
+	hand = None
+	while True:
+		try:
+			message = conn.recv()
+		except EOFError:
+			break
+		if message[0] == "stop":
+			break
+
+		slot, newRegion = message[1:]
+		hand = crops.array[slot]
+		if tracker is not None:
+			if newRegion:
+				tracker.reset()
+			points, confidences = tracker.detect(hand, workspace)
+		else:
+			points, confidences = hand_processing.detectKeypoints(hand, workspace=workspace)
+
+		if classifier == "keypoints":
+			res = hand_processing.keypointProbabilities(points)
+		else:
+			res = hand_processing.gestureProbabilities(None, points, hand.shape[:2], workspace)
+		y = np.argmax(res)
+
+		results.array[slot, :, :2] = points
+		results.array[slot, :, 2] = confidences
+		probabilities.array[slot] = res
+		conn.send(("result", slot, hand_processing.alphabet[y], float(res[y])))
+
+	# -- views into shared memory have to be released before it is closed
+	hand = None
+	crops.close()
+	results.close()
+	probabilities.close()
+
+class RecognitionWorker:
+	"""
+	# Runs keypoint detection and gesture classification of hand crops in a worker process
+	# Up to slots requests (from different threads) can be in flight at once
+	# A worker which dies or stops answering is restarted, the request is then sent once more
+	# Requests wait at most timeout seconds for a result, or warmUpTimeout while the worker loads and warms up its models
+	"""
+	def __init__(self, classifier="cnn", track=False, cacheGrid=0, settings=None, slots=4, handShape=(hand_rows, hand_cols, 3), timeout=30.0, warmUpTimeout=300.0):
+		self.classifier = classifier
+		self.track = track
+		self.cacheGrid = cacheGrid
+		self.settings = settings or {}
+		self.slots = slots
+		self.handShape = handShape
+		self.timeout = timeout
+		self.warmUpTimeout = warmUpTimeout
+
+		self.crops = SharedRing(slots, handShape, np.uint8)
+		self.results = SharedRing(slots, (nPoints, 3), np.float32)
+		self.probabilities = SharedRing(slots, (nLetters,), np.float32)
+		self.freeSlots = queue.Queue()
+		for slot in range(slots):
+			self.freeSlots.put(slot)
+
+		self.pending = {}
+		self.lock = threading.Lock()
+		self.ready = threading.Event()
+		self.onReady = None
+		self.process = None
+		self.conn = None
+		self.restarts = 0
+		# -- every restart starts a new generation of the worker, callers restart only the one their request failed on
+		self.generation = 0
+		self.restartLock = threading.Lock()
+
+	def start(self, onReady=None):
+		"""
+		# Start worker process, onReady(seconds) is called once its models are warmed up
+		"""
+		self.onReady = onReady
+		# -- fork would copy locks held by threads of this process (capture, warm-up, words prediction),
+		# -- spawned worker starts from scratch and imports main script only up to its __main__ guard
+		context = multiprocessing.get_context("spawn")
+		self.conn, workerConn = context.Pipe()
+		self.process = context.Process(target=workerLoop, daemon=True, args=(workerConn, self.crops.memory.name, self.results.memory.name, self.probabilities.memory.name,
+			self.slots, self.handShape, self.classifier, self.track, self.cacheGrid, self.settings))
+		self.process.start()
+		workerConn.close()
+
+		threading.Thread(target=self.readLoop, args=(self.conn,), daemon=True).start()
+		return self
+
+	def readLoop(self, conn):
+		while True:
+			try:
+				message = conn.recv()
+			except (EOFError, OSError):
+				break
+
+			if message[0] == "ready":
+				self.ready.set()
+				if self.onReady is not None:
+					self.onReady(message[1])
+			else:
+				kind, slot, predictedLetter, prob = message
+				with self.lock:
+					future = self.pending.pop(slot, None)
+				if future is not None:
+					future.set_result((predictedLetter, prob))
+
+		# -- worker is gone, requests it did not answer fail (unless it was already replaced)
+		with self.lock:
+			if conn is self.conn:
+				self.failPending()
+
+	def failPending(self):
+		for future in self.pending.values():
+			future.set_exception(BrokenPipeError("recognition worker exited"))
+		self.pending.clear()
+
+	def recognize(self, hand, newRegion=False):
+		"""
+		# Return (keypoints, confidences, predicted letter, probability, probabilities of all letters) of hand crop
+		# newRegion tells that the crop is cut from another part of the frame than the previous one, tracking starts over
+		"""
+		generation = self.generation
+		try:
+			return self.request(hand, newRegion, generation)
+		# -- before Python 3.11 futures time out with their own TimeoutError, not the builtin one
+		except (BrokenPipeError, EOFError, OSError, TimeoutError, FutureTimeoutError) as error:
+			print("Recognition worker failed (", error, "), restarting it")
+			# -- other callers failed on the same worker may have replaced it already
+			self.restart(generation)
+			return self.request(hand, newRegion, self.generation)
+
+	def request(self, hand, newRegion=False, generation=None):
+		slot = self.freeSlots.get()
+		try:
+			with perf.monitor.timer("worker_recognition"):
+				# -- only copy of the crop into shared memory, worker reads it in place
+				self.crops.array[slot] = hand
+				future = Future()
+				with self.lock:
+					if self.conn is None:
+						raise BrokenPipeError("recognition worker is restarting")
+					if generation is not None and generation != self.generation:
+						raise BrokenPipeError("recognition worker was restarted")
+					self.pending[slot] = future
+					self.conn.send(("recognize", slot, newRegion))
+
+				# -- first requests wait for the warm-up, a worker hanging in it is restarted too
+				predictedLetter, prob = future.result(self.timeout if self.ready.is_set() else self.warmUpTimeout)
+				record = self.results.array[slot]
+				points = np.array(record[:, :2])
+				confidences = np.array(record[:, 2])
+				letterProbabilities = np.array(self.probabilities.array[slot])
+			return (points, confidences, predictedLetter, prob, letterProbabilities)
+		finally:
+			with self.lock:
+				self.pending.pop(slot, None)
+			self.freeSlots.put(slot)
+
+	def restart(self, generation=None):
+		"""
+		# Replace worker process with a new one, shared memory and callers stay as they are
+		# With generation given, only that generation of the worker is replaced (a newer one is left running)
+		"""
+		with self.restartLock:
+			with self.lock:
+				if generation is not None and generation != self.generation:
+					return
+				self.generation += 1
+				process, conn = self.process, self.conn
+				self.conn = None
+				self.failPending()
+
+			# -- previous restart may have failed before the process or pipe existed
+			if process is not None and process.is_alive():
+				process.terminate()
+				process.join(5)
+			if conn is not None:
+				conn.close()
+
+			with self.lock:
+				self.ready.clear()
+				self.restarts += 1
+				self.start(self.onReady)
+
+	def close(self):
+		# -- after a failed restart there may be no process or pipe left
+		with self.lock:
+			process, conn = self.process, self.conn
+			self.conn = None
+		if conn is not None:
+			try:
+				conn.send(("stop",))
+			except (BrokenPipeError, OSError):
+				pass
+		if process is not None:
+			process.join(5)
+			if process.is_alive():
+				process.terminate()
+		if conn is not None:
+			conn.close()
+
+		self.crops.close()
+		self.results.close()
+		self.probabilities.close()
@@ -1,25 +1,72 @@
 # ---- Authors: Pawel Wozniak, Ewelina Tyma
 
 # --- Import all necessary modules
+import time
+# --- Startup is measured from here to the moment first prediction can be made
+launchTime = time.perf_counter()
+
 import os
 import cv2
 import sys
-import time
+import threading
 import numpy as np 
 import argparse
-from keras.models import load_model
 from subprocess import Popen
 
 import train_model
 import hand_processing
 import prefix_queries
-from utils import apputil
+import engine_registry
+from recognition_worker import RecognitionWorker
+from utils import apputil, perf
+from utils.capture import LatestFrameCapture, FrameStage
+from utils.gating import FrameChangeGate
+from utils.localization import HandLocalizer
+from utils.replay import SessionRecorder, ReplaySource, WindowKeys, ReplayKeys, NO_KEY
 
 def parseArguments():
 	parser = argparse.ArgumentParser(description="Sign alphabet recognition main script", usage = """
 		program has to be run with --dictionary flag, which is path to file with keywords for words prediction	
 	""")
 	parser.add_argument("--dictionary", required=False, help="path to dictionary file")
+	parser.add_argument("--predictor", choices=["compiled", "index", "process"], default="compiled",
+		help="words prediction backend: memory-mapped compiled dictionary, in-process prefix index or trie_words_predictor subprocess")
+	parser.add_argument("--decoder", action="store_true",
+		help="spell words with a dictionary constrained beam search over letter probabilities of all recognized frames, not letter by letter")
+	parser.add_argument("--beam-width", type=int, default=8, help="hypotheses kept by --decoder")
+	parser.add_argument("--classifier", choices=["cnn", "keypoints"], default="cnn",
+		help="gesture classifier: CNN over rendered skeleton or dense model over keypoint geometry")
+	parser.add_argument("--gesture-backend", choices=["auto", "opencv", "keras"], default="auto",
+		help="CNN classifier runtime: exported ONNX model on OpenCV DNN (no TensorFlow), Keras, or ONNX when it exists")
+	parser.add_argument("--quantized", action="store_true", help="use int8 quantized ONNX gesture classifier")
+	parser.add_argument("--net-size", type=int, default=None,
+		help="keypoint network input resolution, e.g. 184, 224 or 280 (default: hand box size)")
+	parser.add_argument("--engine", choices=sorted(engine_registry.ENGINES),
+		help="keypoint inference engine (default: configuration tuned for this machine, or opencv)")
+	parser.add_argument("--dnn-backend", choices=sorted(engine_registry.DNN_BACKENDS), help="OpenCV DNN backend of keypoint network")
+	parser.add_argument("--dnn-target", choices=sorted(engine_registry.DNN_TARGETS), help="OpenCV DNN target device of keypoint network")
+	parser.add_argument("--threads", type=int, help="OpenCV inference threads (default: all cores)")
+	parser.add_argument("--autotune", action="store_true",
+		help="time every available keypoint engine configuration on examples and store the fastest one for this machine")
+	parser.add_argument("--tuning-file", default="engine_tuning.json", help="fastest keypoint engine configuration of every machine")
+	parser.add_argument("--track", action="store_true",
+		help="run keypoint network on a tight, lower resolution crop around previous frame's keypoints")
+	parser.add_argument("--change-threshold", type=float, default=4.0,
+		help="in recording mode reuse last prediction while hand area changes less than this mean gray level difference (0 disables)")
+	parser.add_argument("--localize", action="store_true",
+		help="find the hand anywhere in the frame (skin color and motion) instead of the fixed hand box, frames without a hand are not recognized")
+	parser.add_argument("--gesture-cache-grid", type=float, default=4.0,
+		help="reuse CNN prediction for keypoints equal after rounding to this many pixels of normalized gesture (approximate, 0 gives exact CNN output for every frame)")
+	parser.add_argument("--collect-images", action="store_true",
+		help="in collecting mode also write every gesture as record image, not only its keypoints")
+	parser.add_argument("--worker-process", action="store_true",
+		help="run keypoint and gesture models in a separate process, restarted when it fails (or on 'w' key)")
+	parser.add_argument("--record-session", metavar="DIR", help="store camera frames and pressed keys in DIR for later --replay")
+	parser.add_argument("--replay", metavar="DIR", help="run on a session recorded with --record-session instead of the webcam")
+	parser.add_argument("--fast", action="store_true", help="replay every frame as soon as the previous one was shown, not at recorded pace")
+	parser.add_argument("--headless", action="store_true", help="do not open any window (only with --replay)")
+	parser.add_argument("--perf-overlay", action="store_true", help="show per-stage latency percentiles in 'video' window")
+	parser.add_argument("--perf-stats", default="perf_stats.json", help="file with per-stage latency statistics written on exit")
 	return parser.parse_args()
 
 def checkDictionaryPath(dictionaryPath):
@@ -30,193 +77,480 @@ def checkDictionaryPath(dictionaryPath):
 	finally:				
 		f.close()
 	
-args = parseArguments()
-dictionaryPath = "dictionaries/default.txt"
-if args.dictionary:
-	dictionaryPath = args.dictionary
-
-checkDictionaryPath(dictionaryPath)
-
-processHandle = prefix_queries.runProcess(dictionaryPath)
-
-# --- Collecting Data for base mode
-# --- You can choose to collect data for 
-# --- future model compilation while using recognition tool
-collectingMode = False
-if input("Do you want to collect gestures data? (yes/[no]): ").replace(" ","") == 'yes':
-	collectingMode = True
-
-	# -- get letter for training
-	letter = input('Choose letter which gestures you want to collect: ')
-	while not (len(letter) == 1 and (letter in train_model.alphabet)):
-		letter = input('Something gone wrong, choose again: ')	
-
-	path = train_model.createNewLetterSession(letter)
-
-# --- Set resolution and select webcam  
-cap = cv2.VideoCapture(0)
-cap.set(3, 640)
-cap.set(4, 480)
-
-# --- Check if camera is opened properly
-if not cap.isOpened():
-	print("Could not open video device")
-	exit()
-
-# --- Set hand area parameters
-
-hand_rows = train_model.training_rows * 10
-hand_cols = train_model.training_cols * 10
-
-# --- UpperLeft BottomRight corner coords for hand frame
-ulx = 20
-uly = 150 
-brx = ulx + hand_cols
-bry = uly + hand_rows
-
-# --- Estimate time per frame for current webcam
-print ("Estimating webcam time per frame...")
-frames = 20
-s = time.time()
-for i in range(frames):
-	ret, frame = cap.read()
-e = time.time()
-timePerFrame = (e - s)/frames
-
-print("Estimated time per frame: ", timePerFrame)
-
-# --- Set starting variables 
-iteration = 0
-predictions = 0
-dumpedRecords = 0
-predictedMessage = "Press 's' to take hand snapshot"
-recordingON = False
-wordSuggestions = []
-
-apputil.openWindows(hand_cols, hand_rows)
-
-# --- Start webcam video 
-while(True):
-	# -- Start time for frame time measure
-	s = time.time()
-
-	# -- Get next frame from webcam and cut out hand sector	
-	ret, frame = cap.read()
-	hand = frame[uly:bry, ulx:brx,:]
-	
-	# -- Draw Frame for hand sector
-	cv2.rectangle(frame, (ulx, uly), (brx, bry), (0, 0, 255), 2)  	
-
-	# -- Show last prediction
-	cv2.rectangle(frame, (0,0), (frame.shape[1], 40), (0,0,0), cv2.FILLED)
-	cv2.putText(frame, predictedMessage[-25:], (20, 25),  cv2.FONT_HERSHEY_COMPLEX, 1, (255, 255, 255), 2, 1)
-
-
-	# -- Show hand area and user's webcam view
-	cv2.imshow('video', frame)
+# --- Recognition worker process is spawned and imports this script again (as __mp_main__),
+# --- there only the imports and functions above may run
+if __name__ == "__main__":
+	args = parseArguments()
+	if args.headless and not args.replay:
+		print("--headless needs --replay, keys of live session are read from windows")
+		exit()
+
+	dictionaryPath = "dictionaries/default.txt"
+	if args.dictionary:
+		dictionaryPath = args.dictionary
+
+	checkDictionaryPath(dictionaryPath)
+
+	hand_processing.netInputSize = args.net_size
+	hand_processing.gestureBackend = args.gesture_backend
+	hand_processing.gestureQuantized = args.quantized
+	handTracker = hand_processing.HandTracker() if args.track and not args.worker_process else None
+
+	# --- Keypoint engine is the fastest one measured on this machine, unless options below select another
+	if args.autotune:
+		print("Timing keypoint engine configurations...")
+		netSize = args.net_size or train_model.training_rows * 10
+		bestConfig, timings = engine_registry.autotune(engine_registry.load_sample_blobs("examples", (netSize, netSize)))
+		for name, seconds in sorted(timings.items(), key=lambda item: item[1]):
+			print("  {:<32} {:8.1f} ms".format(name, seconds * 1000))
+		if bestConfig is None:
+			print("No keypoint engine configuration could run on this machine")
+			exit()
+		engine_registry.save_tuned_config(args.tuning_file, bestConfig, timings)
+		print("Fastest configuration", engine_registry.config_name(bestConfig), "stored in", args.tuning_file)
+
+	engineConfig = engine_registry.load_tuned_config(args.tuning_file) or {}
+	for key, value in (("engine", args.engine), ("backend", args.dnn_backend), ("target", args.dnn_target), ("threads", args.threads)):
+		if value is not None:
+			engineConfig[key] = value
+	hand_processing.keypointEngineConfig = engineConfig
+
+	# --- Models run either in this process or in a worker process with the same settings
+	worker = None
+	if args.worker_process:
+		hand_processing.gestureCache = None
+		worker = RecognitionWorker(args.classifier, args.track, args.gesture_cache_grid, {
+			"netInputSize": args.net_size, "gestureBackend": args.gesture_backend,
+			"gestureQuantized": args.quantized, "keypointEngineConfig": engineConfig })
+	else:
+		hand_processing.gestureCache = hand_processing.GestureCache(args.gesture_cache_grid) if args.gesture_cache_grid > 0 else None
+
+	if args.classifier == "keypoints" and not os.path.exists("keypoint_gesture_model.npz"):
+		print("Keypoint classifier is not trained yet, run: python3 train_model.py --classifier keypoints")
+		exit()
+
+	# --- Load models and run first dummy inference in background,
+	# --- while the user answers questions and the camera starts
+	modelsReady = threading.Event()
+	def reportWarmUp(seconds):
+		print("Models loaded and warmed up in {:.2f} s".format(seconds))
+		perf.monitor.record("warm_up", seconds)
+		modelsReady.set()
+	warmUpThread = None
+	if worker is not None:
+		# -- worker is a fresh (spawned) process, threads already running here are not copied into it
+		worker.start(reportWarmUp)
+	else:
+		warmUpThread = hand_processing.startWarmUp(args.classifier, reportWarmUp)
+
+	# --- Words prediction runs asynchronously, the frame loop never waits for suggestions
+	if args.predictor == "process":
+		wordsClient = prefix_queries.PredictorClient(lambda: prefix_queries.runProcess(dictionaryPath),
+			prefix_queries.queryProcess, prefix_queries.closeProcess)
+	else:
+		wordsClient = prefix_queries.PredictorClient(lambda: prefix_queries.loadIndex(dictionaryPath, compiled=(args.predictor == "compiled")),
+			prefix_queries.queryIndex, lambda index: None)
+
+	# --- Decoder spells the current word from letter probabilities of all recognized frames, pruned by the dictionary,
+	# --- decodedWord is the end of the message it may still change
+	decoder = None
+	if args.decoder:
+		decoder = prefix_queries.WordDecoder(prefix_queries.loadIndex(dictionaryPath, compiled=(args.predictor != "index")),
+			train_model.alphabet, args.beam_width)
+	decodedWord = ""
+
+	def startNewWord(prefix=""):
+		# -- decoded word stays in the message as it is, next frames start a new one (or continue spelling prefix)
+		global decodedWord
+		decodedWord = prefix
+		if decoder is not None:
+			decoder.reset(prefix)
+
+	shownImages = None
+	def keepForDisplay(result):
+		# -- copies of hand, skeleton and gesture images of a result, one set of buffers for the whole session
+		global shownImages
+		if shownImages is None:
+			shownImages = [ np.empty_like(image) for image in result[:3] ]
+		for shown, image in zip(shownImages, result[:3]):
+			np.copyto(shown, image)
+		return tuple(shownImages) + result[3:]
+
+	def showWindow(name, image):
+		if not args.headless:
+			cv2.imshow(name, image)
+
+	suggestions = None
+	def showSuggestions(wordSuggestions):
+		# -- one canvas for the whole session, cleaned before drawing
+		global suggestions
+		if suggestions is None:
+			suggestions = np.zeros((hand_rows, hand_cols, 3), dtype=np.uint8)
+		suggestions.fill(0)
+		cv2.putText(suggestions, "Suggestions:", (20, 25),  cv2.FONT_HERSHEY_COMPLEX, 1, (255, 255, 255), 2, 1)
 
-	# -- Get next user input
-	userChoice = chr(cv2.waitKey(1) & 255)
+		for i in range(1, len(wordSuggestions) + 1):
+			cv2.putText(suggestions, str(i)+". "+wordSuggestions[i - 1], (20, 45 * i + 25),  cv2.FONT_HERSHEY_COMPLEX, 1, (255, 255, 255), 2, 1)
 
-	# -- If user pressed 'r' he enters (leaves)
-	# -- recording mode in which every (current) frame
-	# -- is scanned for keypoints then dumped as database record  
-	if userChoice == 'r':
-		if recordingON: 
-			print("User pressed 'r' - Stopping recording mode,")	
-			recordingON = False	
+		showWindow('Word Suggestions', suggestions)
+
+	# --- Collecting Data for base mode
+	# --- You can choose to collect data for 
+	# --- future model compilation while using recognition tool
+	collectingMode = False
+	if not args.replay and input("Do you want to collect gestures data? (yes/[no]): ").replace(" ","") == 'yes':
+		collectingMode = True
+
+		# -- get letter for training
+		letter = input('Choose letter which gestures you want to collect: ')
+		while not (len(letter) == 1 and (letter in train_model.alphabet)):
+			letter = input('Something gone wrong, choose again: ')	
+
+		path = train_model.createNewLetterSession(letter)
+
+	# --- Set resolution and select webcam (or recorded session)
+	if args.replay:
+		cap = ReplaySource(args.replay, realtime=not args.fast)
+		keys = ReplayKeys(cap.keys, pump_windows=not args.headless)
+	else:
+		cap = cv2.VideoCapture(0)
+		keys = WindowKeys()
+	cap.set(3, 640)
+	cap.set(4, 480)
+
+	# --- Check if camera is opened properly
+	if not cap.isOpened():
+		print("Could not open video device")
+		exit()
+
+	source = cap
+	recorder = None
+	if args.record_session:
+		recorder = SessionRecorder(cap, args.record_session)
+		source = recorder
+
+	# --- Set hand area parameters
+
+	hand_rows = train_model.training_rows * 10
+	hand_cols = train_model.training_cols * 10
+
+	# --- UpperLeft corner coords for fixed hand frame
+	ulx = 20
+	uly = 150 
+
+	# --- Hand box follows the hand found in the whole (downscaled) frame, None while there is no hand
+	localizer = HandLocalizer((hand_cols, hand_rows)) if args.localize else None
+	handBox = (ulx, uly, hand_cols, hand_rows)
+
+	# --- Read webcam on a background thread, which always holds only the newest frame
+	# --- fast replay is deterministic: no frame is skipped, keys are replayed on the frames they were pressed on
+	# --- and recognition runs on exactly the frames shown (see below)
+	deterministicReplay = args.replay is not None and args.fast
+	capture = LatestFrameCapture(source, lockstep=deterministicReplay).start()
+
+	# --- In recording mode frames of a still hand are not sent through the models again
+	changeGate = FrameChangeGate(args.change_threshold) if args.change_threshold > 0 else None
+	lastRecognition = None
+
+	# --- Recognition reuses preallocated buffers instead of allocating new images for every frame,
+	# --- images of a result live only in its own workspace: main loop copies them out (and draws on the copies)
+	# --- holding workspaceLock, a workspace is not taken for a new frame meanwhile
+	workspaces = [ hand_processing.Workspace(hand_rows, hand_cols) for i in range(3) ]
+	workspaceLock = threading.Lock()
+	processedFrames = 0
+
+	# --- Box of the last recognized crop, a crop from another part of the frame is tracked and gated from scratch
+	# --- Frames without a hand separate signs, the next recognized frame starts a new one
+	recognizedBox = handBox
+	handLost = False
+
+	def recognizeHand(framedHand):
+		global lastRecognition, processedFrames, recognizedBox, handLost
+
+		# -- Box was found in this very frame by the main loop
+		frame, box = framedHand
+		moved = localizer is not None and localizer.moved(recognizedBox, box)
+		recognizedBox = box
+
+		# -- No hand found in the frame, keypoint network is not run on an empty crop
+		if box is None:
+			if not recordingON:
+				print("No hand found in the frame")
+			handLost = True
+			return None
+
+		signStart = handLost or moved
+		handLost = False
+
+		# -- Tracking ROI and last gated crop belong to the old place of the box
+		if moved:
+			if handTracker is not None:
+				handTracker.reset()
+			if changeGate is not None:
+				changeGate.reset()
+
+		with workspaceLock:
+			workspace = workspaces[processedFrames % len(workspaces)]
+			processedFrames += 1
+
+		# -- Cut out hand sector and run the whole recognition pipeline on it
+		x, y, cols, rows = box
+		hand = workspace.copyHand(frame[y:y + rows, x:x + cols,:])
+
+		# -- Hand area did not change since last processed frame, reuse its keypoints and prediction
+		if recordingON and changeGate is not None and lastRecognition is not None and not changeGate.changed(hand):
+			# -- images of the last processed frame move into this workspace, its own one may be taken for the next frame
+			np.copyto(workspace.skeleton, lastRecognition[1])
+			np.copyto(workspace.gesture, lastRecognition[2])
+			lastRecognition = (hand, workspace.skeleton, workspace.gesture) + lastRecognition[3:]
+			return lastRecognition + (signStart,)
+
+		if worker is not None:
+			# -- models run in worker process, only skeleton images are drawn here
+			points, confidences, predictedLetter, prob, probabilities = worker.recognize(hand, newRegion=moved)
+			skeleton, handGesture = hand_processing.renderHandGesture(hand, points, workspace)
 		else:
-			print("User pressed 'r' - Started recording mode")
-			recordingON = True
-
-	# -- if user pressed 'q' leave main loop
-	elif userChoice == 'q':
-		print ("User pressed 'q', thanks for using our software, see you next time")
-		break
-
-	# -- if user pressed space, add space to predicted message
-	elif userChoice == ' ':
-		print("User pressed ' ' - Adding space to predicted message")
-		predictedMessage += ' '							
-
-	# -- if user pressed 'c', last character in message is cleaned     
-	elif userChoice == 'x': 
-		print("User pressed 'x' - erasing last message letter")
-		if predictions > 0 and len(predictedMessage) > 0:
-			predictedMessage = predictedMessage[:-1]
-
-	# -- if user pressed 'x', erase whole message
-	elif userChoice == 'c':
-		print("User pressed 'c' - cleaning whole message")
-		predictedMessage = ""
-
-	elif userChoice > '0' and userChoice <= str(len(wordSuggestions)) and predictions > 0:
-		print("User pressed '1-" + str(len(wordSuggestions)) +  "' predicting word")
-		index = int(userChoice) - 1
-
-		predictedMessage = apputil.append_word(predictedMessage, wordSuggestions[index])
-
-	# -- RECOGNITION PHASE
-	# -- if current mode is recording, or 
-	# -- user has choosen option 's' (screenshot)
-	# -- its first taken webcam frame
-	if recordingON or userChoice == 's':
-		if predictions == 0:
-			predictedMessage =	""
+			# -- cv2.dnn net and Keras model are not thread-safe, first frames wait until warm-up is done with them
+			# -- (also when it failed, then recognition reports the error itself)
+			warmUpThread.join()
+			if handTracker is not None:
+				points, confidences = handTracker.detect(hand, workspace)
+			else:
+				points, confidences = hand_processing.detectKeypoints(hand, workspace=workspace)
+			skeleton, handGesture = hand_processing.renderHandGesture(hand, points, workspace)
+
+			if args.classifier == "keypoints":
+				probabilities = hand_processing.keypointProbabilities(points)
+			else:
+				probabilities = hand_processing.gestureProbabilities(handGesture, points, workspace=workspace)
+			y = np.argmax(probabilities)
+			predictedLetter, prob = hand_processing.alphabet[y], probabilities[y]
+
+		lastRecognition = (hand, skeleton, handGesture, points, confidences, predictedLetter, prob, probabilities)
+		return lastRecognition + (signStart,)
+
+	# --- Recognition consumes newest frames (with hand boxes found in them) fed by the main loop on its own thread,
+	# --- so the video window keeps camera rate while a snapshot is processed
+	# --- (in fast replay it runs in the main loop instead, once per frame, so its frames do not depend on timing)
+	recognition = FrameStage(None, recognizeHand, synchronous=deterministicReplay).start()
+
+	# --- Set starting variables 
+	iteration = 0
+	predictions = 0
+	dumpedRecords = 0
+	predictedMessage = "Press 's' to take hand snapshot"
+	recordingON = False
+	wordSuggestions = []
+	handGesture = None
+	frameID = -1
+	startupReported = False
+	displayFrame = None
+
+	if not args.headless:
+		apputil.openWindows(hand_cols, hand_rows)
+
+	# --- Start webcam video 
+	while(True):
+		# -- Get newest frame from webcam
+		frameID, frame = capture.read(frameID)
+		if frame is None:
+			print("Capture source stopped delivering frames")
+			break
+
+		# -- Find hand in the frame, recognition stage cuts out the box from the same frame
+		if localizer is not None:
+			with perf.monitor.timer("localization"):
+				handBox = localizer.locate(frame)
+
+		# -- Recognition stage gets the frame together with its box,
+		# -- synchronous one (fast replay) processes it right away when snapshot or recording asks for it
+		recognition.feed((frame, handBox))
+
+		# -- Frame is shared with recognition stage, draw on a copy (kept for the whole session)
+		if displayFrame is None or displayFrame.shape != frame.shape:
+			displayFrame = np.empty_like(frame)
+		np.copyto(displayFrame, frame)
+		frame = displayFrame
+
+		# -- Draw Frame for hand sector
+		if handBox is not None:
+			x, y, cols, rows = handBox
+			cv2.rectangle(frame, (x, y), (x + cols, y + rows), (0, 0, 255), 2)
+
+		# -- Show last prediction
+		cv2.rectangle(frame, (0,0), (frame.shape[1], 40), (0,0,0), cv2.FILLED)
+		cv2.putText(frame, predictedMessage[-25:], (20, 25),  cv2.FONT_HERSHEY_COMPLEX, 1, (255, 255, 255), 2, 1)
+
+
+		# -- Show per-stage latencies
+		if args.perf_overlay:
+			overlayLines = perf.monitor.overlay_lines()
+			if changeGate is not None:
+				overlayLines.append("gated frames: {skipped} skipped / {processed} processed".format(**changeGate.counters()))
+			if decoder is not None:
+				overlayLines.append("beam: " + " | ".join("{} {:.1f}".format(word, score) for word, score in decoder.hypotheses(3)))
+			if localizer is not None:
+				overlayLines.append("hand found: {found} / empty: {empty} frames".format(**localizer.counters()))
+			if hand_processing.gestureCache is not None:
+				overlayLines.append("gesture cache: {hits} hits / {misses} misses".format(**hand_processing.gestureCache.stats()))
+			for i, line in enumerate(overlayLines):
+				cv2.putText(frame, line, (10, frame.shape[0] - 10 - 18 * i), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1)
+
+		with perf.monitor.timer("display"):
+			# -- Show hand area and user's webcam view
+			showWindow('video', frame)
+
+			# -- Get next user input (pressed or replayed)
+			userChoice = keys.read(frameID)
+			if recorder is not None and userChoice != NO_KEY:
+				recorder.record_key(frameID, userChoice)
+
+		# -- Camera shows picture and models are warmed up, first prediction is possible now
+		if not startupReported and modelsReady.is_set():
+			startupTime = time.perf_counter() - launchTime
+			print("Ready for first prediction {:.2f} s after launch".format(startupTime))
+			perf.monitor.record("time_to_first_prediction", startupTime)
+			startupReported = True
+
+		# -- If user pressed 'r' he enters (leaves)
+		# -- recording mode in which every (current) frame
+		# -- is scanned for keypoints then dumped as database record  
+		if userChoice == 'r':
+			if recordingON: 
+				print("User pressed 'r' - Stopping recording mode,")	
+				recordingON = False	
+			else:
+				print("User pressed 'r' - Started recording mode")
+				recordingON = True
+				# -- first recorded frame always goes through the models
+				if changeGate is not None:
+					changeGate.reset()
+			recognition.set_continuous(recordingON)
+
+		# -- if user pressed 'q' leave main loop
+		elif userChoice == 'q':
+			print ("User pressed 'q', thanks for using our software, see you next time")
+			break
+
+		# -- if user pressed space, add space to predicted message
+		elif userChoice == ' ':
+			print("User pressed ' ' - Adding space to predicted message")
+			predictedMessage += ' '							
+			startNewWord()
+
+		# -- if user pressed 'c', last character in message is cleaned     
+		elif userChoice == 'x': 
+			print("User pressed 'x' - erasing last message letter")
+			if predictions > 0 and len(predictedMessage) > 0:
+				predictedMessage = predictedMessage[:-1]
+			# -- decoder goes on spelling what is left of the word
+			startNewWord(predictedMessage.split(' ')[-1] if predictions > 0 else "")
+
+		# -- if user pressed 'x', erase whole message
+		elif userChoice == 'c':
+			print("User pressed 'c' - cleaning whole message")
+			predictedMessage = ""
+			startNewWord()
+
+		elif userChoice == 'w' and worker is not None:
+			print("User pressed 'w' - restarting recognition worker process")
+			threading.Thread(target=worker.restart, daemon=True).start()
+
+		elif userChoice == 's':
+			print("User pressed 's' - taking hand area snapshot")
+			recognition.request()
+
+		elif userChoice > '0' and userChoice <= str(len(wordSuggestions)) and predictions > 0:
+			print("User pressed '1-" + str(len(wordSuggestions)) +  "' predicting word")
+			index = int(userChoice) - 1
+
+			predictedMessage = apputil.append_word(predictedMessage, wordSuggestions[index])
+			startNewWord()
+
+		# -- RECOGNITION PHASE
+		# -- recognition stage finished processing a snapshot
+		# -- (current mode is recording, or user has choosen option 's')
+		with workspaceLock:
+			result = recognition.poll()
+			if result is not None:
+				result = keepForDisplay(result)
+		if result is not None:
+			if predictions == 0:
+				predictedMessage =	""
 	
-		handSnapshot = np.copy(hand)
-		skeleton, handGesture = hand_processing.drawHandGesture(hand)
-
-		predictedLetter, prob = hand_processing.predictGesture(handGesture)  
+			handSnapshot, skeleton, handGesture, handKeypoints, handConfidences, predictedLetter, prob, probabilities, signStart = result
 		
-		predictionMessage = "{} - {:3}% sure".format(predictedLetter, int(prob * 100))
+			predictionMessage = "{} - {:3}% sure".format(predictedLetter, int(prob * 100))
 		
-		cv2.rectangle(handSnapshot, (0,0), (hand_cols, 40), (0,0,0), cv2.FILLED)
-		cv2.putText(handSnapshot, predictionMessage , (20, 25),  cv2.FONT_HERSHEY_COMPLEX, 1, (255, 255, 255), 2, 1)
-
-		print("User pressed 's' - taking hand area snapshot:  ", predictionMessage)
-		predictions += 1
-		predictedMessage += predictedLetter
-		
-		suggestions = np.zeros(hand.shape)
-		cv2.putText(suggestions, "Suggestions:", (20, 25),  cv2.FONT_HERSHEY_COMPLEX, 1, (255, 255, 255), 2, 1)
-		
-		lastPrefix = predictedMessage.split()[-1]
-		wordSuggestions = prefix_queries.queryProcess(processHandle, lastPrefix)
-		
-		for i in range(1, len(wordSuggestions) + 1):
-			cv2.putText(suggestions, str(i)+". "+wordSuggestions[i - 1], (20, 45 * i + 25),  cv2.FONT_HERSHEY_COMPLEX, 1, (255, 255, 255), 2, 1)
-
-		cv2.imshow('Letter Prediction', handSnapshot)
-		cv2.imshow('Skeleton on hand', skeleton)
-		cv2.imshow('Hand Gesture', handGesture)
-		cv2.imshow('Word Suggestions', suggestions)
-
-	# -- If selected mode is collecting data 
-	# -- we can press 'd' (dump) to write current translated gesture
-	# -- to file as data for future model compilation   
-	if collectingMode and predictions > 0 and (recordingON or userChoice == 'd'):
-		newRecord = "record" + str(dumpedRecords).zfill(4)
-		cv2.imwrite(path + newRecord + ".jpg", handGesture)
-		dumpedRecords += 1
-		print("User pressed 'd' - Dumped new", letter, "letter gesture database record ", newRecord, "to: ", path)
-
-
-	# -- Measure time taken for 1 frame processing
-	e = time.time()
-	timeSpent = e - s; 
-
-	# print(timeSpent)
-
-	# -- Read amount of frames needed to equalize frame loss 
-	framesToRead = int(timeSpent / timePerFrame)
-	for i in range(framesToRead):
-		ret, frame = cap.read()
-
-	iteration += 1
-
-
-# --- Close all windows and exit script
-cap.release()
-cv2.destroyAllWindows()
-prefix_queries.closeProcess(processHandle)
+			cv2.rectangle(handSnapshot, (0,0), (hand_cols, 40), (0,0,0), cv2.FILLED)
+			cv2.putText(handSnapshot, predictionMessage , (20, 25),  cv2.FONT_HERSHEY_COMPLEX, 1, (255, 255, 255), 2, 1)
+
+			print("Hand area snapshot:  ", predictionMessage)
+			predictions += 1
+			if decoder is not None:
+				# -- frames of one held sign collapse into one letter, separate snapshots never do,
+				# -- frames without a hand (or a jump of the hand box) end the sign held before them
+				if signStart:
+					decoder.gap()
+				decoder.step(probabilities, newSign=not recordingON)
+				predictedMessage = predictedMessage[:len(predictedMessage) - len(decodedWord)] + decoder.best()
+				decodedWord = decoder.best()
+
+				# -- suggestions complete the best hypotheses, not only the best one
+				wordSuggestions = decoder.suggestions()
+				showSuggestions(wordSuggestions)
+			else:
+				predictedMessage += predictedLetter
+
+				# -- Cached (or filtered) suggestions come back at once, others arrive later through poll()
+				lastPrefix = predictedMessage.split()[-1]
+				suggestionsNow = wordsClient.request(lastPrefix)
+				if suggestionsNow is not None:
+					wordSuggestions = suggestionsNow
+					showSuggestions(wordSuggestions)
+
+			showWindow('Letter Prediction', handSnapshot)
+			showWindow('Skeleton on hand', skeleton)
+			showWindow('Hand Gesture', handGesture)
+
+		# -- Show word suggestions for the current prefix once predictor answered
+		wordsResult = wordsClient.poll()
+		if wordsResult is not None and predictedMessage.split() and wordsResult[0] == predictedMessage.split()[-1]:
+			wordSuggestions = wordsResult[1]
+			showSuggestions(wordSuggestions)
+
+		# -- If selected mode is collecting data 
+		# -- we can press 'd' (dump) to append current keypoints (and optionally translated gesture image)
+		# -- to session as data for future model compilation   
+		if collectingMode and handGesture is not None and ((recordingON and result is not None) or userChoice == 'd'):
+			newRecord = "record" + str(dumpedRecords).zfill(4)
+			# -- training draws gesture images from keypoint records, so images are optional
+			train_model.appendKeypointRecord(path, handKeypoints, handConfidences)
+			if args.collect_images:
+				cv2.imwrite(path + newRecord + ".jpg", handGesture)
+			dumpedRecords += 1
+			print("User pressed 'd' - Dumped new", letter, "letter gesture database record ", newRecord, "to: ", path)
+
+		iteration += 1
+
+
+	# --- Close all windows and exit script
+	recognition.stop()
+	capture.stop()
+	if worker is not None:
+		worker.close()
+	cap.release()
+	if recorder is not None:
+		recorder.close()
+		print("Session recorded to", args.record_session)
+	if not args.headless:
+		cv2.destroyAllWindows()
+	wordsClient.shutdown()
+	perf.monitor.dump(args.perf_stats)
+	print("Per-stage latency statistics written to", args.perf_stats)
+	if changeGate is not None:
+		print("Recording mode frames: {skipped} skipped as unchanged, {processed} processed".format(**changeGate.counters()))
+	if localizer is not None:
+		print("Hand localization: hand found in {found} frames, {empty} frames empty".format(**localizer.counters()))
+	if hand_processing.gestureCache is not None:
+		print("Gesture cache: {hits} hits, {misses} misses ({hit_rate:.0%})".format(**hand_processing.gestureCache.stats()))
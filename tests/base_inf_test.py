@@ -0,0 +1,60 @@
+import pytest
+import numpy as np
+from base_inf import InferenceEngine, MicroBatchQueue
+
+class SumEngine(InferenceEngine):
+    # output[i] = sum of i-th blob, records every forward pass batch size
+    def __init__(self, supports_batching):
+        self.supports_batching = supports_batching
+        self.calls = []
+
+    def infer(self, input):
+        self.calls.append(input.shape[0])
+        return input.sum(axis=(1, 2, 3)).reshape(-1, 1)
+
+def crops(n):
+    return [np.full((10, 10, 3), i, dtype=np.uint8) for i in range(n)]
+
+class TestInferenceEngine:
+    def test_engine_without_infer_cannot_be_created(self):
+        class Incomplete(InferenceEngine):
+            pass
+
+        with pytest.raises(TypeError):
+            Incomplete()
+
+class TestInferBatch:
+    def test_batching_engine_runs_single_forward(self):
+        engine = SumEngine(True)
+        output = engine.infer_batch(crops(4), (5, 5))
+
+        assert(engine.calls == [4])
+        assert(output.shape == (4, 1))
+
+    def test_fixed_batch_engine_matches_batched_output(self):
+        batched = SumEngine(True).infer_batch(crops(3), (5, 5))
+        engine = SumEngine(False)
+        output = engine.infer_batch(crops(3), (5, 5))
+
+        assert(engine.calls == [1, 1, 1])
+        assert(np.allclose(output, batched))
+
+class TestMicroBatchQueue:
+    def test_requests_are_gathered_into_one_batch(self):
+        engine = SumEngine(True)
+        batcher = MicroBatchQueue(engine, (5, 5), max_batch_size=4, max_delay=1.0)
+        futures = [batcher.submit(crop) for crop in crops(4)]
+        results = [future.result(timeout=5) for future in futures]
+        batcher.close()
+
+        assert(engine.calls == [4])
+        expected = engine.infer_batch(crops(4), (5, 5))
+        for i, result in enumerate(results):
+            assert(np.allclose(result, expected[i:i + 1]))
+
+    def test_submit_after_close_raises(self):
+        batcher = MicroBatchQueue(SumEngine(True), (5, 5))
+        batcher.close()
+
+        with pytest.raises(RuntimeError):
+            batcher.submit(crops(1)[0])
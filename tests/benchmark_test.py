@@ -0,0 +1,62 @@
+import argparse
+import cv2
+import numpy as np
+
+import benchmark
+import engine_registry
+import hand_processing
+from utils.lazy import LazyModel
+
+def benchmarkArguments():
+    return argparse.Namespace(images=["examples"], repeats=1, warmup=0, engines=["opencv"], net_size=None,
+        dictionary="dictionaries/default.txt")
+
+class BrokenEngine:
+    # engine created from an unreadable model file, fails on first forward pass like cv2.dnn does
+    def infer(self, blob):
+        raise cv2.error("cannot read model weights")
+
+def brokenModel():
+    raise OSError("gesture model file is not a model")
+
+class TestRunBenchmark:
+    def test_broken_models_are_skipped_and_heatmaps_synthetic(self, monkeypatch):
+        monkeypatch.setattr(engine_registry, "create_engine", lambda config: BrokenEngine())
+        monkeypatch.setattr(hand_processing, "model", LazyModel(brokenModel))
+        monkeypatch.setattr(hand_processing, "keypointModel", LazyModel(lambda: None))
+
+        stages = benchmark.runBenchmark(benchmarkArguments())["stages"]
+
+        assert("cannot read model weights" in stages["keypoint_inference_opencv"]["skipped"])
+        assert("skipped" in stages["cnn_classification"] and "skipped" in stages["cached_classification"])
+        assert(stages["heatmap_decoding"]["synthetic_input"] == True)
+        assert(stages["gesture_rendering"]["count"] == len(benchmark.loadHands(["examples"])) and stages["prefix_query"]["count"] > 0)
+
+    def test_working_classifier_is_measured(self, monkeypatch):
+        monkeypatch.setattr(engine_registry, "create_engine", lambda config: BrokenEngine())
+        monkeypatch.setattr(hand_processing, "model", LazyModel(lambda: lambda inputData: np.eye(23)[[0]]))
+        monkeypatch.setattr(hand_processing, "keypointModel", LazyModel(lambda: None))
+
+        stages = benchmark.runBenchmark(benchmarkArguments())["stages"]
+
+        assert(stages["cnn_classification"]["count"] == len(benchmark.loadHands(["examples"])))
+        # -- cache is set up only for its own stage
+        assert(stages["cached_classification"]["count"] == len(benchmark.loadHands(["examples"])))
+        assert(hand_processing.gestureCache is None)
+
+class TestCompareWithBaseline:
+    def test_only_measured_stages_slower_than_tolerance_are_flagged(self):
+        baseline = {"stages": {
+            "heatmap_decoding": {"p50_ms": 1.0},
+            "gesture_rendering": {"p50_ms": 1.0},
+            "keypoint_inference_opencv": {"p50_ms": 50.0},
+        }}
+        report = {"stages": {
+            "heatmap_decoding": {"p50_ms": 1.5},
+            "gesture_rendering": {"p50_ms": 1.1},
+            "keypoint_inference_opencv": {"skipped": "no model"},
+            "prefix_query": {"p50_ms": 9.0},
+        }}
+
+        assert(benchmark.compareWithBaseline(report, baseline, 0.2) == [("heatmap_decoding", 1.0, 1.5)])
+        assert(benchmark.compareWithBaseline(report, baseline, 0.6) == [])
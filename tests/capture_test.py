@@ -0,0 +1,104 @@
+import time
+import threading
+from utils.capture import LatestFrameCapture, FrameStage
+
+class FakeSource:
+    def __init__(self, frames):
+        self.frames = list(frames)
+        self.lock = threading.Lock()
+
+    def read(self):
+        with self.lock:
+            if not self.frames:
+                return False, None
+            return True, self.frames.pop(0)
+
+def waitForResult(stage, timeout=1):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        result = stage.poll()
+        if result is not None:
+            return result
+        time.sleep(0.001)
+    return None
+
+class TestLatestFrameCapture:
+    def test_read_returns_newer_frames_until_source_ends(self):
+        capture = LatestFrameCapture(FakeSource(range(5))).start()
+
+        frame_id, seen = -1, []
+        while True:
+            frame_id, frame = capture.read(frame_id, timeout=1)
+            if frame is None:
+                break
+            seen.append(frame)
+        capture.stop()
+
+        assert(seen == sorted(seen))
+        assert(seen[-1] == 4)
+
+    def test_frame_stage_processes_requested_frame(self):
+        capture = LatestFrameCapture(FakeSource(range(1000))).start()
+        done = threading.Event()
+        stage = FrameStage(capture, lambda frame: (done.set(), frame * 2)[1]).start()
+
+        assert(stage.poll() is None)
+        stage.request()
+        assert(done.wait(1))
+
+        stage.stop()
+        result = stage.poll()
+        capture.stop()
+
+        assert(result is not None and result % 2 == 0)
+        assert(stage.poll() is None)
+
+    def test_lockstep_capture_does_not_drop_frames(self):
+        capture = LatestFrameCapture(FakeSource(range(50)), lockstep=True).start()
+
+        frame_id, seen = -1, []
+        while True:
+            frame_id, frame = capture.read(frame_id, timeout=1)
+            if frame is None:
+                break
+            seen.append(frame)
+        capture.stop()
+
+        assert(seen == list(range(50)))
+
+    def test_synchronous_stage_processes_fed_frames_only_when_asked(self):
+        processed = []
+        stage = FrameStage(None, lambda frame: processed.append(frame) or frame * 2, synchronous=True).start()
+
+        stage.feed(1)
+        stage.request()
+        stage.feed(2)
+        stage.feed(3)
+        assert(stage.poll() == 4)
+
+        stage.set_continuous(True)
+        for frame in range(4, 7):
+            stage.feed(frame)
+        stage.stop()
+        stage.feed(7)
+
+        assert(processed == [2, 4, 5, 6] and stage.poll() == 12)
+
+    def test_fed_stage_processes_each_fed_frame_at_most_once(self):
+        processed = []
+        done = threading.Event()
+        stage = FrameStage(None, lambda frame: (processed.append(frame), done.set(), frame)[2]).start()
+
+        stage.feed(1)
+        stage.request()
+        assert(waitForResult(stage) == 1)
+
+        # -- next request waits for a frame newer than the processed one
+        done.clear()
+        stage.request()
+        assert(not done.wait(0.1))
+        stage.feed(2)
+        assert(done.wait(1))
+        stage.stop()
+
+        assert(processed == [1, 2] and stage.poll() == 2)
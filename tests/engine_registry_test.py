@@ -0,0 +1,40 @@
+import time
+import numpy as np
+import engine_registry
+
+class SleepEngine:
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.measure_latency = True
+
+    def infer(self, input):
+        time.sleep(self.seconds)
+        return input
+
+def failingEngine(config):
+    raise RuntimeError("backend not available")
+
+class TestAutotune:
+    def test_fastest_working_configuration_is_stored_per_machine(self, tmp_path, monkeypatch):
+        monkeypatch.setitem(engine_registry.ENGINES, "sleep",
+            (lambda config: SleepEngine(0.004 / config["threads"]), lambda threads: [ { "engine": "sleep", "threads": n } for n in threads ]))
+        monkeypatch.setitem(engine_registry.ENGINES, "broken", (failingEngine, lambda threads: [ { "engine": "broken" } ]))
+
+        configurations = engine_registry.candidate_configurations(["sleep", "broken"], threads=[1, 4])
+        best, timings = engine_registry.autotune([np.zeros((1, 3, 8, 8))], configurations, repeats=3, warmup=1)
+
+        assert(best == { "engine": "sleep", "threads": 4 })
+        assert(sorted(timings) == ["sleep/1", "sleep/4"])
+
+        path = str(tmp_path / "tuning.json")
+        assert(engine_registry.load_tuned_config(path) is None)
+        engine_registry.save_tuned_config(path, best, timings)
+        assert(engine_registry.load_tuned_config(path) == best)
+
+    def test_thread_counts_cover_all_cores(self):
+        assert(engine_registry.thread_counts(6) == [1, 2, 4, 6])
+        assert(engine_registry.thread_counts(1) == [1])
+
+    def test_opencv_configurations_are_available_targets(self):
+        configurations = engine_registry.candidate_configurations(["opencv"], threads=[2])
+        assert({ "engine": "opencv", "backend": "opencv", "target": "cpu", "threads": 2 } in configurations)
@@ -0,0 +1,26 @@
+import numpy as np
+from utils.gating import FrameChangeGate
+
+class TestFrameChangeGate:
+    def test_static_frames_are_skipped(self):
+        gate = FrameChangeGate(threshold=4.0)
+        rng = np.random.default_rng(0)
+        hand = rng.integers(0, 200, (280, 280, 3), dtype=np.uint8)
+        noisy = np.clip(hand.astype(np.int16) + rng.integers(-3, 4, hand.shape), 0, 255).astype(np.uint8)
+
+        assert(gate.changed(hand))
+        assert(not gate.changed(noisy))
+        assert(gate.counters() == {"processed": 1, "skipped": 1})
+
+    def test_moved_hand_and_slow_drift_are_detected(self):
+        gate = FrameChangeGate(threshold=4.0)
+        hand = np.zeros((280, 280, 3), dtype=np.uint8)
+        gate.changed(hand)
+
+        moved = hand.copy()
+        moved[:, :140] = 255
+        assert(gate.changed(moved))
+
+        # -- every step is below threshold, but the sum is not
+        results = [ gate.changed(np.clip(moved.astype(np.int16) + 3 * step, 0, 255).astype(np.uint8)) for step in range(1, 6) ]
+        assert(results[0] == False and True in results)
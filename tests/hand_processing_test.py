@@ -0,0 +1,265 @@
+import cv2
+import tracemalloc
+import pytest
+import numpy as np
+import hand_processing
+from utils import perf
+from utils.lazy import LazyModel
+
+class PeakEngine:
+    # one heatmap peak per keypoint at the same relative position of every blob
+    def __init__(self):
+        self.blobShapes = []
+
+    def infer(self, input):
+        self.blobShapes.append(input.shape)
+        rows, cols = input.shape[2] // 8, input.shape[3] // 8
+        output = np.zeros((1, 22, rows, cols), dtype=np.float32)
+        for keypoint in range(22):
+            output[0, keypoint, rows // 4 + keypoint % 5, cols // 4 + keypoint // 5] = 0.9
+        return output
+
+class TestDecodeHeatmaps:
+    def test_peaks_are_scaled_to_output_size(self):
+        heatmaps = np.zeros((22, 35, 35), dtype=np.float32)
+        heatmaps[np.arange(22), np.arange(22), 34 - np.arange(22)] = np.linspace(0.2, 1, 22)
+        points, confidences = hand_processing.decodeHeatmaps(heatmaps, 280, 280, refine=False)
+
+        assert(points.shape == (22, 2))
+        assert(np.allclose(confidences, np.linspace(0.2, 1, 22)))
+        assert(np.allclose(points[:, 0], (34 - np.arange(22) + 0.5) * 8 - 0.5))
+        assert(np.allclose(points[:, 1], (np.arange(22) + 0.5) * 8 - 0.5))
+
+    def test_subpixel_refinement_moves_towards_stronger_neighbour(self):
+        heatmaps = np.zeros((1, 10, 10), dtype=np.float32)
+        heatmaps[0, 5, 4:7] = (0.2, 1.0, 0.6)
+        points, confidences = hand_processing.decodeHeatmaps(heatmaps, 10, 10)
+
+        assert(5 < points[0, 0] < 5.5)
+        assert(points[0, 1] == 5)
+
+    def test_peak_on_map_border_is_not_refined(self):
+        heatmaps = np.zeros((2, 10, 10), dtype=np.float32)
+        heatmaps[0, 0, 9] = 1.0
+        heatmaps[1, 3, 0:2] = (1.0, 0.5)
+        points, confidences = hand_processing.decodeHeatmaps(heatmaps, 10, 10)
+
+        assert(np.array_equal(points, [[9, 0], [0, 3]]))
+        assert(np.allclose(confidences, 1.0))
+
+class TestKeypointNormalization:
+    def test_missing_points_stay_missing_and_hand_is_centered(self):
+        points = np.array([[10, 20], [50, 60], [np.nan, np.nan]] + [[30, 40]] * 19, dtype=np.float32)
+        centered = hand_processing.getCenteredKeypoints(points, 280, 280)
+        transformed = hand_processing.getTransformedKeypoints(centered, 280, 280)
+
+        assert(np.isnan(centered[2]).all() and np.isnan(transformed[2]).all())
+        assert(np.allclose(np.nanmin(centered, axis=0) + np.nanmax(centered, axis=0), 280))
+        assert(np.isclose(np.nanmin(transformed), 5))
+
+    def test_flat_or_single_spot_box_gives_finite_points(self):
+        line = np.array([[100 + 4 * i, 20] for i in range(22)], dtype=np.float32)
+        spot = np.full((22, 2), 60, dtype=np.float32)
+
+        with np.errstate(divide="raise", invalid="raise"):
+            scaledLine = hand_processing.normalizeKeypoints(line, 280, 280)
+            scaledSpot = hand_processing.normalizeKeypoints(spot, 280, 280)
+
+        assert(np.isfinite(scaledLine).all() and np.isfinite(scaledSpot).all())
+        assert(np.allclose(scaledLine[[0, -1], 0], (5, 275)) and np.allclose(scaledLine[:, 1], 140))
+        assert(np.allclose(scaledSpot, 140))
+
+class TestHandTracker:
+    def test_tracking_runs_smaller_blob_on_roi(self, monkeypatch):
+        engine = PeakEngine()
+        monkeypatch.setattr(hand_processing, "hand_detection_engine", LazyModel(lambda: engine))
+        tracker = hand_processing.HandTracker(trackingSize=184)
+        hand = np.zeros((280, 280, 3), dtype=np.uint8)
+
+        fullPoints, confidences = tracker.detect(hand)
+        trackedPoints, confidences = tracker.detect(hand)
+
+        assert([shape[2] for shape in engine.blobShapes] == [280, 184])
+        assert(tracker.fullFrames == 1 and tracker.trackedFrames == 1)
+        assert(tracker.roi is not None)
+        assert(np.all((trackedPoints >= 0) & (trackedPoints < 280)))
+
+    def test_reset_tracker_runs_full_box(self, monkeypatch):
+        engine = PeakEngine()
+        monkeypatch.setattr(hand_processing, "hand_detection_engine", LazyModel(lambda: engine))
+        tracker = hand_processing.HandTracker(trackingSize=184)
+        hand = np.zeros((280, 280, 3), dtype=np.uint8)
+
+        tracker.detect(hand)
+        tracker.reset()
+        tracker.detect(hand)
+        assert([shape[2] for shape in engine.blobShapes] == [280, 280] and tracker.fullFrames == 2)
+
+    def test_lost_hand_falls_back_to_full_box(self, monkeypatch):
+        engine = PeakEngine()
+        infer = engine.infer
+        confidence = [1.0]
+        engine.infer = lambda input: infer(input) * confidence[0]
+        monkeypatch.setattr(hand_processing, "hand_detection_engine", LazyModel(lambda: engine))
+        tracker = hand_processing.HandTracker(trackingSize=184)
+        hand = np.zeros((280, 280, 3), dtype=np.uint8)
+
+        tracker.detect(hand)
+        tracker.detect(hand)
+        # -- tracked crop and full box both miss the hand, next frame starts from the full box again
+        confidence[0] = 0.1
+        tracker.detect(hand)
+        assert(tracker.roi is None)
+        confidence[0] = 1.0
+        tracker.detect(hand)
+
+        assert([shape[2] for shape in engine.blobShapes] == [280, 184, 184, 280, 280])
+        assert(tracker.fullFrames == 3 and tracker.trackedFrames == 1)
+
+    def test_next_roi_is_square_clipped_and_not_too_small(self):
+        tracker = hand_processing.HandTracker(margin=0.25, minCropSize=96)
+        points = np.array([[250, 260], [270, 275]] + [[np.nan, np.nan]] * 20)
+
+        assert(tracker.nextRoi(points, (280, 280)) == (184, 184, 96, 96))
+        assert(tracker.nextRoi(np.array([[10, 10]] + [[np.nan, np.nan]] * 21), (280, 280)) is None)
+
+        spread = np.array([[0, 100], [200, 150]] + [[np.nan, np.nan]] * 20)
+        assert(tracker.nextRoi(spread, (280, 280)) == (0, 0, 280, 280))
+
+class TestLazyModel:
+    def test_loader_runs_once(self):
+        calls = []
+        lazy = LazyModel(lambda: calls.append(1) or "model")
+
+        assert(lazy.get() == "model" and lazy.get() == "model")
+        assert(calls == [1])
+
+class TestOnnxGestureClassifier:
+    def test_predict_gesture_runs_exported_onnx_model_on_opencv(self, tmp_path, monkeypatch):
+        onnx = pytest.importorskip("onnx")
+        from onnx import helper, numpy_helper, TensorProto
+        # minimal classifier with the Keras model's NHWC input: flatten -> dense -> softmax, letter 'c' wins on white pixels
+        weights = np.zeros((28 * 28, 23), dtype=np.float32)
+        weights[:, 2] = 1
+        graph = helper.make_graph(
+            [helper.make_node("Reshape", ["input", "shape"], ["flat"]),
+             helper.make_node("MatMul", ["flat", "weights"], ["logits"]),
+             helper.make_node("Softmax", ["logits"], ["probabilities"], axis=1)],
+            "gesture", [helper.make_tensor_value_info("input", TensorProto.FLOAT, [1, 28, 28, 1])],
+            [helper.make_tensor_value_info("probabilities", TensorProto.FLOAT, [1, 23])],
+            [numpy_helper.from_array(np.array([1, 28 * 28], dtype=np.int64), "shape"), numpy_helper.from_array(weights, "weights")])
+        onnx.save(helper.make_model(graph, opset_imports=[helper.make_opsetid("", 11)]), str(tmp_path / "gesture.onnx"))
+
+        monkeypatch.setattr(hand_processing, "gestureOnnxPath", str(tmp_path / "gesture.onnx"))
+        monkeypatch.setattr(hand_processing, "model", LazyModel(hand_processing.loadGestureModel))
+        gesture = np.full((280, 280, 1), 255, dtype=np.uint8)
+        gesture[100:180, 100:180] = 0
+
+        letter, probability = hand_processing.predictGesture(gesture)
+
+        assert(letter == "c" and probability > 0.99)
+
+    def test_quantized_model_needs_recent_opencv(self, monkeypatch):
+        monkeypatch.setattr(hand_processing, "gestureQuantized", True)
+        monkeypatch.setattr(hand_processing.cv2, "__version__", "4.5.1")
+
+        with pytest.raises(RuntimeError, match="OpenCV >= 4.6"):
+            hand_processing.loadGestureModel()
+
+class TestGestureCache:
+    def test_default_configuration_classifies_every_pose(self, monkeypatch):
+        # -- classifier answering the next letter on every call, so any reused answer shows up
+        calls = []
+        def classify(inputData):
+            calls.append(1)
+            return np.eye(23)[[len(calls) - 1]]
+        monkeypatch.setattr(hand_processing, "model", LazyModel(lambda: classify))
+
+        points = np.random.default_rng(1).uniform(40, 240, (22, 2))
+        letters = [ hand_processing.predictGesture(None, points)[0], hand_processing.predictGesture(None, points + 0.5)[0] ]
+
+        assert(hand_processing.gestureCache is None)
+        assert(letters == ["a", "b"] and len(calls) == 2)
+
+    def test_same_pose_is_classified_once(self, monkeypatch):
+        calls = []
+        def classify(inputData):
+            calls.append(inputData.shape)
+            return np.eye(23)[[4]]
+        monkeypatch.setattr(hand_processing, "model", LazyModel(lambda: classify))
+        monkeypatch.setattr(hand_processing, "gestureCache", hand_processing.GestureCache(grid=4.0, maxSize=2))
+
+        rng = np.random.default_rng(1)
+        points = rng.uniform(40, 240, (22, 2))
+        points[3] = np.nan
+        shifted = points + 0.5
+        missingMore = np.copy(points)
+        missingMore[7] = np.nan
+
+        assert(hand_processing.predictGesture(None, points) == ("e", 1.0))
+        assert(hand_processing.predictGesture(None, shifted) == ("e", 1.0))
+        hand_processing.predictGesture(None, missingMore)
+
+        assert(len(calls) == 2)
+        stats = hand_processing.gestureCache.stats()
+        assert(stats["hits"] == 1 and stats["misses"] == 2 and stats["size"] == 2)
+
+        # -- whole softmax output is cached, not only the winning letter
+        assert(np.array_equal(hand_processing.gestureProbabilities(None, shifted), np.eye(23)[4]))
+        assert(len(calls) == 2)
+
+class StaticEngine:
+    # same preallocated output for every blob, so the engine itself does not allocate
+    def __init__(self):
+        self.output = PeakEngine().infer(np.zeros((1, 3, 280, 280), dtype=np.float32))
+
+    def infer(self, input):
+        return self.output
+
+class TestWorkspace:
+    def test_blob_matches_opencv(self):
+        workspace = hand_processing.Workspace()
+        hand = np.random.default_rng(3).integers(0, 256, (280, 280, 3), dtype=np.uint8)
+
+        for size in ((280, 280), (184, 184)):
+            expected = cv2.dnn.blobFromImage(hand, 1.0/255, size, (0, 0, 0), swapRB=False, crop=False)
+            blob = workspace.blob(hand, size)
+            assert(blob.shape == expected.shape and np.allclose(blob, expected, atol=1e-6))
+            assert(workspace.blob(hand, size) is blob)
+
+    def test_frames_do_not_allocate(self, monkeypatch):
+        output = np.eye(23, dtype=np.float32)[[2]]
+        monkeypatch.setattr(hand_processing, "hand_detection_engine", LazyModel(StaticEngine))
+        monkeypatch.setattr(hand_processing, "model", LazyModel(lambda: lambda inputData: output))
+        monkeypatch.setattr(hand_processing, "gestureCache", None)
+        # -- stage timers keep the last durations, small rings are full after warm-up
+        monkeypatch.setattr(perf, "monitor", perf.PerfMonitor(size=4))
+        workspace = hand_processing.Workspace()
+        frame = np.random.default_rng(4).integers(0, 256, (480, 640, 3), dtype=np.uint8)
+
+        def recognize(workspace):
+            hand = workspace.copyHand(frame[150:430, 20:300]) if workspace is not None else np.copy(frame[150:430, 20:300])
+            points, confidences = hand_processing.detectKeypoints(hand, workspace=workspace)
+            skeleton, handGesture = hand_processing.renderHandGesture(hand, points, workspace)
+            return hand_processing.predictGesture(handGesture, points, workspace=workspace)
+
+        def allocatedPerFrame(workspace, frames=20):
+            # -- warm-up also fills NumPy's cache of small freed buffers
+            for i in range(50):
+                recognize(workspace)
+            tracemalloc.start()
+            base = tracemalloc.get_traced_memory()[0]
+            for i in range(frames):
+                assert(recognize(workspace)[0] == "c")
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            return current - base, peak - base
+
+        retained, peak = allocatedPerFrame(workspace)
+        # -- only small temporaries (keypoint arrays), nothing of image size
+        assert(peak < 32 * 1024)
+        # -- nothing kept between frames: retained memory does not grow with the frame count,
+        # -- what is left are a few KiB of freed buffers NumPy (1.19) still caches
+        assert(retained < 8 * 1024 and allocatedPerFrame(workspace, 200)[0] < 8 * 1024)
+        # -- without workspace every frame allocates hand, skeleton, canvas and blob
+        assert(allocatedPerFrame(None)[1] > 1024 * 1024)
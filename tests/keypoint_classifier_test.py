@@ -0,0 +1,37 @@
+import numpy as np
+from keypoint_classifier import keypoint_features, KeypointClassifier, N_FEATURES
+
+def handKeypoints():
+    rng = np.random.default_rng(0)
+    return rng.uniform(0, 280, (22, 2)).astype(np.float32)
+
+class TestKeypointFeatures:
+    def test_features_are_translation_and_scale_invariant(self):
+        points = handKeypoints()
+        features = keypoint_features(points)
+
+        assert(features.shape == (N_FEATURES,))
+        assert(np.allclose(features, keypoint_features(points * 0.5 + 30), atol=1e-5))
+
+    def test_missing_points_are_masked(self):
+        points = handKeypoints()
+        points[3] = np.nan
+        features = keypoint_features(points)
+
+        assert(not np.isnan(features).any())
+        assert(features[-22 + 3] == 1 and features[-22:].sum() == 1)
+
+class TestKeypointClassifier:
+    def test_save_load_predict(self, tmp_path):
+        rng = np.random.default_rng(1)
+        classifier = KeypointClassifier([rng.normal(size=(N_FEATURES, 8)), rng.normal(size=(8, 23))],
+                                        [np.zeros(8), np.zeros(23)])
+        classifier.save(str(tmp_path / "model.npz"))
+        loaded = KeypointClassifier.load(str(tmp_path / "model.npz"))
+
+        features = np.stack([keypoint_features(handKeypoints()), keypoint_features(handKeypoints() + 5)])
+        probabilities = loaded.predict(features)
+
+        assert(probabilities.shape == (2, 23))
+        assert(np.allclose(probabilities.sum(axis=1), 1))
+        assert(np.allclose(probabilities, classifier.predict(features)))
@@ -0,0 +1,56 @@
+import cv2
+import numpy as np
+from utils.localization import HandLocalizer
+
+# BGR color inside the skin range of YCrCb
+SKIN = (120, 150, 210)
+
+def frameWithHands(*centers):
+    frame = np.full((480, 640, 3), 40, dtype=np.uint8)
+    for center in centers:
+        cv2.ellipse(frame, center, (50, 70), 0, 0, 360, SKIN, cv2.FILLED)
+    return frame
+
+class TestHandLocalizer:
+    def test_box_is_centered_on_hand(self):
+        localizer = HandLocalizer()
+        x, y, cols, rows = localizer.locate(frameWithHands((400, 260)))
+
+        assert((cols, rows) == (280, 280))
+        assert(abs(x + cols / 2 - 400) <= 4 and abs(y + rows / 2 - 260) <= 4)
+
+    def test_box_stays_inside_frame(self):
+        localizer = HandLocalizer()
+        x, y, cols, rows = localizer.locate(frameWithHands((600, 440)))
+        assert((x, y) == (640 - 280, 480 - 280))
+
+    def test_empty_frames_lose_hand_after_patience(self):
+        localizer = HandLocalizer(patience=2)
+        assert(localizer.locate(frameWithHands()) is None)
+
+        box = localizer.locate(frameWithHands((320, 240)))
+        assert(localizer.locate(frameWithHands()) == box)
+        assert(localizer.locate(frameWithHands()) == box)
+        assert(localizer.locate(frameWithHands()) is None)
+        assert(localizer.counters() == {"found": 1, "empty": 4})
+
+    def test_jump_is_smoothed(self):
+        localizer = HandLocalizer(smoothing=0.5)
+        localizer.locate(frameWithHands((200, 240)))
+        x, y, cols, rows = localizer.locate(frameWithHands((400, 240)))
+        assert(abs(x + cols / 2 - 300) <= 4)
+
+    def test_moving_hand_wins_over_static_skin(self):
+        localizer = HandLocalizer()
+        localizer.locate(frameWithHands((150, 240), (450, 200)))
+        x, y, cols, rows = localizer.locate(frameWithHands((150, 240), (450, 280)))
+        assert(x + cols / 2 > 320)
+
+    def test_only_jumps_count_as_moved_box(self):
+        localizer = HandLocalizer(jump=0.1)
+        box = (100, 100, 280, 280)
+
+        assert(not localizer.moved(box, (110, 95, 280, 280)))
+        assert(localizer.moved(box, (160, 100, 280, 280)))
+        assert(localizer.moved(None, box) and localizer.moved(box, None))
+        assert(not localizer.moved(None, None))
@@ -0,0 +1,71 @@
+import cv2
+import shutil
+import numpy as np
+from multiprocessing.pool import ThreadPool
+
+import hand_processing
+import offline_recognition
+from tests.hand_processing_test import PeakEngine
+from utils.lazy import LazyModel
+
+class LetterC:
+    # gesture classifier answering 'c', counts how many times it really ran
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, inputData):
+        self.calls += 1
+        return np.eye(23)[[2]]
+
+class TestOfflineRecognition:
+    def test_image_directory_is_relabeled(self, monkeypatch, tmp_path):
+        monkeypatch.setattr(hand_processing, "hand_detection_engine", LazyModel(PeakEngine))
+        classifier = LetterC()
+        monkeypatch.setattr(hand_processing, "model", LazyModel(lambda: classifier))
+        monkeypatch.setattr(hand_processing, "gestureCache", hand_processing.GestureCache())
+
+        session = tmp_path / "session"
+        session.mkdir()
+        shutil.copy("examples/a.jpg", str(session / "record0000.jpg"))
+        cv2.imwrite(str(session / "record0001.png"), np.zeros((480, 640, 3), dtype=np.uint8))
+        (session / "record0002.jpg").write_bytes(b"not an image")
+        (session / "notes.txt").write_text("skipped")
+
+        offline_recognition.initWorker(None)
+        records = [ offline_recognition.processFrame(task) for task in offline_recognition.generateTasks(str(session), None) ]
+
+        assert([ record["source"] for record in records ] == ["record0000.jpg", "record0001.png", "record0002.jpg"])
+        assert([ record.get("letter") for record in records ] == ["c", "c", None])
+        # -- both frames give the same pose, still each one is classified (warm-up ran it once more)
+        assert(hand_processing.gestureCache is None and classifier.calls == 1 + 2)
+        assert(records[2]["error"] == "cannot decode image")
+        assert(len(records[0]["keypoints"]) == 22 and np.allclose(records[0]["confidences"], 0.9))
+
+    def test_video_frames_are_cut_to_hand_box(self, tmp_path):
+        video = str(tmp_path / "session.avi")
+        writer = cv2.VideoWriter(video, cv2.VideoWriter_fourcc(*"MJPG"), 10, (640, 480))
+        for i in range(3):
+            writer.write(np.full((480, 640, 3), 50 * i, dtype=np.uint8))
+        writer.release()
+
+        tasks = list(offline_recognition.generateTasks(video, (20, 150)))
+
+        assert([ task[1] for task in tasks ] == [0, 1, 2])
+        assert(all(task[2].shape == (280, 280, 3) and task[3] is None for task in tasks))
+
+    def test_tasks_are_read_only_a_bounded_window_ahead(self):
+        produced = [0]
+        def tasks():
+            for i in range(100):
+                produced[0] += 1
+                yield i
+
+        consumed, ahead = [], []
+        with ThreadPool(2) as pool:
+            for result in offline_recognition.imapBounded(pool, abs, tasks(), 4, 3):
+                consumed.append(result)
+                ahead.append(produced[0] - len(consumed))
+
+        assert(consumed == list(range(100)))
+        # -- window chunks of chunksize tasks at most
+        assert(max(ahead) <= 3 * 4)
@@ -0,0 +1,39 @@
+import json
+from utils.perf import summarize_latencies, RingTimer, PerfMonitor
+
+class TestSummarizeLatencies:
+    def test_percentiles_and_throughput(self):
+        summary = summarize_latencies([i / 1000 for i in range(100, 0, -1)])
+
+        assert(summary["count"] == 100)
+        assert(summary["p50_ms"] == 50)
+        assert(summary["p95_ms"] == 95)
+        assert(summary["p99_ms"] == 99)
+        assert(abs(summary["throughput"] - 100 / 5.05) < 1e-9)
+
+    def test_empty_latencies(self):
+        assert(summarize_latencies([]) == {"count": 0})
+
+class TestPerfMonitor:
+    def test_ring_timer_keeps_sliding_window(self):
+        timer = RingTimer(size=4)
+        for i in range(10):
+            timer.record(i / 1000, end=i / 10)
+        summary = timer.summary()
+
+        assert(summary["count"] == 4 and summary["total_count"] == 10)
+        assert(summary["p50_ms"] == 7)
+        assert(abs(summary["rate"] - 10) < 1e-9)
+
+    def test_monitor_timer_and_dump(self, tmp_path):
+        monitor = PerfMonitor()
+        with monitor.timer("decoding"):
+            pass
+        monitor.record("classification", 0.002)
+
+        assert(sorted(monitor.summaries()) == ["classification", "decoding"])
+        assert(any(line.startswith("classification: p50 2.0") for line in monitor.overlay_lines()))
+
+        monitor.dump(str(tmp_path / "stats.json"))
+        with open(str(tmp_path / "stats.json")) as f:
+            assert(json.load(f)["decoding"]["count"] == 1)
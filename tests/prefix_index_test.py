@@ -0,0 +1,61 @@
+import os
+import time
+from prefix_index import PrefixIndex, CompiledPrefixIndex, compile_index, load_compiled
+
+class TestPrefixIndex:
+    def test_query_ranks_by_frequency_then_dictionary_order(self):
+        index = PrefixIndex.from_words(["kot", "koza", "kot", "kran", "koc"], k=3)
+
+        assert(index.query("ko") == ["kot", "koza", "koc"])
+        assert(index.query("k", 2) == ["kot", "koza"])
+
+    def test_unknown_prefix_returns_empty_list(self):
+        index = PrefixIndex.from_words(["hej", "czesc"])
+
+        assert(index.query("x") == [])
+
+    def test_add_word_updates_completions(self):
+        index = PrefixIndex.from_words(["dom", "dobry", "dzien"], k=2)
+        assert(index.query("d") == ["dom", "dobry"])
+
+        index.add_word("dzien", 2)
+        index.add_word("dach")
+
+        assert(index.query("d") == ["dzien", "dom"])
+        assert(index.query("da") == ["dach"])
+        assert("dach" in index and len(index) == 4)
+
+    def test_load_default_dictionary(self):
+        index = PrefixIndex.from_file("dictionaries/default.txt")
+
+        assert(all(word.startswith("d") for word in index.query("d")))
+        assert(len(index.query("")) == 5)
+
+class TestCompiledPrefixIndex:
+    def test_compiled_index_matches_prefix_index(self, tmp_path):
+        words = ["zolw", "zubr", "zebra", "zubr", "źrebię", "zamek"]
+        index = PrefixIndex.from_words(words, k=3)
+        compile_index(index, str(tmp_path / "words.idx"))
+        compiled = CompiledPrefixIndex(str(tmp_path / "words.idx"))
+
+        for prefix in ["", "z", "zu", "ź", "zebra", "q"]:
+            assert(compiled.query(prefix) == index.query(prefix))
+        assert(len(compiled) == len(index))
+        # -- walking the prefix one letter at a time ends in the same place for both
+        assert(compiled.child(compiled.child(0, "z"), "u") == compiled._find("zu"))
+        assert(index.child(index.child(0, "z"), "u") == index._find("zu"))
+        assert(compiled.child(0, "q") is None and index.child(0, "q") is None)
+        compiled.close()
+
+    def test_load_compiled_rebuilds_when_text_is_newer(self, tmp_path):
+        dictionary = tmp_path / "words.txt"
+        dictionary.write_text("ala\nalbum\n")
+        compiled = load_compiled(str(dictionary))
+        assert(compiled.query("al") == ["ala", "album"])
+        compiled.close()
+
+        dictionary.write_text("alfa\n")
+        os.utime(str(dictionary), (time.time() + 10, time.time() + 10))
+        compiled = load_compiled(str(dictionary))
+        assert(compiled.query("al") == ["alfa"])
+        compiled.close()
@@ -0,0 +1,150 @@
+import time
+import threading
+import numpy as np
+import prefix_queries
+from prefix_index import PrefixIndex
+
+WORDS = ["dom", "dobry", "dzien", "dach", "dobranoc", "dokad"]
+
+class FakePredictor:
+    # backend whose handles are counted, queries can be made to crash or hang
+    def __init__(self):
+        self.started = 0
+        self.queries = []
+        self.crash = False
+        self.hang = threading.Event()
+        self.index = PrefixIndex.from_words(WORDS, k=3)
+
+    def start(self):
+        self.started += 1
+        return self.started
+
+    def query(self, handle, prefix):
+        self.queries.append(prefix)
+        if self.crash:
+            self.crash = False
+            raise BrokenPipeError("predictor died")
+        if prefix == "hang":
+            self.hang.wait(5)
+        return self.index.query(prefix)
+
+def waitForResult(client):
+    for i in range(200):
+        result = client.poll()
+        if result is not None:
+            return result
+        time.sleep(0.01)
+
+def makeClient(predictor, timeout=0.5):
+    return prefix_queries.PredictorClient(predictor.start, predictor.query, lambda handle: None, nOfWords=3, timeout=timeout)
+
+class TestPredictorClient:
+    def test_request_does_not_block_and_caches_results(self):
+        predictor = FakePredictor()
+        client = makeClient(predictor)
+
+        assert(client.request("do") is None)
+        assert(waitForResult(client) == ("do", ["dom", "dobry", "dobranoc"]))
+        assert(client.request("do") == ["dom", "dobry", "dobranoc"])
+        assert(predictor.queries == ["do"])
+        client.shutdown()
+
+    def test_longer_prefix_reuses_complete_parent_list(self):
+        predictor = FakePredictor()
+        client = makeClient(predictor)
+        client.request("dob")
+        waitForResult(client)
+
+        assert(client.request("dobr") == ["dobry", "dobranoc"])
+        assert(predictor.queries == ["dob"])
+        client.shutdown()
+
+    def test_crashed_predictor_is_restarted(self):
+        predictor = FakePredictor()
+        predictor.crash = True
+        client = makeClient(predictor)
+        client.request("da")
+
+        assert(waitForResult(client) == ("da", ["dach"]))
+        assert(predictor.started == 2 and client.restarts == 1)
+        client.shutdown()
+
+    def test_hung_predictor_times_out(self):
+        predictor = FakePredictor()
+        client = makeClient(predictor, timeout=0.05)
+        client.request("hang")
+
+        assert(waitForResult(client) == ("hang", []))
+        assert(client.restarts == 2)
+        predictor.hang.set()
+        client.shutdown()
+
+ALPHABET = list("abcdefghijklmnoprstuwyz")
+
+def letterFrame(letter, probability=0.7, other=None, otherProbability=0.0):
+    # -- probabilities of one recognized frame, what is left is spread over the remaining letters
+    frame = np.full(len(ALPHABET), (1.0 - probability - otherProbability) / (len(ALPHABET) - 1 - (other is not None)))
+    frame[ALPHABET.index(letter)] = probability
+    if other is not None:
+        frame[ALPHABET.index(other)] = otherProbability
+    return frame
+
+class TestWordDecoder:
+    def test_held_signs_collapse_and_spurious_frame_is_ignored(self):
+        decoder = prefix_queries.WordDecoder(PrefixIndex.from_words(WORDS), ALPHABET)
+        frames = [ letterFrame("d") ] * 4 + [ letterFrame("z", 0.5, "o", 0.3) ] + [ letterFrame("o") ] * 4 + [ letterFrame("m") ] * 4
+        for frame in frames:
+            decoder.step(frame)
+
+        assert(decoder.best() == "dom")
+        assert(decoder.hypotheses(1) == [("dom", 0.0)])
+
+    def test_dictionary_prefers_known_words(self):
+        decoder = prefix_queries.WordDecoder(PrefixIndex.from_words(WORDS), ALPHABET)
+        for letter, other in (("d", None), ("o", None), ("n", "m")):
+            for i in range(3):
+                decoder.step(letterFrame(letter, 0.45, other, 0.35) if other else letterFrame(letter))
+
+        assert(decoder.best() == "dom")
+        assert(decoder.suggestions()[0] == "dom")
+
+    def test_snapshots_do_not_collapse(self):
+        decoder = prefix_queries.WordDecoder(PrefixIndex.from_words(["aha", "ala", "alla"]), ALPHABET)
+        for letter in "alla":
+            decoder.step(letterFrame(letter, 0.9), newSign=True)
+        assert(decoder.best() == "alla")
+
+        decoder.reset()
+        assert(decoder.best() == "" and decoder.suggestions() == [])
+
+    def test_gap_separates_doubled_letter(self):
+        decoder = prefix_queries.WordDecoder(PrefixIndex.from_words(["ala", "alla"]), ALPHABET)
+        for letter in "al":
+            for i in range(3):
+                decoder.step(letterFrame(letter))
+        decoder.gap()
+        for letter in "la":
+            for i in range(3):
+                decoder.step(letterFrame(letter))
+        assert(decoder.best() == "alla")
+
+        # -- without the gap frames of both signs collapse into one letter
+        decoder.reset()
+        for letter in "alla":
+            for i in range(3):
+                decoder.step(letterFrame(letter))
+        assert(decoder.best() == "ala")
+
+    def test_reset_continues_prefix(self):
+        decoder = prefix_queries.WordDecoder(PrefixIndex.from_words(["ala", "alla"]), ALPHABET)
+        decoder.reset("al")
+        for i in range(3):
+            decoder.step(letterFrame("l"))
+        assert(decoder.best() == "all" and decoder.suggestions()[0] == "alla")
+
+    def test_beam_is_bounded(self):
+        decoder = prefix_queries.WordDecoder(PrefixIndex.from_words(WORDS), ALPHABET, beamWidth=4, history=8)
+        for i in range(20):
+            decoder.step(np.random.default_rng(i).dirichlet(np.ones(len(ALPHABET))))
+
+        assert(len(decoder.hypotheses()) == 4 and len(decoder.frames) == 8)
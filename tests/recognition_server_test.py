@@ -0,0 +1,90 @@
+import json
+import pytest
+import threading
+import numpy as np
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+import hand_processing
+import load_generator
+import recognition_server
+from utils.lazy import LazyModel
+
+class BatchPeakEngine:
+    supports_batching = True
+
+    def __init__(self):
+        self.batchSizes = []
+
+    def infer_batch(self, images, size):
+        self.batchSizes.append(len(images))
+        output = np.zeros((len(images), 22, size[1] // 8, size[0] // 8), dtype=np.float32)
+        for keypoint in range(22):
+            output[:, keypoint, 5 + keypoint % 5, 5 + keypoint // 5] = 0.9
+        return output
+
+    def infer(self, blob):
+        return self.infer_batch([None] * blob.shape[0], (blob.shape[3], blob.shape[2]))
+
+def letterB(inputData):
+    probabilities = np.zeros((1, 23), dtype=np.float32)
+    probabilities[0, 1] = 1
+    return probabilities
+
+class FailingService:
+    def recognize(self, hand, prefix):
+        raise RuntimeError("gesture model is broken")
+
+class TestRecognitionServer:
+    def test_server_answers_concurrent_clients(self, monkeypatch):
+        engine = BatchPeakEngine()
+        monkeypatch.setattr(hand_processing, "hand_detection_engine", LazyModel(lambda: engine))
+        monkeypatch.setattr(hand_processing, "model", LazyModel(lambda: letterB))
+
+        service = recognition_server.RecognitionService(workers=2, maxDelay=0.01)
+        server = recognition_server.createServer(service, port=0)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        url = "http://127.0.0.1:" + str(server.server_address[1])
+
+        try:
+            summary, errors = load_generator.runLoad(url, load_generator.loadImages("examples")[:3], clients=3, requests=4)
+            with urlopen(url + "/metrics") as response:
+                metrics = json.loads(response.read())
+        finally:
+            server.shutdown()
+            server.server_close()
+            service.close()
+
+        assert(errors == [])
+        assert(summary["count"] == 12)
+        assert(sum(engine.batchSizes) == 1 + 12)
+        assert(metrics["in_flight"] == 0 and metrics["stages"]["request"]["total_count"] == 12)
+
+    def test_recognize_returns_letter_keypoints_and_suggestions(self, monkeypatch):
+        monkeypatch.setattr(hand_processing, "hand_detection_engine", LazyModel(lambda: BatchPeakEngine()))
+        monkeypatch.setattr(hand_processing, "model", LazyModel(lambda: letterB))
+        service = recognition_server.RecognitionService(workers=1)
+
+        result = service.recognize(np.zeros((100, 100, 3), dtype=np.uint8), prefix="do")
+        service.close()
+
+        assert(result["letter"] == "b" and result["probability"] == 1)
+        assert(len(result["keypoints"]) == 22 and None not in result["keypoints"])
+        assert(result["suggestions"] == ["dobry"])
+
+    def test_failing_recognition_is_reported_as_json(self):
+        server = recognition_server.createServer(FailingService(), port=0)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        url = "http://127.0.0.1:{}/recognize?width=2&height=2".format(server.server_address[1])
+
+        try:
+            with pytest.raises(HTTPError) as error:
+                urlopen(Request(url, data=bytes(12), headers={"Content-Type": "application/octet-stream"}))
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        assert(error.value.code == 500)
+        assert(json.loads(error.value.read()) == {"error": "recognition failed: gesture model is broken"})
@@ -0,0 +1,117 @@
+import os
+import time
+import threading
+import functools
+import numpy as np
+from recognition_worker import RecognitionWorker, SharedRing
+from tests.hand_processing_test import PeakEngine
+
+def fakeGestureModel():
+    return lambda inputData: np.eye(23)[[1]]
+
+class HangingEngine(PeakEngine):
+    # hangs on the first inference after flag file appears
+    def __init__(self, flagPath):
+        super().__init__()
+        self.flagPath = flagPath
+
+    def infer(self, input):
+        if os.path.exists(self.flagPath):
+            os.remove(self.flagPath)
+            time.sleep(60)
+        return super().infer(input)
+
+class SlowEngine(PeakEngine):
+    def infer(self, input):
+        time.sleep(0.3)
+        return super().infer(input)
+
+# -- worker is a spawned process, fake models reach it as settings, not as monkeypatched attributes
+FAKE_MODELS = {"loadKeypointEngine": PeakEngine, "loadGestureModel": fakeGestureModel}
+
+class TestSharedRing:
+    def test_attached_ring_sees_owner_writes(self):
+        owner = SharedRing(3, (4, 4), np.float32)
+        attached = SharedRing(3, (4, 4), np.float32, owner.memory.name)
+        owner.array[2] = 7
+
+        assert((attached.array[2] == 7).all() and (attached.array[:2] == 0).all())
+        attached.close()
+        owner.close()
+
+class TestRecognitionWorker:
+    def test_worker_recognizes_crops_and_survives_restart(self):
+        hand = np.zeros((280, 280, 3), dtype=np.uint8)
+
+        readyCalls = []
+        worker = RecognitionWorker(settings=FAKE_MODELS, slots=2).start(readyCalls.append)
+        try:
+            points, confidences, letter, prob, probabilities = worker.recognize(hand)
+            assert(letter == "b" and prob == 1.0 and np.array_equal(probabilities, np.eye(23)[1]))
+            assert(points.shape == (22, 2) and np.allclose(confidences, 0.9))
+
+            # -- killed worker is replaced on the next request
+            worker.process.kill()
+            worker.process.join()
+            points, confidences, letter, prob, probabilities = worker.recognize(hand)
+            assert(letter == "b" and worker.restarts == 1 and len(readyCalls) == 2)
+        finally:
+            worker.close()
+
+    def test_hanging_worker_is_restarted_after_timeout(self, tmp_path):
+        hand = np.zeros((280, 280, 3), dtype=np.uint8)
+        flag = tmp_path / "hang"
+        settings = dict(FAKE_MODELS, loadKeypointEngine=functools.partial(HangingEngine, str(flag)))
+
+        worker = RecognitionWorker(settings=settings, slots=2, timeout=1.0).start()
+        try:
+            assert(worker.ready.wait(60))
+            flag.touch()
+            hanging = worker.process
+
+            points, confidences, letter, prob, probabilities = worker.recognize(hand)
+            assert(letter == "b" and worker.restarts == 1)
+            assert(worker.process is not hanging and not hanging.is_alive())
+        finally:
+            worker.close()
+
+    def test_close_after_failed_restart(self):
+        worker = RecognitionWorker(settings=FAKE_MODELS, slots=1).start()
+        worker.process.kill()
+        worker.process.join()
+        # -- restart which did not get to start a new worker leaves neither process nor pipe
+        worker.process, worker.conn = None, None
+        worker.close()
+
+    def test_callers_failed_on_one_worker_restart_it_once(self):
+        hand = np.zeros((280, 280, 3), dtype=np.uint8)
+        worker = RecognitionWorker(settings=dict(FAKE_MODELS, loadKeypointEngine=SlowEngine), slots=3).start()
+        try:
+            assert(worker.ready.wait(60))
+            letters = []
+            callers = [ threading.Thread(target=lambda: letters.append(worker.recognize(hand)[2])) for i in range(3) ]
+            for caller in callers:
+                caller.start()
+            time.sleep(0.1)
+            # -- all three requests are in flight when the worker dies
+            worker.process.kill()
+            for caller in callers:
+                caller.join(60)
+
+            assert(letters == ["b"] * 3 and worker.restarts == 1)
+        finally:
+            worker.close()
+
+    def test_worker_hanging_in_warm_up_is_restarted(self, tmp_path):
+        hand = np.zeros((280, 280, 3), dtype=np.uint8)
+        flag = tmp_path / "hang"
+        flag.touch()
+        settings = dict(FAKE_MODELS, loadKeypointEngine=functools.partial(HangingEngine, str(flag)))
+
+        worker = RecognitionWorker(settings=settings, slots=1, warmUpTimeout=3.0).start()
+        try:
+            # -- first worker hangs in warm-up inference, the request does not wait for it forever
+            letter = worker.recognize(hand)[2]
+            assert(letter == "b" and worker.restarts == 1)
+        finally:
+            worker.close()
@@ -0,0 +1,158 @@
+import time
+import threading
+import numpy as np
+from utils.replay import SessionRecorder, ReplaySource, ReplayKeys, NO_KEY
+
+class FakeCamera:
+    def __init__(self, frames):
+        self.frames = list(frames)
+
+    def read(self):
+        if not self.frames:
+            return False, None
+        return True, self.frames.pop(0)
+
+class TestSessionReplay:
+    def test_recorded_frames_and_keys_are_replayed(self, tmp_path):
+        frames = [ np.full((48, 64, 3), 40 * i, dtype=np.uint8) for i in range(5) ]
+        recorder = SessionRecorder(FakeCamera(frames), str(tmp_path))
+        while recorder.read()[0]:
+            pass
+        recorder.record_key(1, 's')
+        recorder.record_key(3, 'q')
+        recorder.close()
+
+        source = ReplaySource(str(tmp_path), realtime=False)
+        replayed = []
+        while True:
+            ret, frame = source.read()
+            if not ret:
+                break
+            replayed.append(frame)
+        source.release()
+
+        assert(len(replayed) == 5)
+        # -- MJPG is lossy, flat frames survive almost unchanged
+        assert(all(abs(int(frame.mean()) - 40 * i) <= 2 for i, frame in enumerate(replayed)))
+
+        keys = ReplayKeys(source.keys, pump_windows=False)
+        assert([ keys.read(frame_id) for frame_id in range(5) ] == [NO_KEY, 's', NO_KEY, 'q', NO_KEY])
+
+class BrightnessEngine:
+    # keypoints move with the brightness of the hand crop, so every frame gives its own gesture
+    def infer(self, input):
+        rows, cols = input.shape[2] // 8, input.shape[3] // 8
+        shift = int(abs(float(input.mean())) * 40) % 6
+        output = np.zeros((1, 22, rows, cols), dtype=np.float32)
+        for keypoint in range(22):
+            output[0, keypoint, rows // 4 + (keypoint + shift) % 7, cols // 4 + keypoint // 5 * (1 + shift % 3)] = 0.9
+        return output
+
+def gestureSumModel():
+    return lambda inputData: np.eye(23)[[int(inputData.sum()) % 23]]
+
+class ContrastEngine(BrightnessEngine):
+    # remembers contrast of every crop it gets, a crop without the hand is flat
+    def __init__(self):
+        self.contrasts = []
+
+    def infer(self, input):
+        self.contrasts.append(float(input.max() - input.min()))
+        return super().infer(input)
+
+class ExclusiveEngine(BrightnessEngine):
+    # counts inferences running at the same time, the first one (warm-up) is slow
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.active = 0
+        self.maxActive = 0
+        self.calls = 0
+
+    def infer(self, input):
+        with self.lock:
+            self.active += 1
+            self.calls += 1
+            self.maxActive = max(self.maxActive, self.active)
+            first = self.calls == 1
+        if first:
+            time.sleep(0.3)
+        try:
+            return super().infer(input)
+        finally:
+            with self.lock:
+                self.active -= 1
+
+def replay(monkeypatch, sessionPath, perfPath, engine=BrightnessEngine, options=()):
+    import runpy
+    import sys
+    import hand_processing
+    from utils.lazy import LazyModel
+
+    # -- script configures hand_processing module, restore it after the run
+    for name in ("netInputSize", "gestureBackend", "gestureQuantized", "keypointEngineConfig", "gestureCache"):
+        monkeypatch.setattr(hand_processing, name, getattr(hand_processing, name))
+    monkeypatch.setattr(hand_processing, "hand_detection_engine", LazyModel(engine))
+    monkeypatch.setattr(hand_processing, "model", LazyModel(gestureSumModel))
+    monkeypatch.setattr(sys, "argv", ["sign_alphabet_recognition.py", "--replay", sessionPath, "--fast", "--headless",
+        "--predictor", "index", "--gesture-cache-grid", "0", "--perf-stats", perfPath] + list(options))
+    return runpy.run_path("sign_alphabet_recognition.py", run_name="__main__")
+
+class TestFastReplay:
+    def test_fast_replay_recognizes_every_frame_the_same_way(self, tmp_path, monkeypatch):
+        nFrames = 24
+        frames = []
+        for i in range(nFrames):
+            frame = np.full((480, 640, 3), 30, dtype=np.uint8)
+            frame[150:430, 20:300] = 40 + (i * 53) % 200
+            frames.append(frame)
+        recorder = SessionRecorder(FakeCamera(frames), str(tmp_path / "session"))
+        while recorder.read()[0]:
+            pass
+        recorder.record_key(1, 'r')
+        recorder.close()
+
+        messages = [ replay(monkeypatch, str(tmp_path / "session"), str(tmp_path / "perf.json"))["predictedMessage"] for run in range(2) ]
+
+        # -- recording starts on the frame after 'r', from then on each frame gives exactly one letter
+        assert(len(messages[0]) == nFrames - 2)
+        assert(messages[0] == messages[1] and len(set(messages[0])) > 1)
+
+    def test_localized_box_is_cut_from_the_recognized_frame(self, tmp_path, monkeypatch):
+        import cv2
+        frames = []
+        for i in range(24):
+            # -- hand jumps between two places every 6 frames
+            frame = np.full((480, 640, 3), 30, dtype=np.uint8)
+            cv2.ellipse(frame, (200 if i // 6 % 2 == 0 else 400, 240), (50, 70), 0, 0, 360, (120, 150, 210), cv2.FILLED)
+            frames.append(frame)
+        recorder = SessionRecorder(FakeCamera(frames), str(tmp_path / "session"))
+        while recorder.read()[0]:
+            pass
+        recorder.record_key(1, 'r')
+        recorder.close()
+
+        engine = ContrastEngine()
+        replay(monkeypatch, str(tmp_path / "session"), str(tmp_path / "perf.json"), lambda: engine,
+            ["--localize", "--change-threshold", "0"])
+
+        # -- warm-up runs on a blank crop, every recognized crop shows the hand, also right after it jumped
+        contrasts = engine.contrasts[1:]
+        assert(len(contrasts) == 22 and min(contrasts) > 0.5 * max(contrasts))
+
+        # -- gate would skip the whole (still) session, each jump of the box sends the new crop through the models
+        script = replay(monkeypatch, str(tmp_path / "session"), str(tmp_path / "perf.json"), ContrastEngine,
+            ["--localize", "--track", "--change-threshold", "100"])
+        assert(script["changeGate"].counters()["processed"] >= 4)
+
+    def test_recognition_waits_for_model_warm_up(self, tmp_path, monkeypatch):
+        frames = [ np.full((480, 640, 3), 40 + 10 * i, dtype=np.uint8) for i in range(6) ]
+        recorder = SessionRecorder(FakeCamera(frames), str(tmp_path / "session"))
+        while recorder.read()[0]:
+            pass
+        recorder.record_key(0, 'r')
+        recorder.close()
+
+        engine = ExclusiveEngine()
+        replay(monkeypatch, str(tmp_path / "session"), str(tmp_path / "perf.json"), lambda: engine)
+
+        assert(engine.calls > 1 and engine.maxActive == 1)
@@ -0,0 +1,159 @@
+import os
+import cv2
+import pytest
+import numpy as np
+import train_model
+import hand_processing
+
+def writeSession(databasePath, letter, session, values):
+    path = os.path.join(str(databasePath), letter, session)
+    os.makedirs(path)
+    for i, value in enumerate(values):
+        cv2.imwrite(os.path.join(path, "record" + str(i).zfill(4) + ".png"), np.full((280, 280, 3), value, dtype=np.uint8))
+
+class TestLoadDataset:
+    def test_cache_decodes_only_new_sessions(self, tmp_path, monkeypatch):
+        database = tmp_path / "db"
+        cache = str(tmp_path / "cache")
+        writeSession(database, "a", "000", [10, 20])
+        writeSession(database, "b", "000", [30])
+
+        X, y, manifest = train_model.loadDataset(str(database), cache, workers=1)
+        assert(X.shape == (3, train_model.training_rows, train_model.training_cols))
+        assert(list(y) == [0, 0, 1])
+        assert(list(X[:, 0, 0]) == [10, 20, 30])
+
+        decodedSessions = []
+        decodeSession = train_model.decodeSession
+        monkeypatch.setattr(train_model, "Pool", lambda workers: FakePool(decodedSessions, decodeSession))
+
+        writeSession(database, "b", "001", [40])
+        X, y, manifest = train_model.loadDataset(str(database), cache, workers=1)
+
+        assert(decodedSessions == [os.path.join(str(database), "b", "001")])
+        assert(list(y) == [0, 0, 1, 1])
+        assert(list(X[:, 0, 0]) == [10, 20, 30, 40])
+        assert(sorted(manifest) == ["a/000", "b/000", "b/001"])
+
+class FakePool:
+    def __init__(self, decodedSessions, decodeSession):
+        self.decodedSessions = decodedSessions
+        self.decodeSession = decodeSession
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def map(self, function, paths):
+        self.decodedSessions.extend(paths)
+        return [ self.decodeSession(path) for path in paths ]
+
+def handKeypoints():
+    rng = np.random.default_rng(2)
+    points = rng.uniform(60, 220, (22, 2))
+    confidences = rng.uniform(0.5, 1, 22)
+    points[5] = np.nan
+    confidences[5] = 0.01
+    return points, confidences
+
+class TestKeypointRecords:
+    def test_session_records_are_appended_and_drawn(self, tmp_path):
+        points, confidences = handKeypoints()
+        for i in range(3):
+            train_model.appendKeypointRecord(str(tmp_path), points, confidences)
+
+        records = train_model.readKeypointRecords(str(tmp_path))
+        assert(records.shape == (3, 22, 3) and records.dtype == np.float32)
+        assert(os.path.getsize(str(tmp_path / train_model.keypointRecordsFile)) == 3 * 22 * 3 * 4)
+        assert(np.isnan(records[:, 5, 0]).all() and np.allclose(records[0, :, 2], confidences))
+
+        samples = train_model.decodeSession(str(tmp_path))
+        assert(samples.shape == (3, train_model.training_rows, train_model.training_cols))
+        # -- white canvas with dark skeleton lines
+        assert(samples[0].max() == 255 and samples[0].min() < 128)
+
+    def test_other_session_files_are_reported(self, tmp_path, capsys):
+        writeSession(tmp_path, "a", "000", [10, 20])
+        session = tmp_path / "a" / "000"
+        (session / "notes.txt").write_text("not a record")
+
+        samples = train_model.decodeSession(str(session))
+
+        assert(samples.shape == (2, train_model.training_rows, train_model.training_cols))
+        assert("notes.txt - not a record image" in capsys.readouterr().out)
+
+    def test_image_only_sessions_are_left_out_of_keypoint_records(self, tmp_path, capsys):
+        writeSession(tmp_path, "a", "000", [10])
+        points, confidences = handKeypoints()
+        os.makedirs(str(tmp_path / "b" / "000"))
+        train_model.appendKeypointRecord(str(tmp_path / "b" / "000"), points, confidences)
+
+        records, y = train_model.loadKeypointRecords(str(tmp_path))
+
+        assert(records.shape == (1, 22, 3) and list(y) == [train_model.alphabet.index("b")])
+        assert("a/000 has no keypoint records" in capsys.readouterr().out)
+
+    def test_augmentation_keeps_missing_points(self):
+        points, confidences = handKeypoints()
+        augmented = train_model.augmentKeypoints(points, np.random.default_rng(0))
+
+        assert(np.isnan(augmented[5]).all())
+        assert(not np.allclose(np.delete(augmented, 5, axis=0), np.delete(points, 5, axis=0)))
+
+        record = np.column_stack((points, confidences)).astype(np.float32)[None]
+        plain = train_model.rasterizeKeypoints(record)
+        assert(not np.array_equal(plain, train_model.rasterizeKeypoints(record, np.random.default_rng(0))))
+
+class TestFineTuneSamples:
+    def test_only_new_and_changed_sessions_are_selected_with_replay(self, tmp_path):
+        manifest = {
+            "a/000": { "signature": [2, 10, 1], "start": 0, "count": 4 },
+            "a/001": { "signature": [3, 10, 2], "start": 4, "count": 2 },
+            "b/000": { "signature": [1, 5, 3], "start": 6, "count": 2 },
+        }
+        modelPath = str(tmp_path / "model.h5")
+        trained = train_model.loadTrainedSessions(modelPath)
+        train_model.saveTrainedSessions(modelPath, trained, { "a/000": [2, 10, 1], "a/001": [2, 8, 1] }, "full")
+
+        trained = train_model.loadTrainedSessions(modelPath)
+        new, replayed, heldOut = train_model.selectFineTuneSamples(manifest, trained["sessions"], replay=0.5)
+
+        # -- a/001 got more records since training, b/000 is new
+        assert(list(new) == [4, 5, 6, 7])
+        assert(len(replayed) == 2 and set(replayed) <= {0, 1, 2, 3})
+        # -- validation samples are older ones, never trained on in this run, and the same in every run
+        assert(len(heldOut) == 1 and set(heldOut) <= {0, 1, 2, 3} and not set(heldOut) & set(replayed))
+        assert(list(train_model.selectFineTuneSamples(manifest, trained["sessions"], replay=0.5)[2]) == list(heldOut))
+
+        train_model.saveTrainedSessions(modelPath, trained, { "a/001": [3, 10, 2], "b/000": [1, 5, 3] }, "incremental", len(replayed))
+        trained = train_model.loadTrainedSessions(modelPath)
+        assert(train_model.selectFineTuneSamples(manifest, trained["sessions"])[0].size == 0)
+        assert([run["mode"] for run in trained["history"]] == ["full", "incremental"])
+
+class TestExportGestureModel:
+    def test_exported_conv_model_matches_keras(self, tmp_path, monkeypatch):
+        tf = pytest.importorskip("tensorflow")
+        pytest.importorskip("tf2onnx")
+        rows, cols = train_model.training_rows, train_model.training_cols
+        layers = tf.keras.layers
+        # -- channels last convolution and pooling like the real classifier, the export has to convert the layout
+        model = tf.keras.Sequential([
+            layers.Conv2D(4, (3, 3), activation="relu", input_shape=(rows, cols, 1)),
+            layers.MaxPooling2D((2, 2)),
+            layers.Flatten(),
+            layers.Dense(len(train_model.alphabet), activation="softmax"),
+        ])
+        onnxPath = str(tmp_path / "gesture.onnx")
+        train_model.exportGestureModel(model, onnxPath)
+
+        monkeypatch.setattr(hand_processing, "gestureBackend", "opencv")
+        monkeypatch.setattr(hand_processing, "gestureOnnxPath", onnxPath)
+        classify = hand_processing.loadGestureModel()
+
+        # -- samples brighter on one side, rows and columns swapped by the export would not match
+        samples = np.random.default_rng(0).random((3, rows, cols, 1), dtype=np.float32)
+        samples[:, :, :cols // 2] *= 0.25
+        for sample in samples:
+            assert(np.allclose(classify(sample[None]), model.predict(sample[None]), atol=1e-5))
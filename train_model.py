@@ -2,6 +2,10 @@
 import cv2
 import numpy as np
 import os
+import json
+from multiprocessing import Pool
+
+from keypoint_classifier import keypoint_features, N_FEATURES
 
 # --- Training parameters
 alphabet = ['a', 'b', 'c', 'd', 'e', 'f', 'g', 'h', 'i', 'j', 'k', 'l', 'm', 'n', 'o', 'p', 'r', 's', 't', 'u', 'w', 'y', 'z']
@@ -9,6 +13,15 @@ training_rows = 28
 training_cols = 28
 batch_size = 128
 epochs=10
+keypoint_epochs = 50
+
+databasePath = "gestures_database/"
+cachePath = "dataset_cache/"
+
+# --- Collection mode appends every sample to one file per session
+# --- as (22, 3) float32 record: x, y (NaN for missing point) and confidence of every keypoint
+keypointRecordsFile = "keypoints.bin"
+keypointRecordShape = (22, 3)
 
 def createNewLetterSession(letter):
 	""" 
@@ -44,7 +57,304 @@ def imageIntoData(image, resize=False):
 	return X
 	
 
+def appendKeypointRecord(sessionPath, points, confidences):
+	record = np.column_stack((points, confidences)).astype(np.float32)
+	with open(os.path.join(sessionPath, keypointRecordsFile), "ab") as f:
+		f.write(record.tobytes())
+
+def readKeypointRecords(sessionPath):
+	""" 
+	# Return (records, 22, 3) float32 keypoint records of a session, empty array when session has none
+	"""
+	recordsPath = os.path.join(sessionPath, keypointRecordsFile)
+	if not os.path.exists(recordsPath):
+		return np.zeros((0,) + keypointRecordShape, dtype=np.float32)
+
+	records = np.fromfile(recordsPath, dtype=np.float32)
+	# -- a record cut by interrupted write is dropped
+	recordSize = keypointRecordShape[0] * keypointRecordShape[1]
+	return records[:len(records) // recordSize * recordSize].reshape((-1,) + keypointRecordShape)
+
+def recordKeypoints(records):
+	# -- (..., 22, 2) keypoints of records, points below hand_processing's confidence threshold are missing (NaN)
+	from hand_processing import requiredProbability
+
+	points = records[..., :2].astype(np.float64)
+	points[records[..., 2] < requiredProbability] = np.nan
+	return points
+
+def augmentKeypoints(points, rng, jitter=3.0, rotation=10.0, scale=0.1):
+	""" 
+	# Randomly rotate (degrees) and stretch (relative, per axis) keypoints around their center and move every point by gaussian jitter (pixels)
+	# Uniform scale is left out, drawn gesture is normalized to fill the canvas anyway
+	"""
+	angle = np.deg2rad(rng.uniform(-rotation, rotation))
+	cos, sin = np.cos(angle), np.sin(angle)
+	transform = np.array([[cos, -sin], [sin, cos]]) * rng.uniform(1 - scale, 1 + scale, 2)
+
+	center = np.nanmean(points, axis=0)
+	return (points - center) @ transform.T + center + rng.normal(0, jitter, points.shape)
+
+def rasterizeKeypoints(records, rng=None, handRows=training_rows * 10, handCols=training_cols * 10):
+	""" 
+	# Draw gesture skeleton of every keypoint record the way hand_processing does in recognition
+	# and return them as (records, training_rows, training_cols) uint8 array, augmented when rng is given
+	"""
+	from hand_processing import drawGestureCanvas
+
+	samples = np.zeros((len(records), training_rows, training_cols), dtype=np.uint8)
+	for i, points in enumerate(recordKeypoints(records)):
+		if rng is not None and not np.isnan(points).all():
+			points = augmentKeypoints(points, rng)
+
+		handGesture = drawGestureCanvas(points, handRows, handCols).astype(np.uint8)
+		samples[i] = cv2.resize(handGesture, (training_rows, training_cols))
+
+	return samples
+
+def augmentedBatches(records, y, batchSize, seed=0):
+	""" 
+	# Endless (X, y) batches for model.fit with freshly augmented skeletons drawn from keypoint records
+	"""
+	rng = np.random.default_rng(seed)
+	while True:
+		order = rng.permutation(len(records))
+		for start in range(0, len(order), batchSize):
+			batch = order[start:start + batchSize]
+			X = rasterizeKeypoints(records[batch], rng)
+			yield X.reshape(-1, training_rows, training_cols, 1).astype('float32') / 255, y[batch]
+
+def listSessions(databasePath=databasePath):
+	""" 
+	# Return {"letter/session": (letter index, session path)} for every session folder in database
+	"""
+	sessions = {}
+	for i in range(len(alphabet)):
+		letterPath = os.path.join(databasePath, alphabet[i])
+		if not os.path.isdir(letterPath):
+			continue
+
+		for session in sorted(os.listdir(letterPath)):
+			sessionPath = os.path.join(letterPath, session)
+			if os.path.isdir(sessionPath):
+				sessions[alphabet[i] + "/" + session] = (i, sessionPath)
+
+	return sessions
+
+def sessionSignature(sessionPath):
+	# -- Cheap change detection using only file metadata: (records, total size, newest modification)
+	records = [ entry.stat() for entry in os.scandir(sessionPath) if entry.is_file() ]
+	return [ len(records), sum(r.st_size for r in records), max((r.st_mtime_ns for r in records), default=0) ]
+
+def decodeSession(sessionPath):
+	""" 
+	# Decode every record of a session into (records, training_rows, training_cols) uint8 array
+	# Sessions with keypoint records are drawn from them, older sessions are read from record images
+	"""
+	records = readKeypointRecords(sessionPath)
+	if len(records) > 0:
+		return rasterizeKeypoints(records)
+
+	samples = []
+	for sampleFile in sorted(os.listdir(sessionPath)):
+		sample = cv2.imread(os.path.join(sessionPath, sampleFile))
+		if sample is None:
+			# -- anything else left in the session (or an unreadable image) is not training data, but should be noticed
+			print("Skipping", os.path.join(sessionPath, sampleFile), "- not a record image")
+			continue
+		samples.append(cv2.cvtColor(cv2.resize(sample, (training_rows, training_cols)), cv2.COLOR_BGR2GRAY))
+
+	return np.asarray(samples, dtype=np.uint8).reshape(-1, training_rows, training_cols)
+
+def loadDataset(databasePath=databasePath, cachePath=cachePath, workers=None):
+	""" 
+	# Return (X, y, manifest): memory-mapped (samples, rows, cols) uint8 images, their letter indices and per-session manifest
+	# Only sessions created or changed since the last build are decoded again (on a process pool), 
+	# samples of unchanged sessions are copied from the previous cache
+	"""
+	manifestPath = os.path.join(cachePath, "manifest.json")
+	samplesPath = os.path.join(cachePath, "samples.npy")
+	labelsPath = os.path.join(cachePath, "labels.npy")
+
+	oldManifest = {}
+	if os.path.exists(manifestPath):
+		with open(manifestPath) as f:
+			oldManifest = json.load(f)
+
+	sessions = listSessions(databasePath)
+	signatures = { name: sessionSignature(path) for name, (label, path) in sessions.items() }
+
+	unchanged = [ name for name in sessions if name in oldManifest and oldManifest[name]["signature"] == signatures[name] ]
+	changed = [ name for name in sessions if name not in unchanged ]
+
+	if not changed and len(unchanged) == len(oldManifest) and os.path.exists(samplesPath):
+		return np.load(samplesPath, mmap_mode='r'), np.load(labelsPath, mmap_mode='r'), oldManifest
+
+	# -- Decode only new and modified sessions
+	decoded = {}
+	if changed:
+		with Pool(workers) as pool:
+			decoded = dict(zip(changed, pool.map(decodeSession, [ sessions[name][1] for name in changed ])))
+
+	oldSamples = np.load(samplesPath, mmap_mode='r') if unchanged else None
+
+	# -- Build new cache, session by session in database order
+	manifest = {}
+	total = sum(len(decoded[name]) if name in decoded else oldManifest[name]["count"] for name in sessions)
+	os.makedirs(cachePath, exist_ok=True)
+	X = np.lib.format.open_memmap(samplesPath + ".tmp", mode='w+', dtype=np.uint8, shape=(total, training_rows, training_cols))
+	y = np.zeros(total, dtype=np.uint8)
+
+	start = 0
+	for name, (label, path) in sessions.items():
+		if name in decoded:
+			samples = decoded[name]
+		else:
+			old = oldManifest[name]
+			samples = oldSamples[old["start"]:old["start"] + old["count"]]
+
+		X[start:start + len(samples)] = samples
+		y[start:start + len(samples)] = label
+		manifest[name] = { "label": label, "signature": signatures[name], "start": start, "count": len(samples) }
+		start += len(samples)
+
+	X.flush()
+	del X, oldSamples
+	os.replace(samplesPath + ".tmp", samplesPath)
+	np.save(labelsPath, y)
+	with open(manifestPath, "w") as f:
+		json.dump(manifest, f, indent=1)
+
+	print("Dataset cache: decoded", len(changed), "sessions, reused", len(unchanged), "sessions,", total, "samples")
+	return np.load(samplesPath, mmap_mode='r'), np.load(labelsPath, mmap_mode='r'), manifest
+
+def trainedSessionsPath(modelPath):
+	return os.path.splitext(modelPath)[0] + ".sessions.json"
+
+def loadTrainedSessions(modelPath):
+	""" 
+	# Return manifest of the model at modelPath: {"sessions": {"letter/session": signature}, "history": [training runs]}
+	"""
+	path = trainedSessionsPath(modelPath)
+	if not os.path.exists(path):
+		return { "sessions": {}, "history": [] }
+
+	with open(path) as f:
+		return json.load(f)
+
+def saveTrainedSessions(modelPath, trained, sessions, mode, replaySamples=0):
+	""" 
+	# Add sessions ({"letter/session": signature}) the model was just trained on to its manifest and store it
+	"""
+	trained["sessions"].update(sessions)
+	trained["history"].append({ "mode": mode, "sessions": sorted(sessions), "replay_samples": replaySamples })
+	with open(trainedSessionsPath(modelPath), "w") as f:
+		json.dump(trained, f, indent=1)
+
+def selectFineTuneSamples(manifest, trainedSessions, replay=0.5, seed=0, validation=0.25):
+	""" 
+	# Return (new, replayed, heldOut): indices into loadDataset() samples of sessions added or changed since the model was trained,
+	# random indices of already seen samples, replay times as many as the new ones, and validation times as many
+	# already seen samples (picked first, never replayed) to validate fine-tuning on, while all new samples are trained on
+	"""
+	new = []
+	seen = []
+	for name, entry in manifest.items():
+		indices = range(entry["start"], entry["start"] + entry["count"])
+		if trainedSessions.get(name) == entry["signature"]:
+			seen.extend(indices)
+		else:
+			new.extend(indices)
+
+	# -- fixed seed gives the same held-out samples for the same trained sessions
+	seen = np.random.default_rng(seed).permutation(np.array(seen, dtype=np.int64))
+	heldOutCount = min(len(seen), int(round(validation * len(new))))
+	replayCount = min(len(seen) - heldOutCount, int(round(replay * len(new))))
+	heldOut, replayed = seen[:heldOutCount], seen[heldOutCount:heldOutCount + replayCount]
+	return np.array(new, dtype=np.int64), np.sort(replayed), np.sort(heldOut)
+
+def loadKeypointRecords(databasePath=databasePath):
+	""" 
+	# Return (records, y): (samples, 22, 3) keypoint records of every session in database and their letter indices
+	# Sessions with record images only have no keypoints to train on, they are reported and left out
+	"""
+	records = []
+	y = []
+	for name, (label, sessionPath) in listSessions(databasePath).items():
+		sessionRecords = readKeypointRecords(sessionPath)
+		if len(sessionRecords) == 0:
+			print("Session", name, "has no keypoint records, left out of keypoint training")
+			continue
+
+		records.append(sessionRecords)
+		y += [label] * len(sessionRecords)
+
+	return np.concatenate(records or [np.zeros((0,) + keypointRecordShape, dtype=np.float32)]), np.asarray(y, dtype=np.uint8)
+
+def loadKeypointDataset(databasePath=databasePath):
+	""" 
+	# Return (X, y): keypoint_features() of every keypoint record in database and their letter indices
+	"""
+	records, y = loadKeypointRecords(databasePath)
+
+	X = [ keypoint_features(points) for points in recordKeypoints(records) ]
+	return np.asarray(X, dtype=np.float32).reshape(-1, N_FEATURES), y
+
+def exportGestureModel(model, onnxPath="gesture_recognition_model.onnx", calibration=None, int8Path="gesture_recognition_model.int8.onnx"):
+	""" 
+	# Export trained Keras classifier to ONNX (tf2onnx), which hand_processing runs with OpenCV DNN without TensorFlow
+	# With calibration samples ((samples, rows, cols, 1) float32) also write int8 statically quantized variant (onnxruntime)
+	"""
+	import tensorflow as tf
+	import tf2onnx
+
+	inputSignature = (tf.TensorSpec((1, training_rows, training_cols, 1), tf.float32, name="input"),)
+	tf2onnx.convert.from_keras(model, input_signature=inputSignature, opset=11, output_path=onnxPath)
+	print("Exported gesture classifier to", onnxPath)
+
+	if calibration is None:
+		return
+
+	try:
+		from onnxruntime.quantization import quantize_static, CalibrationDataReader, QuantFormat
+	except ImportError:
+		raise ImportError("int8 export needs onnxruntime (pip install -r requirements.txt)")
+
+	class CalibrationReader(CalibrationDataReader):
+		def __init__(self):
+			self.samples = iter(calibration)
+
+		def get_next(self):
+			sample = next(self.samples, None)
+			return None if sample is None else { "input": sample.reshape(1, training_rows, training_cols, 1) }
+
+	# -- QDQ format is what OpenCV DNN (>= 4.6) imports as int8 layers
+	quantize_static(onnxPath, int8Path, CalibrationReader(), quant_format=QuantFormat.QDQ)
+	print("Exported int8 quantized gesture classifier to", int8Path)
+
+
 if __name__ == '__main__':
+	import argparse
+	parser = argparse.ArgumentParser(description="Train gesture recognition model on 'gestures_database'")
+	parser.add_argument("--classifier", choices=["cnn", "keypoints"], default="cnn",
+		help="CNN over rendered skeleton images or dense model over keypoint geometry features")
+	parser.add_argument("--export-only", action="store_true",
+		help="do not train, only export existing gesture_recognition_model.h5 to ONNX")
+	parser.add_argument("--quantize", action="store_true",
+		help="also export int8 quantized ONNX model, calibrated on training samples (needs onnxruntime)")
+	parser.add_argument("--augment", action="store_true",
+		help="train CNN on skeletons drawn from keypoint records with random jitter, rotation and stretch in every batch")
+	parser.add_argument("--incremental", action="store_true",
+		help="fine-tune existing gesture_recognition_model.h5 only on sessions added since it was trained")
+	parser.add_argument("--replay", type=float, default=0.5,
+		help="in incremental mode mix in this many already seen samples per new sample")
+	parser.add_argument("--fine-tune-epochs", type=int, default=3, help="epochs of incremental training")
+	args = parser.parse_args()
+	calibrationSamples = 256
+	modelPath = 'gesture_recognition_model.h5' if args.classifier == "cnn" else 'keypoint_gesture_model.npz'
+	mode = "full"
+	replaySamples = 0
+
 	# --- Import all necessary modules
 	import keras
 	from keras.utils import to_categorical
@@ -59,69 +369,143 @@ if __name__ == '__main__':
 	from keras.preprocessing.image import ImageDataGenerator
 	from sklearn.model_selection import train_test_split
 
-	# --- DNN Model Definition
-	# --- network topology is not fully created by us 
-	# --- credits for inspiration:
-	# --- https://github.com/acl21/Alphabet_Recognition_Gestures/blob/master/cnn_model_builder.py
-	model = Sequential()
-	model.add(Conv2D(32, kernel_size=(3, 3),
-					activation='relu',
-					input_shape=(training_rows,training_cols,1)))
-	model.add(Conv2D(64, (3, 3), activation='relu'))
-	model.add(MaxPooling2D(pool_size=(2, 2)))
-	model.add(Dropout(0.25))
-	model.add(Flatten())
-	model.add(Dense(128, activation='relu'))
-	model.add(Dropout(0.5))
-	model.add(Dense(len(alphabet), activation='softmax'))
-
-
-	# --- Compile created model
-	model.compile(loss=keras.losses.categorical_crossentropy,
-		optimizer=keras.optimizers.Adadelta(),
-		metrics=['accuracy'])
-
-	# --- Train model based on 'gestures' local database
-	X = []
-	y = []
+	if args.export_only:
+		# --- Export already trained CNN, TensorFlow-free runtime uses the ONNX file
+		from keras.models import load_model
+		calibration = None
+		if args.quantize:
+			X, y, manifest = loadDataset()
+			calibration = X[:calibrationSamples].reshape(-1, training_rows, training_cols, 1).astype('float32') / 255
+		exportGestureModel(load_model('gesture_recognition_model.h5'), calibration=calibration)
+		exit()
 
-	# --- Get all record files for given letter and save them in X, y lists
-	for i in range(len(alphabet)):
-		letter = alphabet[i]
-		path = "gestures_database/" + letter + "/"
-			
-		# -- Get all record files in 'letter' gestures subdirectory
-		for roots, dirs, samples in os.walk(path):
-			for sampleFile in samples:
-				fullPath = os.path.join(roots, sampleFile)
-				sample = cv2.imread(fullPath)
-
-				# -- Save sample image and correct prediction  
-				X.append(cv2.cvtColor(cv2.resize(sample, (training_rows, training_cols)), cv2.COLOR_BGR2GRAY))
-				y.append(i)
-
-	# --- Transform given (rows, cols) grayscale images 
-	# --- for DNN inputs
-	X = np.asarray(X)
-	X = X.reshape(X.shape[0], training_rows, training_cols, 1)
+	if args.incremental and args.classifier != "cnn":
+		print("Incremental training is supported only for the CNN classifier")
+		exit()
 
-	# --- Normalization [0-255] -> [0,1]
-	X = X.astype('float32')
-	X /= 255
+	# --- Sessions seen by the current model, a fully retrained model starts a new manifest
+	trained = loadTrainedSessions(modelPath) if args.incremental else { "sessions": {}, "history": [] }
+	sessions = { name: sessionSignature(path) for name, (label, path) in listSessions().items() }
+
+	if args.classifier == "keypoints":
+		# --- Small dense network over pairwise distances and bone angles of keypoints
+		model = Sequential()
+		model.add(Dense(128, activation='relu', input_shape=(N_FEATURES,)))
+		model.add(Dropout(0.2))
+		model.add(Dense(64, activation='relu'))
+		model.add(Dense(len(alphabet), activation='softmax'))
+
+		model.compile(loss=keras.losses.categorical_crossentropy,
+			optimizer=keras.optimizers.Adam(),
+			metrics=['accuracy'])
+
+		# --- Train model based on keypoint records of 'gestures' local database
+		X, y = loadKeypointDataset()
+		trainEpochs = keypoint_epochs
+	elif args.incremental:
+		# --- Continue training of the existing model (optimizer state is restored too)
+		from keras.models import load_model
+		model = load_model(modelPath)
+
+		X, y, manifest = loadDataset()
+		newSamples, replayed, heldOut = selectFineTuneSamples(manifest, trained["sessions"], args.replay)
+		if len(newSamples) == 0:
+			print("No sessions added since", modelPath, "was trained")
+			exit()
+
+		sessions = { name: entry["signature"] for name, entry in manifest.items() if trained["sessions"].get(name) != entry["signature"] }
+		print("Fine-tuning on", len(sessions), "new sessions:", len(newSamples), "samples and", len(replayed), "replayed older samples,",
+			len(heldOut), "older samples held out for validation")
+
+		# --- New samples mixed with replayed older ones, so the model does not forget already learned signers,
+		# --- all of them are trained on (their sessions are recorded as trained), held-out older ones only validate
+		selected = np.concatenate((newSamples, replayed))
+		heldOutX = X[heldOut].reshape(-1, training_rows, training_cols, 1).astype('float32') / 255
+		heldOutY = keras.utils.to_categorical(y[heldOut], len(alphabet))
+		X = X[selected].reshape(-1, training_rows, training_cols, 1).astype('float32') / 255
+		y = y[selected]
+		trainEpochs = args.fine_tune_epochs
+		mode = "incremental"
+		replaySamples = len(replayed)
+	else:
+		# --- DNN Model Definition
+		# --- network topology is not fully created by us 
+		# --- credits for inspiration:
+		# --- https://github.com/acl21/Alphabet_Recognition_Gestures/blob/master/cnn_model_builder.py
+		model = Sequential()
+		model.add(Conv2D(32, kernel_size=(3, 3),
+						activation='relu',
+						input_shape=(training_rows,training_cols,1)))
+		model.add(Conv2D(64, (3, 3), activation='relu'))
+		model.add(MaxPooling2D(pool_size=(2, 2)))
+		model.add(Dropout(0.25))
+		model.add(Flatten())
+		model.add(Dense(128, activation='relu'))
+		model.add(Dropout(0.5))
+		model.add(Dense(len(alphabet), activation='softmax'))
+
+
+		# --- Compile created model
+		model.compile(loss=keras.losses.categorical_crossentropy,
+			optimizer=keras.optimizers.Adadelta(),
+			metrics=['accuracy'])
+
+		trainEpochs = epochs
+		if args.augment:
+			# --- Train on keypoint records, skeleton images are drawn while training
+			X, y = loadKeypointRecords()
+		else:
+			# --- Train model based on 'gestures' local database
+			# --- samples are read from incrementally updated dataset cache
+			X, y, manifest = loadDataset()
+			sessions = { name: entry["signature"] for name, entry in manifest.items() }
+
+			# --- Transform given (rows, cols) grayscale images 
+			# --- for DNN inputs
+			X = X.reshape(X.shape[0], training_rows, training_cols, 1)
+
+			# --- Normalization [0-255] -> [0,1]
+			X = X.astype('float32')
+			X /= 255
 
 	# --- Transform predictions into binary matrix 
 	y = keras.utils.to_categorical(y, len(alphabet))
 
-	# --- Split database for 75% of training samples and 25% of testing samples 
-	x_train, x_test, y_train, y_test = train_test_split(X, y, test_size=0.25, random_state=0xdeadbeef)
+	if args.incremental:
+		x_train, y_train = X, y
+		x_test, y_test = heldOutX, heldOutY
+		if len(x_test) == 0:
+			print("No older samples left to validate on, fine-tuned model is not evaluated")
+	else:
+		# --- Split database for 75% of training samples and 25% of testing samples 
+		x_train, x_test, y_train, y_test = train_test_split(X, y, test_size=0.25, random_state=0xdeadbeef)
 
-	# --- Train Mdodel for epochs times by bath_size amount of samples once
-	model.fit(x_train, y_train, batch_size=batch_size, epochs=epochs, verbose=1, validation_data=(x_test, y_test))
+	if args.augment and args.classifier == "cnn":
+		# --- Test skeletons are drawn once without augmentation, training ones anew for every batch
+		calibration = rasterizeKeypoints(x_train[:calibrationSamples]).reshape(-1, training_rows, training_cols, 1).astype('float32') / 255
+		x_test = rasterizeKeypoints(x_test).reshape(-1, training_rows, training_cols, 1).astype('float32') / 255
+		model.fit(augmentedBatches(x_train, y_train, batch_size), steps_per_epoch=-(-len(x_train) // batch_size),
+			epochs=trainEpochs, verbose=1, validation_data=(x_test, y_test))
+	else:
+		calibration = x_train[:calibrationSamples]
+		# --- Train Mdodel for epochs times by bath_size amount of samples once
+		model.fit(x_train, y_train, batch_size=batch_size, epochs=trainEpochs, verbose=1,
+			validation_data=(x_test, y_test) if len(x_test) else None)
 
 	# --- Check model accuracy
-	score = model.evaluate(x_test, y_test, verbose=1)
-	print('Test loss:', score[0])
-	print('Test accuracy:', score[1])
+	if len(x_test):
+		score = model.evaluate(x_test, y_test, verbose=1)
+		print('Test loss:', score[0])
+		print('Test accuracy:', score[1])
 
 	# --- Save trained model for use in test script
-	model.save('gesture_recognition_model.h5')
+	if args.classifier == "keypoints":
+		# -- keypoint classifier runs on plain NumPy, only its weights are needed
+		from keypoint_classifier import KeypointClassifier
+		KeypointClassifier.from_keras(model).save(modelPath)
+	else:
+		model.save(modelPath)
+		exportGestureModel(model, calibration=calibration if args.quantize else None)
+
+	# --- Remember which sessions the saved model has seen
+	saveTrainedSessions(modelPath, trained, sessions, mode, replaySamples)
@@ -0,0 +1,177 @@
+import threading
+import time
+
+from utils import perf
+
+
+class LatestFrameCapture:
+    """
+    Reads frames from a cv2.VideoCapture-like source on a background thread and keeps only the newest one.
+    Every consumer remembers the id of the last frame it has seen, so several consumers
+    (e.g. display and recognition) can read the same capture independently, each always getting the newest frame.
+    Frames returned by read() are shared between consumers and must be treated as read-only.
+    In lockstep mode the next frame is read from the source only after a consumer has taken the current one,
+    so sources faster than their consumers (e.g. replayed recordings) do not lose frames.
+    """
+    def __init__(self, source, lockstep=False):
+        self.source = source
+        self.lockstep = lockstep
+        self.frame = None
+        self.frame_id = -1
+        self.taken_id = -1
+        self.running = False
+        self.condition = threading.Condition()
+        self.thread = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._capture_loop, daemon=True)
+        self.thread.start()
+        return self
+
+    def _capture_loop(self):
+        while self.running:
+            if self.lockstep:
+                with self.condition:
+                    self.condition.wait_for(lambda: self.taken_id >= self.frame_id or not self.running)
+
+            start = time.perf_counter()
+            ret, frame = self.source.read()
+            end = time.perf_counter()
+            perf.monitor.record("capture", end - start, end)
+
+            with self.condition:
+                if not ret:
+                    self.running = False
+                else:
+                    self.frame = frame
+                    self.frame_id += 1
+                self.condition.notify_all()
+
+    def read(self, last_id=-1, timeout=None):
+        """
+        Wait for a frame newer than last_id and return (frame_id, frame).
+        Returns (last_id, None) when the source is exhausted or the timeout expires.
+        """
+        with self.condition:
+            self.condition.wait_for(lambda: self.frame_id > last_id or not self.running, timeout)
+
+            if self.frame_id > last_id:
+                self.taken_id = self.frame_id
+                self.condition.notify_all()
+                return self.frame_id, self.frame
+            return last_id, None
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+
+        if self.thread is not None:
+            self.thread.join()
+
+
+class FrameStage:
+    """
+    Runs process(frame) on a background thread over the newest frames of a LatestFrameCapture,
+    or, with capture=None, over the newest frames the caller feed()s it (e.g. a frame together with data computed from it).
+    The stage either processes every newest frame (continuous mode) or a single frame per request().
+    Only the newest result is kept, poll() hands it over to the caller exactly once.
+    A synchronous stage has no thread: it processes fed frames on the caller's thread,
+    so the processed frames do not depend on timing (e.g. for deterministic replays).
+    """
+    def __init__(self, capture, process, synchronous=False):
+        self.capture = capture
+        self.process = process
+        self.synchronous = synchronous
+        self.continuous = False
+        self.requested = False
+        self.result = None
+        self.running = False
+        self.condition = threading.Condition()
+        self.thread = None
+        self.fed = None
+        self.fed_id = 0
+        self.processed_id = 0
+
+    def start(self):
+        self.running = True
+        if not self.synchronous:
+            self.thread = threading.Thread(target=self._stage_loop, daemon=True)
+            self.thread.start()
+        return self
+
+    def feed(self, frame):
+        """
+        Hand the newest frame over to the stage. Synchronous stage processes it now
+        if the stage is continuous or a frame was requested, asynchronous one on its thread.
+        """
+        with self.condition:
+            if not self.synchronous:
+                self.fed = frame
+                self.fed_id += 1
+                self.condition.notify_all()
+                return
+            if not (self.running and (self.continuous or self.requested)):
+                return
+            self.requested = False
+
+        result = self.process(frame)
+
+        with self.condition:
+            self.result = result
+
+    def _next_frame(self, last_id):
+        if self.capture is not None:
+            return self.capture.read(last_id)
+
+        # fed frame is processed at most once, the stage waits for a newer one
+        with self.condition:
+            self.condition.wait_for(lambda: self.fed_id != self.processed_id or not self.running)
+            if not self.running:
+                return last_id, None
+            self.processed_id = self.fed_id
+            return self.fed_id, self.fed
+
+    def _stage_loop(self):
+        last_id = -1
+
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.continuous or self.requested or not self.running)
+                if not self.running:
+                    return
+                self.requested = False
+
+            last_id, frame = self._next_frame(last_id)
+            if frame is None:
+                return
+
+            result = self.process(frame)
+
+            with self.condition:
+                self.result = result
+
+    def request(self):
+        with self.condition:
+            self.requested = True
+            self.condition.notify_all()
+
+    def set_continuous(self, continuous):
+        with self.condition:
+            self.continuous = continuous
+            self.condition.notify_all()
+
+    def poll(self):
+        with self.condition:
+            result, self.result = self.result, None
+            return result
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+
+        # the stage may be blocked inside process(), do not wait for it longer than needed
+        if self.thread is not None:
+            self.thread.join(timeout=5)
@@ -0,0 +1,41 @@
+import cv2
+import numpy as np
+
+
+class FrameChangeGate:
+    """
+    Cheap change detector for hand crops: mean absolute difference of downsampled grayscale images.
+    The reference is the last frame which was let through, so slow drift also adds up to a change.
+    """
+    def __init__(self, threshold=4.0, size=(32, 32)):
+        self.threshold = threshold
+        self.size = size
+        self.reference = None
+        self.processed = 0
+        self.skipped = 0
+
+    def thumbnail(self, image):
+        if image.ndim == 3:
+            image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        # INTER_AREA averages pixels, which also filters out camera noise
+        return cv2.resize(image, self.size, interpolation=cv2.INTER_AREA).astype(np.int16)
+
+    def changed(self, image):
+        """
+        Return True (and make image the new reference) when image differs from the reference by more than threshold.
+        """
+        thumbnail = self.thumbnail(image)
+
+        if self.reference is not None and np.mean(np.abs(thumbnail - self.reference)) <= self.threshold:
+            self.skipped += 1
+            return False
+
+        self.reference = thumbnail
+        self.processed += 1
+        return True
+
+    def reset(self):
+        self.reference = None
+
+    def counters(self):
+        return {"processed": self.processed, "skipped": self.skipped}
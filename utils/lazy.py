@@ -0,0 +1,20 @@
+import threading
+
+
+class LazyModel:
+    """
+    Loads a model with loader() on first get(), exactly once even when several threads ask for it at the same time.
+    """
+    def __init__(self, loader):
+        self.loader = loader
+        self.model = None
+        self.is_loaded = False
+        self.lock = threading.Lock()
+
+    def get(self):
+        if not self.is_loaded:
+            with self.lock:
+                if not self.is_loaded:
+                    self.model = self.loader()
+                    self.is_loaded = True
+        return self.model
@@ -0,0 +1,111 @@
+import cv2
+import numpy as np
+
+
+class HandLocalizer:
+    """
+    Cheap hand localization in full camera frames: skin color and motion on a downscaled frame.
+    Skin colored blobs are scored by their area, moving pixels and distance from the previous hand,
+    the best one gives the center of a fixed size hand box, smoothed over frames.
+    A hand missing for more than patience frames is lost, locate() then returns None.
+    """
+    def __init__(self, box_size=(280, 280), scale=0.25, smoothing=0.5, min_area=0.005, patience=5,
+                 motion_threshold=15, motion_weight=2.0, skin_lower=(0, 133, 77), skin_upper=(255, 173, 127), jump=0.1):
+        self.box_size = box_size
+        self.jump = jump
+        self.scale = scale
+        self.smoothing = smoothing
+        self.min_area = min_area
+        self.patience = patience
+        self.motion_threshold = motion_threshold
+        self.motion_weight = motion_weight
+        self.skin_lower = np.array(skin_lower, dtype=np.uint8)
+        self.skin_upper = np.array(skin_upper, dtype=np.uint8)
+        self.kernel = np.ones((3, 3), dtype=np.uint8)
+        self.previous = None
+        self.center = None
+        self.box = None
+        self.missed = 0
+        self.found = 0
+        self.empty = 0
+
+    def skin_mask(self, small):
+        # Cr/Cb range of skin tones, opening removes single pixel noise
+        skin = cv2.inRange(cv2.cvtColor(small, cv2.COLOR_BGR2YCrCb), self.skin_lower, self.skin_upper)
+        return cv2.morphologyEx(skin, cv2.MORPH_OPEN, self.kernel)
+
+    def candidate(self, skin, motion):
+        """
+        Return center (in downscaled frame coords) of the best skin blob, or None when there is no large enough one.
+        """
+        count, labels, stats, centroids = cv2.connectedComponentsWithStats(skin)
+        moving = np.bincount(labels[motion], minlength=count) if motion is not None else np.zeros(count)
+        min_area = self.min_area * skin.size
+        reach = self.scale * np.hypot(*self.box_size)
+
+        best, best_score = None, 0.0
+        # label 0 is the background
+        for label in range(1, count):
+            area = stats[label, cv2.CC_STAT_AREA]
+            if area < min_area:
+                continue
+            score = area + self.motion_weight * moving[label]
+            if self.center is not None:
+                score /= 1.0 + np.hypot(*(centroids[label] - self.center * self.scale)) / reach
+            if score > best_score:
+                best, best_score = centroids[label], score
+        return best
+
+    def locate(self, frame):
+        """
+        Return hand box (x, y, cols, rows) of frame, or None when no hand is found.
+        """
+        small = cv2.resize(frame, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        motion = None
+        if self.previous is not None and self.previous.shape == gray.shape:
+            motion = cv2.absdiff(gray, self.previous) > self.motion_threshold
+        self.previous = gray
+
+        center = self.candidate(self.skin_mask(small), motion)
+        if center is None:
+            self.empty += 1
+            self.missed += 1
+            # short dropouts (motion blur, lighting) keep the last box
+            if self.missed > self.patience:
+                self.center = None
+                self.box = None
+            return self.box
+
+        self.found += 1
+        self.missed = 0
+        center = center / self.scale
+        if self.center is None:
+            self.center = center
+        else:
+            self.center = self.smoothing * self.center + (1.0 - self.smoothing) * center
+
+        rows, cols = frame.shape[:2]
+        box_cols, box_rows = self.box_size
+        x = int(round(self.center[0] - box_cols / 2))
+        y = int(round(self.center[1] - box_rows / 2))
+        self.box = (min(max(x, 0), cols - box_cols), min(max(y, 0), rows - box_rows), box_cols, box_rows)
+        return self.box
+
+    def moved(self, previous, box):
+        """
+        Return True when box is not a small (smoothed) shift of previous box but shows another part of the frame:
+        it moved by more than jump of its size, or one of the boxes is missing.
+        """
+        if previous is None or box is None:
+            return previous is not box
+        return max(abs(box[0] - previous[0]) / box[2], abs(box[1] - previous[1]) / box[3]) > self.jump
+
+    def reset(self):
+        self.previous = None
+        self.center = None
+        self.box = None
+        self.missed = 0
+
+    def counters(self):
+        return {"found": self.found, "empty": self.empty}
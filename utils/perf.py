@@ -1,15 +1,116 @@
-class LatencyCalc:
-    def __init__(self):
-        self.total_latency = 0
-        self.inferences = 0
-        self.avg_inference_latency = 0
+import json
+import math
+import time
 
-    def calc_inference_latency(self, inference_start, inference_end):
-        last_inference_latency = inference_end - inference_start
-        self.total_latency += last_inference_latency
+def summarize_latencies(latencies):
+    """
+    Summarize latencies given in seconds: percentiles and mean in milliseconds, throughput in calls per second.
+    """
+    samples = sorted(latencies)
+    if not samples:
+        return {"count": 0}
 
-        self.inferences += 1
-        avg_inference_latency = self.total_latency / self.inferences
+    def percentile(p):
+        # nearest-rank percentile
+        rank = max(0, min(len(samples) - 1, math.ceil(p / 100 * len(samples)) - 1))
+        return samples[rank] * 1000
 
-        # return in milliseconds
-        return avg_inference_latency * 1000
+    total = sum(samples)
+    return {
+        "count": len(samples),
+        "mean_ms": total / len(samples) * 1000,
+        "p50_ms": percentile(50),
+        "p95_ms": percentile(95),
+        "p99_ms": percentile(99),
+        "throughput": len(samples) / total if total > 0 else float("inf"),
+    }
+
+
+class RingTimer:
+    """
+    Keeps the last size durations (and end timestamps) of one named stage in a fixed-size ring buffer.
+    Recording is two list stores, percentiles and rate are computed only when summary() is called.
+    """
+    def __init__(self, size=256):
+        self.size = size
+        self.durations = [0.0] * size
+        self.ends = [0.0] * size
+        self.count = 0
+
+    def record(self, duration, end=None):
+        slot = self.count % self.size
+        self.durations[slot] = duration
+        self.ends[slot] = time.perf_counter() if end is None else end
+        self.count += 1
+
+    def summary(self):
+        n = min(self.count, self.size)
+        summary = summarize_latencies(self.durations[:n])
+        summary["total_count"] = self.count
+
+        # rate of stage calls over the sliding window (e.g. frames per second for the display loop)
+        ends = self.ends[:n]
+        if n > 1 and max(ends) > min(ends):
+            summary["rate"] = (n - 1) / (max(ends) - min(ends))
+        return summary
+
+
+class _TimerContext:
+    def __init__(self, timer):
+        self.timer = timer
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter()
+        self.timer.record(end - self.start, end)
+        return False
+
+
+class PerfMonitor:
+    """
+    Named stage timers (capture, keypoint_inference, decoding, classification, prefix_query, display...)
+    with sliding-window percentiles, rendered as overlay text lines or dumped as JSON.
+    """
+    def __init__(self, size=256):
+        self.size = size
+        self.timers = {}
+
+    def get_timer(self, name):
+        timer = self.timers.get(name)
+        if timer is None:
+            timer = self.timers.setdefault(name, RingTimer(self.size))
+        return timer
+
+    def timer(self, name):
+        """
+        Context manager measuring the enclosed block as one call of stage name.
+        """
+        return _TimerContext(self.get_timer(name))
+
+    def record(self, name, duration, end=None):
+        self.get_timer(name).record(duration, end)
+
+    def summaries(self):
+        return {name: timer.summary() for name, timer in list(self.timers.items())}
+
+    def overlay_lines(self):
+        lines = []
+        for name, summary in self.summaries().items():
+            if summary["count"] == 0:
+                continue
+            line = "{}: p50 {:.1f} p95 {:.1f} ms".format(name, summary["p50_ms"], summary["p95_ms"])
+            if "rate" in summary:
+                line += " {:.1f}/s".format(summary["rate"])
+            lines.append(line)
+        return lines
+
+    def dump(self, path):
+        with open(path, "w") as f:
+            json.dump(self.summaries(), f, indent=2)
+
+
+# shared monitor used by inference engines, capture and the main loop
+monitor = PerfMonitor()
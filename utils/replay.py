@@ -0,0 +1,123 @@
+import os
+import json
+import time
+
+import cv2
+
+NO_KEY = chr(255)
+
+VIDEO_FILE = "frames.avi"
+SESSION_FILE = "session.json"
+
+
+class SessionRecorder:
+    """
+    Wraps a cv2.VideoCapture-like source and stores every frame it delivers as MJPG video with its timestamp,
+    together with key events tied to the id of the frame shown when the key was pressed.
+    Frame ids are counted the same way as in LatestFrameCapture, so they match on replay.
+    """
+    def __init__(self, source, path, fps=30.0):
+        self.source = source
+        self.path = path
+        self.fps = fps
+        self.writer = None
+        self.start = None
+        self.timestamps = []
+        self.keys = []
+        os.makedirs(path, exist_ok=True)
+
+    def read(self):
+        ret, frame = self.source.read()
+        if not ret:
+            return ret, frame
+
+        now = time.perf_counter()
+        if self.writer is None:
+            self.start = now
+            rows, cols = frame.shape[:2]
+            self.writer = cv2.VideoWriter(os.path.join(self.path, VIDEO_FILE), cv2.VideoWriter_fourcc(*"MJPG"), self.fps, (cols, rows))
+
+        self.writer.write(frame)
+        self.timestamps.append(now - self.start)
+        return ret, frame
+
+    def record_key(self, frame_id, key):
+        start = self.start if self.start is not None else time.perf_counter()
+        self.keys.append({"frame": frame_id, "time": time.perf_counter() - start, "key": key})
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.release()
+
+        with open(os.path.join(self.path, SESSION_FILE), "w") as f:
+            json.dump({"timestamps": self.timestamps, "keys": self.keys}, f)
+
+
+class ReplaySource:
+    """
+    cv2.VideoCapture-like source replaying a session stored by SessionRecorder,
+    either at the recorded pace (realtime) or as fast as frames are read.
+    """
+    def __init__(self, path, realtime=True):
+        with open(os.path.join(path, SESSION_FILE)) as f:
+            session = json.load(f)
+
+        self.timestamps = session["timestamps"]
+        self.keys = session["keys"]
+        self.video = cv2.VideoCapture(os.path.join(path, VIDEO_FILE))
+        self.realtime = realtime
+        self.start = None
+        self.frames = 0
+
+    def isOpened(self):
+        return self.video.isOpened()
+
+    def set(self, prop, value):
+        # recorded resolution cannot be changed
+        return False
+
+    def read(self):
+        if self.frames >= len(self.timestamps):
+            return False, None
+
+        if self.realtime:
+            if self.start is None:
+                self.start = time.perf_counter()
+            delay = self.start + self.timestamps[self.frames] - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+        ret, frame = self.video.read()
+        if ret:
+            self.frames += 1
+        return ret, frame
+
+    def release(self):
+        self.video.release()
+
+
+class WindowKeys:
+    """
+    Key events of the OpenCV windows, read(frame_id) also lets HighGUI redraw them.
+    """
+    def read(self, frame_id):
+        return chr(cv2.waitKey(1) & 255)
+
+
+class ReplayKeys:
+    """
+    Replays recorded key events, each one as soon as the frame it was pressed on (or a later one) is shown.
+    """
+    def __init__(self, events, pump_windows=True):
+        self.events = sorted(events, key=lambda event: event["frame"])
+        self.next = 0
+        self.pump_windows = pump_windows
+
+    def read(self, frame_id):
+        if self.pump_windows:
+            cv2.waitKey(1)
+
+        if self.next < len(self.events) and self.events[self.next]["frame"] <= frame_id:
+            self.next += 1
+            return self.events[self.next - 1]["key"]
+        return NO_KEY